@@ -29,9 +29,20 @@
 import os
 import sys
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from io import StringIO, BytesIO
-from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, BadZipfile
+from tempfile import mkstemp
+from time import localtime
+from struct import unpack
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo, BadZipfile
+from zipfile import ZIP64_LIMIT, is_zipfile
+try:
+    from zlib import compressobj, crc32, DEFLATED, Z_DEFAULT_COMPRESSION
+except ImportError:
+    # Parts will be stored
+    compressobj = None
 
 # Import from lpod
 from .const import ODF_MIMETYPES, ODF_PARTS, ODF_TYPES, ODF_MANIFEST
@@ -42,6 +53,104 @@ from .utils import _get_abspath  #, obsolete
 from .scriptutils import printwarn
 
 
+# Local file header of a Zip member
+_zip_header_signature = b'PK\x03\x04'
+_zip_header_size = 30
+# Chunks of raw member copied at once
+_zip_copy_size = 1024 * 1024
+
+
+
+# ZipFile has no API to write a member already compressed: the internals
+# this needs are only used with the Python versions known to have them,
+# else parts are compressed again with "ZipFile.open"
+_zip_raw_versions = ((3, 6), (3, 13))
+_zip_raw_attributes = ('fp', 'filelist', 'NameToInfo', 'start_dir',
+                       '_lock', '_seekable', '_writing')
+
+
+
+def _can_write_raw(filezip, *sizes):
+    """Tell if "_write_raw_member" can append to the given Zip object a
+    member of the given sizes, Zip64 members being left to ZipFile.
+    """
+    first, last = _zip_raw_versions
+    if not first <= sys.version_info[:2] <= last:
+        return False
+    if not all(hasattr(filezip, name) for name in _zip_raw_attributes):
+        return False
+    if not filezip._seekable or filezip._writing:
+        return False
+    return all(size < ZIP64_LIMIT for size in sizes)
+
+
+
+def _write_raw_member(filezip, zinfo, chunks):
+    """Append a member whose compressed data is already known to the given
+    Zip object, as "ZipFile.writestr" would. See "_can_write_raw".
+    """
+    # The sizes are known: no data descriptor
+    zinfo.flag_bits &= ~0x08
+    with filezip._lock:
+        dest = filezip.fp
+        dest.seek(filezip.start_dir)
+        zinfo.header_offset = dest.tell()
+        dest.write(zinfo.FileHeader(False))
+        for chunk in chunks:
+            dest.write(chunk)
+        filezip.filelist.append(zinfo)
+        filezip.NameToInfo[zinfo.filename] = zinfo
+        filezip.start_dir = dest.tell()
+        filezip._didModify = True
+
+
+
+def _iter_raw_member(file, info):
+    """Yield the compressed data of the given member of the Zip file-like
+    object, by chunks.
+    """
+    # Skip the local header
+    file.seek(info.header_offset)
+    header = file.read(_zip_header_size)
+    if header[:4] != _zip_header_signature:
+        raise BadZipfile('bad local header for "%s"' % info.filename)
+    name_length, extra_length = unpack('<2H', header[26:30])
+    file.seek(name_length + extra_length, 1)
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = file.read(min(remaining, _zip_copy_size))
+        if not chunk:
+            raise BadZipfile('truncated member "%s"' % info.filename)
+        remaining -= len(chunk)
+        yield chunk
+
+
+
+def _iter_deflated_parts(executor, parts, window):
+    """Yield the given parts compressed by "_deflate_part", in order, with
+    at most "window" parts compressed ahead.
+    """
+    pending = deque()
+    for data in parts:
+        pending.append(executor.submit(_deflate_part, data))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+
+def _deflate_part(data):
+    """Compress the given part the way "ZipFile.writestr" would, returning
+    its CRC, size and compressed data. zlib releases the GIL meanwhile.
+    """
+    if type(data) is str:
+        data = data.encode('utf-8')
+    compressor = compressobj(Z_DEFAULT_COMPRESSION, DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    return crc32(data), len(data), compressed
+
+
 class odf_container(object):
     """Representation of the ODF file.
     """
@@ -49,9 +158,15 @@ class odf_container(object):
     __zipfile = None
     # Using zip archive
     __packaging = None  # None, 'zip', 'flat', 'folder'
+    # Members are read on demand from the source
+    __lazy = False
+    # The source file was opened here, see close
+    __close_data = False
 
 
-    def __init__(self, path_or_file):
+    def __init__(self, path_or_file, lazy=False):
+        # Parts copied from files when saving, see set_part_file
+        self.__part_files = {}
         want_folder = False
         if isinstance(path_or_file, str):
             # Path
@@ -79,8 +194,24 @@ class odf_container(object):
                 mimetype = ODF_EXTENSIONS['odt']
             self.__parts = {'mimetype': mimetype}
             self.__parts_ts = {'mimetype': timestamp}
+        elif lazy and is_zipfile(file):
+            # Keep the file open, members are read on demand
+            self.__data = file
+            self.__lazy = True
+            self.__close_data = isinstance(path_or_file, str)
+            self.__packaging = 'zip'
+            mimetype = self.__get_zip_part('mimetype')
+            if mimetype.decode() not in ODF_MIMETYPES:
+                message = 'Document of unknown type "%s"' % mimetype
+                raise ValueError(message)
+            self.__parts = {'mimetype': mimetype}
         else:
+            if lazy:
+                # Rewind after "is_zipfile"
+                file.seek(0)
             self.__data = data = file.read()
+            if isinstance(path_or_file, str):
+                file.close()
             zip_expected = data[:4] == 'PK\x03\x04'
             # Most probably zipped document
             try:
@@ -153,8 +284,12 @@ class odf_container(object):
         """
         if self.__zipfile is None:
             data = self.__get_data()
-            # StringIO will not duplicate the string, how big it is
-            filelike = BytesIO(data)
+            if self.__lazy:
+                # Open file, read on demand
+                filelike = data
+            else:
+                # StringIO will not duplicate the string, how big it is
+                filelike = BytesIO(data)
             self.__zipfile = ZipFile(filelike)
         return self.__zipfile
 
@@ -174,11 +309,63 @@ class odf_container(object):
         return zipfile.read(path)
 
 
-    def __save_zip(self, file):
+    def __copy_zip_part(self, filezip, path):
+        """Copy a part not loaded from the source Zip ODF to the given Zip
+        object, as is: the compressed data and the CRC are kept.
+        """
+        source = self.__get_zipfile()
+        info = source.getinfo(path)
+        zinfo = ZipInfo(info.filename, date_time=info.date_time)
+        zinfo.compress_type = info.compress_type
+        zinfo.create_system = info.create_system
+        zinfo.external_attr = info.external_attr
+        zinfo.file_size = info.file_size
+        if not _can_write_raw(filezip, info.file_size, info.compress_size):
+            # Decompress and compress again
+            with source.open(info) as src, filezip.open(zinfo, 'w',
+                    force_zip64=info.file_size >= ZIP64_LIMIT) as dst:
+                shutil.copyfileobj(src, dst, _zip_copy_size)
+            return
+        zinfo.flag_bits = info.flag_bits
+        zinfo.CRC = info.CRC
+        zinfo.compress_size = info.compress_size
+        zinfo.extract_version = info.extract_version
+        data = self.__get_data()
+        file = data if self.__lazy else BytesIO(data)
+        _write_raw_member(filezip, zinfo, _iter_raw_member(file, info))
+
+
+    def __write_deflated_part(self, filezip, path, deflated):
+        """Append a part compressed by "_deflate_part" to the given Zip
+        object.
+        """
+        crc, size, data = deflated
+        if not _can_write_raw(filezip, size, len(data)):
+            filezip.writestr(path, self.__parts[path])
+            return
+        zinfo = ZipInfo(path, date_time=localtime()[:6])
+        zinfo.compress_type = ZIP_DEFLATED
+        zinfo.external_attr = 0o600 << 16
+        zinfo.CRC = crc
+        zinfo.file_size = size
+        zinfo.compress_size = len(data)
+        _write_raw_member(filezip, zinfo, (data,))
+
+
+    def __save_zip(self, file, workers=None):
         """Save a Zip ODF from the available parts.
+
+        Parts not loaded are copied as is from the source Zip ODF. Given a
+        number of workers, parts are compressed in parallel.
         """
-        # Parts were loaded by "save"
+        # Modified parts were loaded by "save"
         parts = self.__parts
+        part_files = self.__part_files
+        part_names = [path for path in parts if parts[path] is not None]
+        part_names.extend(part_files)
+        if self.__packaging == 'zip':
+            part_names.extend(path for path in self.__get_zip_parts()
+                              if path not in parts and path not in part_files)
         compression = ZIP_DEFLATED
         try:
             filezip = ZipFile(file, 'w', compression=compression)
@@ -186,37 +373,52 @@ class odf_container(object):
             # No zlib module
             compression = ZIP_STORED
             filezip = ZipFile(file, 'w', compression=compression)
-        # Parts to save, except manifest at the end
-        part_names = list(parts.keys())
-        try:
-            part_names.remove(ODF_MANIFEST)
-        except KeyError:
-            printwarn("missing '%s'" % ODF_MANIFEST)
         # "Pretty-save" parts in some order
         # mimetype requires to be first and uncompressed
-        filezip.compression = ZIP_STORED
-        try:
-            filezip.writestr('mimetype', parts['mimetype'])
-            filezip.compression = compression
-            part_names.remove('mimetype')
-        except:
+        if 'mimetype' not in parts:
             printwarn("missing 'mimetype'")
-        # XML parts
+        # Then XML parts, everything else, manifest at the end
         for path in ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES:
-            if path not in parts:
+            if path not in part_names:
                 printwarn("missing '%s'" % path)
-                continue
-            filezip.writestr(path, parts[path])
-            part_names.remove(path)
-        # Everything else
-        for path in part_names:
-            data = parts[path]
-            if data is None:
-                # Deleted
-                continue
-            filezip.writestr(path, data)
-        # Manifest
-        filezip.writestr(ODF_MANIFEST, parts[ODF_MANIFEST])
+        if ODF_MANIFEST not in part_names:
+            printwarn("missing '%s'" % ODF_MANIFEST)
+        first = ('mimetype', ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES)
+        order = [path for path in first if path in part_names]
+        order.extend(path for path in part_names
+                     if path not in first and path != ODF_MANIFEST)
+        if ODF_MANIFEST in part_names:
+            order.append(ODF_MANIFEST)
+        # Parts to compress
+        to_deflate = set(path for path in order
+                         if path in parts and path != 'mimetype'
+                         and not path.endswith('/'))
+        executor = None
+        if (workers and workers > 1 and compression == ZIP_DEFLATED
+                and compressobj is not None and _can_write_raw(filezip)):
+            executor = ThreadPoolExecutor(workers)
+            # Results come in order, while the first ones are written
+            deflated = _iter_deflated_parts(executor,
+                    (parts[path] for path in order if path in to_deflate),
+                    workers * 2)
+        try:
+            for path in order:
+                if path == 'mimetype':
+                    filezip.compression = ZIP_STORED
+                    filezip.writestr(path, parts[path])
+                    filezip.compression = compression
+                elif path in part_files:
+                    # Compressed by chunks
+                    filezip.write(part_files[path], path)
+                elif path not in parts:
+                    self.__copy_zip_part(filezip, path)
+                elif executor is not None and path in to_deflate:
+                    self.__write_deflated_part(filezip, path, next(deflated))
+                else:
+                    filezip.writestr(path, parts[path])
+        finally:
+            if executor is not None:
+                executor.shutdown()
         filezip.close()
 
 
@@ -314,6 +516,12 @@ class odf_container(object):
                 # Deleted
                 continue
             dump(path, data)
+        for path, file_path in self.__part_files.items():
+            file_name = os.path.join(folder, path)
+            dir_name = os.path.dirname(file_name)
+            if not os.path.exists(dir_name):
+                os.makedirs(dir_name, mode=0o755)
+            shutil.copyfile(file_path, file_name)
         # Manifest
         dump(ODF_MANIFEST, parts[ODF_MANIFEST])
 
@@ -336,6 +544,11 @@ class odf_container(object):
     def get_part(self, path):
         """Get the bytes of a part of the ODF.
         """
+        file_path = self.__part_files.get(path)
+        if file_path is not None:
+            # Not kept in memory
+            with open(file_path, 'rb') as file:
+                return file.read()
         loaded_parts = self.__parts
         if path in loaded_parts:
             part = loaded_parts[path]
@@ -360,15 +573,83 @@ class odf_container(object):
         return part
 
 
+    def get_part_size(self, path):
+        """Return the size of a part of the ODF, and its CRC-32 if the Zip
+        directory tells it, else None. A zipped part is not decompressed.
+
+        Return: (int, int or None)
+        """
+        file_path = self.__part_files.get(path)
+        if file_path is not None:
+            return os.path.getsize(file_path), None
+        loaded_parts = self.__parts
+        if path in loaded_parts:
+            part = loaded_parts[path]
+            if part is None:
+                raise ValueError('part "%s" is deleted' % path)
+            if type(part) is str:
+                part = part.encode('utf-8')
+            return len(part), None
+        if self.__packaging == 'zip':
+            info = self.__get_zipfile().getinfo(path)
+            return info.file_size, info.CRC
+        elif self.__packaging == 'folder':
+            return os.path.getsize(os.path.join(self.__data, path)), None
+        return len(self.__get_xml_part(path)), None
+
+
+    def open_part(self, path):
+        """Return a file-like object reading the bytes of a part of the ODF.
+
+        Unlike "get_part", a zipped part is decompressed on the fly and is not
+        kept in the cache of loaded parts. The caller must close it.
+        """
+        file_path = self.__part_files.get(path)
+        if file_path is not None:
+            return open(file_path, 'rb')
+        loaded_parts = self.__parts
+        if path in loaded_parts:
+            part = loaded_parts[path]
+            if part is None:
+                raise ValueError('part "%s" is deleted' % path)
+            if type(part) is str:
+                part = part.encode('utf-8')
+            return BytesIO(part)
+        if self.__packaging == 'zip':
+            return self.__get_zipfile().open(path)
+        elif self.__packaging == 'folder':
+            return open(os.path.join(self.__data, path), 'rb')
+        return BytesIO(self.__get_xml_part(path))
+
+
     def set_part(self, path, data):
         """Replace or add a new part.
         """
+        self.__part_files.pop(path, None)
         self.__parts[path] = data
 
 
+    def set_part_file(self, path, file_path):
+        """Replace or add a new part with the content of the given file.
+
+        The file is not read now but copied to the archive when saving, by
+        chunks, so it must be kept until then. Such parts cannot be saved in
+        a flat ODF.
+
+        Arguments:
+
+            path -- str
+
+            file_path -- str
+        """
+        self.__parts.pop(path, None)
+        self.__part_files[path] = file_path
+
+
     def del_part(self, path):
         """Mark a part for deletion.
         """
+        self.__part_files.pop(path, None)
         self.__parts[path] = None
 
 
@@ -382,6 +663,12 @@ class odf_container(object):
             # but can be recreated from "__data"
             if name in ('path', '_odf_container__zipfile'):
                 setattr(clone, name, None)
+            elif name == '_odf_container__close_data':
+                # Closed by the original container
+                setattr(clone, name, False)
+            elif name == '_odf_container__data':
+                # Read-only source, shared
+                setattr(clone, name, self.__data)
             else:
                 value = getattr(self, name)
                 value = deepcopy(value)
@@ -389,6 +676,27 @@ class odf_container(object):
         return clone
 
 
+    def close(self):
+        """Close the source file a lazy container opened from a path. Its
+        untouched parts can no longer be read nor saved. The clones share
+        this file: close the original container last.
+        """
+        if self.__zipfile is not None:
+            self.__zipfile.close()
+            self.__zipfile = None
+        if self.__close_data:
+            self.__data.close()
+            self.__close_data = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
     def _do_backup(self, target):
         parts = target.split('.', 1)
         if len(parts) == 1:
@@ -407,7 +715,7 @@ class odf_container(object):
                 printwarn(str(e))
 
 
-    def save(self, target=None, packaging=None, backup=False):
+    def save(self, target=None, packaging=None, backup=False, workers=None):
         """Save the container to the given target, a path or a file-like
         object.
 
@@ -421,6 +729,9 @@ class odf_container(object):
             packaging -- 'zip' or 'flat', or for debugging purpose 'folder'
 
             backup -- boolean
+
+            workers -- int, number of threads compressing the parts of a
+                       Zip ODF
         """
         if isinstance(target, str) and not isinstance(target, str):
             encoding = sys.getfilesystemencoding()
@@ -435,12 +746,19 @@ class odf_container(object):
         packaging = packaging.strip().lower()
         if packaging not in ('zip', 'flat', 'folder'):
             raise ValueError('packaging type "%s" not supported' % packaging)
-        # Load parts else they will be considered deleted
-        for path in self.get_parts():
-            if path not in parts:
-                self.get_part(path)
+        if packaging == 'flat' and self.__part_files:
+            raise ValueError('parts added from files cannot be saved in a '
+                             'flat ODF')
+        # Load parts else they will be considered deleted, unless they are
+        # copied as is from the source Zip by "__save_zip"
+        copy_parts = packaging == 'zip' and self.__packaging == 'zip'
+        if not copy_parts:
+            for path in self.get_parts():
+                if path not in parts and path not in self.__part_files:
+                    self.get_part(path)
         # Open output file
         close_after = False
+        replace_after = None
         if target is None:
             target = self.path
         if isinstance(target, str):
@@ -452,7 +770,15 @@ class odf_container(object):
             if isinstance(target, str):
                 if backup:
                     self._do_backup(target)
-                dest_file = open(target, 'wb')
+                if (copy_parts and self.__lazy and self.path is not None
+                        and os.path.exists(target)
+                        and os.path.samefile(target, self.path)):
+                    # The source is still read, write aside and replace it
+                    fd, replace_after = mkstemp(
+                            dir=os.path.dirname(os.path.abspath(target)))
+                    dest_file = os.fdopen(fd, 'wb')
+                else:
+                    dest_file = open(target, 'wb')
                 close_after = True
             else:
                 dest_file = target
@@ -474,23 +800,38 @@ class odf_container(object):
             os.mkdir(target, 0o777)
             dest_file = target
         # Serialize
-        if packaging == 'zip':
-            self.__save_zip(dest_file)
-        elif packaging == 'flat':
-            self.__save_xml(dest_file)
-        else: # folder
-            self.__save_folder(dest_file)
+        try:
+            if packaging == 'zip':
+                self.__save_zip(dest_file, workers=workers)
+            elif packaging == 'flat':
+                self.__save_xml(dest_file)
+            else: # folder
+                self.__save_folder(dest_file)
+        except BaseException:
+            if close_after:
+                dest_file.close()
+            # The target is left untouched
+            if replace_after is not None:
+                os.remove(replace_after)
+            raise
         # Close files we opened ourselves
         if close_after:
             dest_file.close()
+        if replace_after is not None:
+            # Keep the permissions of the target, not those of mkstemp
+            shutil.copymode(target, replace_after)
+            os.replace(replace_after, target)
 
 
 
-def odf_get_container(path_or_file):
+def odf_get_container(path_or_file, lazy=False):
     """Return an odf_container instance of the ODF document stored at the
     given local path or in the given (open) file-like object.
+
+    If "lazy" is True, a zipped document is not read into memory: the
+    (seekable) file is kept open and members are read on demand.
     """
-    return odf_container(path_or_file)
+    return odf_container(path_or_file, lazy=lazy)
 
 
 
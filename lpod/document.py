@@ -31,9 +31,18 @@
 import sys
 import os
 from copy import deepcopy
+from hashlib import sha1
+from io import BytesIO
 from mimetypes import guess_type
 from operator import itemgetter
 from uuid import uuid4
+from time import localtime
+from types import MappingProxyType
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+from zlib import crc32
+
+# Import from lxml
+from lxml.etree import iterparse
 
 # Import from lpod
 from .__init__ import __version__
@@ -41,17 +50,29 @@ from .const import ODF_CONTENT, ODF_META, ODF_SETTINGS, ODF_STYLES
 from .const import ODF_MANIFEST
 from .container import odf_get_container, odf_new_container, odf_container
 from .content import odf_content
+from .element import ODF_NAMESPACES, _style_reference_attributes
+from .element import _make_odf_element
 from .manifest import odf_manifest
 from .meta import odf_meta
 from .style import odf_style, odf_master_page, odf_font_style, odf_page_layout
 from .style import registered_styles
 from .styles import odf_styles
+from .table import _iter_table_rows, _free_element, odf_table_writer
 #from utils import obsolete
 from .xmlpart import odf_xmlpart
 
 
 underline_lvl = ['=', '-', ':', '`', "'", '"', '~', '^', '_', '*', '+']
 
+# Names given to the automatic styles inserted with no name
+_auto_style_prefix = 'lpod_auto_'
+
+# Attributes not making two automatic styles different
+_auto_style_ignored = ('style:name', 'style:display-name')
+
+# Chunks of added files read at once
+_digest_chunk_size = 1024 * 1024
+
 
 def _show_styles(element, level=0):
     output = []
@@ -100,6 +121,47 @@ def _get_part_path(path):
 
 
 
+def _get_file_keys(file):
+    """Return the SHA-1 hex digest, the size and the CRC-32 of the content of
+    the given file, read by chunks.
+    """
+    digest = sha1()
+    size = crc = 0
+    while True:
+        chunk = file.read(_digest_chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        crc = crc32(chunk, crc)
+    return digest.hexdigest(), size, crc
+
+
+
+_tag_body = '{%s}body' % ODF_NAMESPACES['office']
+
+def _iter_body_children(file):
+    """Yield the children of the body (office:text, office:presentation...)
+    of the given "content.xml" file-like object, read incrementally.
+
+    Only one child is alive at a time: it is parsed, yielded, then freed
+    before the next one is parsed.
+    """
+    depth = 0
+    for event, element in iterparse(file, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1 and element.tag != _tag_body:
+            # Automatic styles, font declarations, etc.
+            _free_element(element)
+        elif depth == 3 and element.getparent().getparent().tag == _tag_body:
+            yield _make_odf_element(element)
+            _free_element(element)
+
+
+
 def _get_part_class(path):
     return {ODF_CONTENT: odf_content,
             ODF_META: odf_meta,
@@ -121,6 +183,19 @@ class odf_document(object):
         self.__xmlparts = {}
         # Cache of the body
         self.__body = None
+        # Index the named elements of the XML parts
+        self.__name_index = False
+        # Files added or already in Pictures/, by digest of their content,
+        # see add_file
+        self.__media_digests = None
+        # Files in Pictures/ not hashed yet, by size, see add_file
+        self.__media_sizes = None
+        # Cache of the effective style properties, see get_style_properties
+        self.__style_properties = {}
+        # Next number of the "lpod_auto_N" names, by family
+        self.__auto_style_numbers = {}
+        # Automatic styles inserted, by family and content, see insert_style
+        self.__auto_style_keys = {}
 
 
     #
@@ -155,6 +230,8 @@ class odf_document(object):
         part = xmlparts.get(path)
         if part is None:
             xmlparts[path] = part = cls(path, container)
+            if self.__name_index:
+                part.enable_name_index()
         return part
 
 
@@ -169,6 +246,7 @@ class odf_document(object):
         # XML part overwritten
         if cls is not None:
             del self.__xmlparts[path]
+            self.__reset_style_caches()
         return self.container.set_part(path, data)
 
 
@@ -199,6 +277,8 @@ class odf_document(object):
         # The mimetype must be with the form:
         # application/vnd.oasis.opendocument.text
         mimetype = self.get_mimetype()
+        if type(mimetype) is bytes:
+            mimetype = mimetype.decode('utf-8')
 
         # Isolate and return the last part
         return mimetype.rsplit('.', 1)[-1]
@@ -214,7 +294,97 @@ class odf_document(object):
         return self.__body
 
 
+    def replace_many(self, replacements, regex=False, across_spans=False):
+        """Replace all the given patterns at once in the body and in the
+        headers and footers of the master pages, and return the number of
+        replacements.
+
+        See odf_element.replace_many.
+
+        Arguments:
+
+            replacements -- dict or list of (unicode, unicode) tuples
+
+            regex -- bool
+
+            across_spans -- bool
+
+        Return: int
+        """
+        count = self.get_body().replace_many(replacements, regex=regex,
+                across_spans=across_spans)
+        master_styles = self.get_part(ODF_STYLES).get_element(
+                '//office:master-styles')
+        if master_styles is not None:
+            count += master_styles.replace_many(replacements, regex=regex,
+                    across_spans=across_spans)
+        return count
+
+
+    def iter_table_rows(self, name=None, position=0, get_type=False,
+            complete=False):
+        """Iterate through the rows of the table of the given name (or
+        position), yielding lists of Python values.
+
+        The content part is read incrementally, straight out of the archive,
+        so huge spreadsheets can be converted with a constant memory usage.
+        If the content part was already loaded, its current state is read.
+
+        By default, empty cells at the right of the rows and empty rows at
+        the end of the table are stripped. If complete is True, the rows are
+        completed with None up to the width of the table and trailing empty
+        rows are kept, like odf_table.iter_values().
+
+        If get_type is True, yield tuples (value, ODF type of value), or
+        (None, None) for empty cells.
+
+        Arguments:
+
+            name -- unicode
+
+            position -- int
+
+            get_type -- boolean
+
+            complete -- boolean
+
+        Return: iterator of lists
+
+        Raise ValueError if there is no such table.
+        """
+        content = self.__xmlparts.get(ODF_CONTENT)
+        if content is not None:
+            file = BytesIO(content.serialize().encode('utf-8'))
+        else:
+            file = self.container.open_part(ODF_CONTENT)
+        try:
+            for values in _iter_table_rows(file, name=name,
+                    position=position, get_type=get_type,
+                    complete=complete):
+                yield values
+        finally:
+            file.close()
+
+
     def get_formatted_text(self, rst_mode=False):
+        return ''.join(self.iter_formatted_text(rst_mode=rst_mode))
+
+
+    def iter_formatted_text(self, rst_mode=False):
+        """Yield the text of the document by chunks, one per child of the
+        body, followed by its notes, annotations and images.
+
+        If the content part was not loaded, it is read incrementally,
+        straight out of the archive, and each child is freed once its text
+        is yielded. In reST mode, the styles of the content part are looked
+        up, so it is loaded anyway.
+
+        Arguments:
+
+            rst_mode -- bool
+
+        Return: iterator of unicode
+        """
         # For the moment, only "type='text'"
         type = self.get_type()
         if type not in ('text', 'text-template', 'presentation',
@@ -230,59 +400,20 @@ class odf_document(object):
                    'img_counter': 0,
                    'images': [],
                    'no_img_level': 0}
-        body = self.get_body()
-        # Get the text
-        result = []
-        for element in body.get_children():
-            if element.get_tag() == 'table:table':
-                result.append(element.get_formatted_text(context))
-            else:
-                result.append(element.get_formatted_text(context))
-                # Insert the notes
-                footnotes = context['footnotes']
-                # Separate text from notes
-                if footnotes:
-                    if rst_mode:
-                        result.append('\n')
-                    else:
-                        result.append('----\n')
-                    for citation, body in footnotes:
-                        if rst_mode:
-                            result.append('.. [#] %s\n' % body)
-                        else:
-                            result.append('[%s] %s\n' % (citation, body))
-                    # Append a \n after the notes
-                    result.append('\n')
-                    # Reset for the next paragraph
-                    context['footnotes'] = []
-                # Insert the annotations
-                annotations = context['annotations']
-                # With a separation
-                if annotations:
-                    if rst_mode:
-                        result.append('\n')
-                    else:
-                        result.append('----\n')
-                    for annotation in annotations:
-                        if rst_mode:
-                            result.append('.. [#] %s\n' % annotation)
-                        else:
-                            result.append('[*] %s\n' % annotation)
-                    context['annotations'] = []
-                # Insert the images ref, only in rst mode
-                images = context['images']
-                if images:
-                    result.append('\n')
-                    for ref, filename, (width, height) in images:
-                        result.append('.. %s image:: %s\n' %
-                                      (ref, filename))
-                        if width is not None:
-                            result.append('   :width: %s\n' % width)
-                        if height is not None:
-                            result.append('   :height: %s\n' % height)
-                        result.append('\n')
-                    context['images'] = []
+        if rst_mode or ODF_CONTENT in self.__xmlparts:
+            file = None
+            children = self.get_body().iter_children()
+        else:
+            file = self.container.open_part(ODF_CONTENT)
+            children = _iter_body_children(file)
+        try:
+            for element in children:
+                yield self.__get_formatted_chunk(element, context)
+        finally:
+            if file is not None:
+                file.close()
         # Append the end notes
+        result = []
         endnotes = context['endnotes']
         if endnotes:
             if rst_mode:
@@ -294,6 +425,78 @@ class odf_document(object):
                     result.append('.. [*] %s\n' % body)
                 else:
                     result.append('(%s) %s\n' % (citation, body))
+        if result:
+            yield ''.join(result)
+
+
+    def write_formatted_text(self, file, rst_mode=False):
+        """Write the text of the document to the given file-like object,
+        chunk by chunk. See iter_formatted_text.
+
+        Arguments:
+
+            file -- file-like object opened in text mode
+
+            rst_mode -- bool
+        """
+        for chunk in self.iter_formatted_text(rst_mode=rst_mode):
+            file.write(chunk)
+
+
+    def __get_formatted_chunk(self, element, context):
+        """Return the text of the given child of the body, followed by its
+        notes, annotations and images.
+        """
+        rst_mode = context['rst_mode']
+        result = []
+        if element.get_tag() == 'table:table':
+            result.append(element.get_formatted_text(context))
+        else:
+            result.append(element.get_formatted_text(context))
+            # Insert the notes
+            footnotes = context['footnotes']
+            # Separate text from notes
+            if footnotes:
+                if rst_mode:
+                    result.append('\n')
+                else:
+                    result.append('----\n')
+                for citation, body in footnotes:
+                    if rst_mode:
+                        result.append('.. [#] %s\n' % body)
+                    else:
+                        result.append('[%s] %s\n' % (citation, body))
+                # Append a \n after the notes
+                result.append('\n')
+                # Reset for the next paragraph
+                context['footnotes'] = []
+            # Insert the annotations
+            annotations = context['annotations']
+            # With a separation
+            if annotations:
+                if rst_mode:
+                    result.append('\n')
+                else:
+                    result.append('----\n')
+                for annotation in annotations:
+                    if rst_mode:
+                        result.append('.. [#] %s\n' % annotation)
+                    else:
+                        result.append('[*] %s\n' % annotation)
+                context['annotations'] = []
+            # Insert the images ref, only in rst mode
+            images = context['images']
+            if images:
+                result.append('\n')
+                for ref, filename, (width, height) in images:
+                    result.append('.. %s image:: %s\n' %
+                                  (ref, filename))
+                    if width is not None:
+                        result.append('   :width: %s\n' % width)
+                    if height is not None:
+                        result.append('   :height: %s\n' % height)
+                    result.append('\n')
+                context['images'] = []
         return ''.join(result)
 
 
@@ -338,44 +541,62 @@ class odf_document(object):
         return "\n".join(result) + '\n'
 
 
-    def add_file(self, path_or_file):
+    def add_file(self, path_or_file, stream=False):
         """Insert a file from a path or a fike-like object in the container.
         Return the full path to reference it in the content.
 
+        The same bytes added twice, or already in the Pictures/ folder, are
+        stored once: the full path of the first file is returned.
+
+        If "stream" is True, the file at the given path is not read in
+        memory but copied to the archive when saving, so it must be kept
+        until then. Only paths can be streamed.
+
         Arguments:
 
             path_or_file -- str or file-like
 
+            stream -- bool
+
         Return: str
         """
-        name = None
-        close_after = False
         # Folder for added files (FIXME hard-coded and copied)
         manifest = self.get_part(ODF_MANIFEST)
-        medias = manifest.get_paths()
-
-        if type(path_or_file) is str or type(path_or_file) is str:
-            path_or_file = path_or_file.encode('utf_8')
-            handler = open(path_or_file, 'rb')
+        data = None
+        if type(path_or_file) is str:
             name = path_or_file
-            close_after = True
+            with open(path_or_file, 'rb') as handler:
+                if stream:
+                    digest, size, crc = _get_file_keys(handler)
+                else:
+                    data = handler.read()
+        elif stream:
+            raise TypeError("only a path can be streamed, not %s"
+                            % type(path_or_file))
         else:
-            handler = path_or_file
-            name = getattr(_file, 'name')
-        name = os.path.basename(name)
+            name = getattr(path_or_file, 'name', None)
+            data = path_or_file.read()
+        if data is not None:
+            digest, size, crc = sha1(data).hexdigest(), len(data), crc32(data)
+        # Already added?
+        full_path = self.__find_media(digest, size, crc)
+        if (full_path is not None
+                and manifest.get_media_type(full_path) is not None):
+            return full_path
         # Generate a safe portable name
         uuid = str(uuid4())
-        if name is None:
+        if not isinstance(name, str):
             name = uuid
             media_type = ''
         else:
+            name = os.path.basename(name)
             root, extension = os.path.splitext(name)
             extension = extension.lower()
             name = root + extension
             media_type, encoding = guess_type(name)
             # Check this name is already used in the document
             fullpath = 'Pictures/%s' % name
-            if fullpath in medias:
+            if manifest.get_media_type(fullpath) is not None:
                 root = '%s_%s' % (root, uuid)
                 name = root + extension
                 media_type, encoding = guess_type(name)
@@ -384,16 +605,57 @@ class odf_document(object):
             manifest.add_full_path('Pictures/')
 
         full_path = os.path.join('Pictures', name)
-        self.container.set_part(full_path, handler.read())
+        if data is None:
+            self.container.set_part_file(full_path, path_or_file)
+        else:
+            self.container.set_part(full_path, data)
+        self.__media_digests[digest] = full_path
 
         # Update manifest
-        manifest.add_full_path(full_path, media_type)
-        # Close file
-        if close_after:
-            handler.close()
+        manifest.add_full_path(full_path, media_type or '')
         return full_path
 
 
+    def __find_media(self, digest, size, crc):
+        """Return the full path of the file in Pictures/ of the given SHA-1
+        hex digest, size and CRC-32, or None. The existing files are indexed
+        by size on the first call, and only those of the same size and CRC
+        are read, once.
+        """
+        container = self.container
+        media_digests = self.__media_digests
+        if media_digests is None:
+            media_digests = self.__media_digests = {}
+            self.__media_sizes = media_sizes = {}
+            manifest = self.get_part(ODF_MANIFEST)
+            for path in container.get_parts():
+                if (not path.startswith('Pictures/') or path.endswith('/')
+                        or manifest.get_media_type(path) is None):
+                    continue
+                try:
+                    path_size, path_crc = container.get_part_size(path)
+                except ValueError:
+                    # Deleted
+                    continue
+                media_sizes.setdefault(path_size, []).append(
+                        (path, path_crc))
+        full_path = media_digests.get(digest)
+        if full_path is not None:
+            return full_path
+        candidates = self.__media_sizes.get(size, ())
+        for candidate in list(candidates):
+            path, path_crc = candidate
+            if path_crc is not None and path_crc != crc:
+                continue
+            candidates.remove(candidate)
+            with container.open_part(path) as file:
+                path_digest = _get_file_keys(file)[0]
+            media_digests.setdefault(path_digest, path)
+            if path_digest == digest:
+                return path
+        return None
+
+
     def clone(self):
         """Return an exact copy of the document.
 
@@ -407,7 +669,13 @@ class odf_document(object):
                 xmlparts = {}
                 for key, value in self.__xmlparts.items():
                     xmlparts[key] = value.clone()
+                    if self.__name_index:
+                        xmlparts[key].enable_name_index()
                 setattr(clone, name, xmlparts)
+            elif name in ('_odf_document__style_properties',
+                    '_odf_document__auto_style_numbers',
+                    '_odf_document__auto_style_keys'):
+                setattr(clone, name, {})
             else:
                 value = getattr(self, name)
                 value = deepcopy(value)
@@ -415,7 +683,8 @@ class odf_document(object):
         return clone
 
 
-    def save(self, target=None, packaging=None, pretty=False, backup=False):
+    def save(self, target=None, packaging=None, pretty=False, backup=False,
+             workers=None):
         """Save the document, at the same place it was opened or at the given
         target path. Target can also be a file-like object. It can be saved
         as a Zip file (default) or a flat XML file (unimplemented). XML parts
@@ -430,6 +699,8 @@ class odf_document(object):
             pretty -- bool
 
             backup -- boolean
+
+            workers -- int, number of threads compressing the parts
         """
         # Some advertising
         meta = self.get_part(ODF_META)
@@ -441,7 +712,45 @@ class odf_document(object):
             if part is not None:
                 container.set_part(path, part.serialize(pretty))
         # Save the container
-        container.save(target, packaging=packaging, backup=backup)
+        container.save(target, packaging=packaging, backup=backup,
+                       workers=workers)
+
+
+    def close(self):
+        """Close the source file of a document opened lazily from a path,
+        see odf_container.close.
+        """
+        self.container.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def enable_name_index(self):
+        """Index the named elements of the content and styles parts, so that
+        looking up a style, a table, a bookmark, a note, a frame... by name
+        costs no scan of the part. See odf_xmlpart.enable_name_index.
+        """
+        self.__name_index = True
+        for path in (ODF_CONTENT, ODF_STYLES):
+            self.get_part(path)
+        for part in self.__xmlparts.values():
+            if part is not None:
+                part.enable_name_index()
+
+
+    def disable_name_index(self):
+        """Drop the indexes of the named elements of the XML parts.
+        """
+        self.__name_index = False
+        for part in self.__xmlparts.values():
+            if part is not None:
+                part.disable_name_index()
 
 
     #
@@ -495,7 +804,9 @@ class odf_document(object):
         was created with no name, the given can be set on the fly.
 
         If automatic is True, the style will be inserted as an automatic
-        style.
+        style. An automatic style with no name is given an "lpod_auto_N"
+        name, unless an identical automatic style was already inserted: the
+        style is then given its name and not inserted.
 
         If default is True, the style will be inserted as a default style and
         would replace any existing default style of the same family. Any name
@@ -560,26 +871,33 @@ class odf_document(object):
 
                 # A name ?
                 if name is None:
-                    # Make a beautiful name
+                    # Reuse an identical style
+                    key = style._get_content_key(_auto_style_ignored)
+                    interned = self.__get_auto_style(family, key,
+                            container)
+                    if interned is not None:
+                        name = interned.get_name()
+                        style.set_name(name)
+                        return name
 
+                    # Make a beautiful name
                     # TODO: Use prefixes of Ooo: Mpm1, ...
-                    prefix = 'lpod_auto_'
-
-                    styles = self.get_styles(family=family, automatic=True)
-                    names = [ s.get_name () for s in styles ]
-                    numbers = [ int(name[len(prefix):]) for name in names
-                                if name and name.startswith(prefix) ]
-                    if numbers:
-                        number = max(numbers) + 1
-                    else:
-                        number = 1
-                    name = prefix + str(number)
+                    numbers = self.__auto_style_numbers
+                    while True:
+                        number = numbers[family]
+                        numbers[family] = number + 1
+                        name = _auto_style_prefix + str(number)
+                        # Maybe taken by a style appended by other means
+                        if container.get_style(family, name) is None:
+                            break
 
                     # And set it
                     style.set_name(name)
+                    self.__auto_style_keys[family][key] = style
                     existing = None
                 else:
                     existing = part.get_style(family, name)
+                    self.__set_auto_style_number(family, name)
 
             # Default style
             elif automatic is False and default is True:
@@ -604,12 +922,168 @@ class odf_document(object):
         if existing is not None:
             container.delete(existing)
         container.append(style)
+        self.__style_properties.clear()
         return style.get_name()
 
 
+    def __reset_style_caches(self):
+        self.__style_properties.clear()
+        self.__auto_style_numbers.clear()
+        self.__auto_style_keys.clear()
+
+
+    def __get_auto_style(self, family, key, container):
+        """Return the automatic style of the given family and content
+        inserted before, or None. The automatic styles of the family are
+        indexed on the first call.
+        """
+        keys = self.__auto_style_keys.get(family)
+        if keys is None:
+            self.__auto_style_keys[family] = keys = {}
+            self.__auto_style_numbers[family] = 1
+            for style in self.get_styles(family=family, automatic=True):
+                name = style.get_name()
+                if name is None:
+                    continue
+                self.__set_auto_style_number(family, name)
+                parent = style.get_parent()
+                if parent is not None and parent._is_same(container):
+                    keys.setdefault(style._get_content_key(
+                        _auto_style_ignored), style)
+        style = keys.get(key)
+        if style is None:
+            return None
+        # Deleted or modified since
+        parent = style.get_parent()
+        if (parent is None or not parent._is_same(container)
+                or style._get_content_key(_auto_style_ignored) != key):
+            del keys[key]
+            return None
+        return style
+
+
+    def __set_auto_style_number(self, family, name):
+        """Keep the "lpod_auto_N" names to come after the given one.
+        """
+        numbers = self.__auto_style_numbers
+        if family not in numbers or not name.startswith(_auto_style_prefix):
+            return
+        number = name[len(_auto_style_prefix):]
+        if number.isdigit():
+            numbers[family] = max(numbers[family], int(number) + 1)
+
+
+    def compact_styles(self):
+        """Merge the identical automatic styles of the content and of the
+        styles, only differing by their names, and rewrite the references
+        to the removed ones. Repeated until styles only differing by the
+        styles they reference are merged too.
+
+        Return: number of deleted styles
+        """
+        # Names shared by several styles are ambiguous in references
+        counts = {}
+        for style in self.get_styles():
+            name = style.get_name()
+            counts[name] = counts.get(name, 0) + 1
+        i = 0
+        for part_name in (ODF_CONTENT, ODF_STYLES):
+            part = self.get_part(part_name)
+            container = part.get_element('//office:automatic-styles')
+            if container is None:
+                continue
+            while True:
+                kept = {}
+                renamed = {}
+                for style in container.get_children():
+                    name = style.get_attribute('style:name')
+                    if name is None or counts.get(name) != 1:
+                        continue
+                    key = style._get_content_key(_auto_style_ignored)
+                    first = kept.setdefault(key, style)
+                    if first is not style:
+                        renamed[name] = first.get_attribute('style:name')
+                        style.delete()
+                if not renamed:
+                    break
+                usage = part.get_root().get_style_usage()
+                # The renamed names are unique whatever the family
+                for (family, name), elements in usage.items():
+                    new_name = renamed.get(name)
+                    if new_name is None:
+                        continue
+                    for element in elements:
+                        for attribute in _style_reference_attributes:
+                            if element.get_attribute(attribute) == name:
+                                element.set_attribute(attribute, new_name)
+                i += len(renamed)
+        self.__reset_style_caches()
+        return i
+
+
+    def get_style_properties(self, family, name=None, area=None):
+        """Return the effective properties of the given style: those of the
+        default style of the family, overridden by those of its parent
+        styles, overridden by its own. The default style is fetched if the
+        name is None.
+
+        The result, or the absence of the style, is computed once and then
+        cached until the styles are changed through insert_style,
+        merge_styles_from, delete_styles or purge_unused_styles. Properties
+        set on the style elements directly are not tracked.
+
+        Arguments:
+
+            family -- 'paragraph', 'text', 'graphic', 'table'...
+
+            name -- unicode or None
+
+            area -- str, identical to the family by default
+
+        Return: read-only dict or None if the style is not found
+        """
+        cache = self.__style_properties
+        key = (family, name, area)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        if name is None:
+            style = self.get_style(family)
+            properties = {}
+        else:
+            style = self.get_style(family, name)
+            # Missing styles are cached too
+            cache[key] = None
+            if style is None:
+                return None
+            # Meanwhile None guards against parent style loops
+            try:
+                parent = style.get_parent_style()
+                inherited = None
+                if parent is not None:
+                    inherited = self.get_style_properties(family, parent,
+                            area=area)
+                if inherited is None:
+                    inherited = self.get_style_properties(family, area=area)
+            finally:
+                # Cached below, unless the resolution failed
+                del cache[key]
+            properties = dict(inherited)
+        if style is not None:
+            own = style.get_properties(area=area) or {}
+            for attribute, value in own.items():
+                # Nested properties are read-only too
+                if type(value) is dict:
+                    value = MappingProxyType(value)
+                properties[attribute] = value
+        cache[key] = properties = MappingProxyType(properties)
+        return properties
+
+
     def get_styled_elements(self, name=True):
-        """Brute-force to find paragraphs, tables, etc. using the given style
-        name (or all by default).
+        """Find paragraphs, tables, etc. using the given style name (or all
+        by default).
 
         Arguments:
 
@@ -624,8 +1098,102 @@ class odf_document(object):
                 + styles.get_root().get_styled_elements(name))
 
 
+    def get_style_usage(self):
+        """Map the family and name of every style referenced in the content
+        and the styles to the elements referencing it, in a single traversal
+        of both parts.
+
+        Styles referencing other styles (parent, list, data style...) are
+        included. The family is None when the reference does not tell it,
+        e.g. for data styles.
+
+        Return: dict of (str, unicode): list of odf_element
+        """
+        usage = self.get_part(ODF_CONTENT).get_root().get_style_usage()
+        # Header, footer, etc. have styles too
+        styles = self.get_part(ODF_STYLES).get_root().get_style_usage()
+        for key, elements in styles.items():
+            usage.setdefault(key, []).extend(elements)
+        return usage
+
+
+    def __is_style_used(self, style, usage):
+        """Tell whether the given style is in the map returned by
+        get_style_usage, by family and name.
+        """
+        name = style.get_name()
+        return ((style._get_style_family(), name) in usage
+                or (None, name) in usage)
+
+
+    def get_unused_styles(self, automatic=True, common=False):
+        """Return the named styles that no element nor style references.
+
+        Default styles, the outline style and master pages are never
+        returned. Common styles are only returned on demand, since they are
+        meant to be offered in desktop applications even when not used.
+
+        Arguments:
+
+            automatic -- bool
+
+            common -- bool
+
+        Return: list of odf_style
+        """
+        usage = self.get_style_usage()
+        result = []
+        for style in self.get_styles():
+            name = style.get_name()
+            if name is None or self.__is_style_used(style, usage):
+                continue
+            # The outline style applies to headings without a reference
+            if style.get_tag() == 'text:outline-style':
+                continue
+            container = style.get_parent().get_tag()
+            if container == 'office:automatic-styles':
+                if automatic is False:
+                    continue
+            elif container == 'office:styles':
+                if common is False:
+                    continue
+            else:
+                # Master pages
+                continue
+            result.append(style)
+        return result
+
+
+    def purge_unused_styles(self, automatic=True, common=False):
+        """Delete the named styles that no element nor style references,
+        including those only referenced by the deleted styles.
+
+        See get_unused_styles.
+
+        Arguments:
+
+            automatic -- bool
+
+            common -- bool
+
+        Return: number of deleted styles
+        """
+        i = 0
+        while True:
+            unused = self.get_unused_styles(automatic=automatic,
+                    common=common)
+            if not unused:
+                break
+            for style in unused:
+                style.delete()
+            i += len(unused)
+        self.__reset_style_caches()
+        return i
+
+
     def show_styles(self, automatic=True, common=True, properties=False):
         infos = []
+        usage = self.get_style_usage()
         for style in self.get_styles():
             name = style.get_name()
             is_auto = (style.get_parent().get_tag()
@@ -633,7 +1201,7 @@ class odf_document(object):
             if (is_auto and automatic is False
                     or not is_auto and common is False):
                 continue
-            is_used = bool(self.get_styled_elements(name))
+            is_used = self.__is_style_used(style, usage)
             infos.append({'type': "auto  " if is_auto else "common",
                           'used': "y" if is_used else "n",
                           'family': style.get_family() or "",
@@ -690,6 +1258,7 @@ class odf_document(object):
             #    continue
             style.delete()
             i += 1
+        self.__reset_style_caches()
         return i
 
 
@@ -748,6 +1317,7 @@ class odf_document(object):
                 self.set_part(url, part)
                 media_type = document_manifest.get_media_type(url)
                 manifest.add_full_path(url, media_type)
+        self.__reset_style_caches()
 
 
 
@@ -755,10 +1325,15 @@ class odf_document(object):
 # odf_document factories
 #
 
-def odf_get_document(path_or_file):
+def odf_get_document(path_or_file, lazy=False):
     """Return an "odf_document" instance of the ODF document stored at the
     given local path or in the given (open) file-like object.
 
+    If "lazy" is True, the (seekable) file of a zipped document is kept
+    open and its parts are read on demand, instead of reading the whole
+    file in memory. Parts left untouched are copied from the source
+    when saving.
+
     Examples::
 
         >>> document = odf_get_document('/tmp/document.odt')
@@ -766,8 +1341,11 @@ def odf_get_document(path_or_file):
         >>> document = odf_get_document(stringio)
         >>> file = urllib.urlopen('http://example.com/document.odt')
         >>> document = odf_get_document(file)
+
+        >>> with odf_get_document('/tmp/big.odp', lazy=True) as document:
+        ...     document.save('/tmp/copy.odp')
     """
-    container = odf_get_container(path_or_file)
+    container = odf_get_container(path_or_file, lazy=lazy)
     return odf_document(container)
 
 
@@ -794,3 +1372,156 @@ def odf_new_document(path_or_file):
     """
     container = odf_new_container(path_or_file)
     return odf_document(container)
+
+
+
+class odf_spreadsheet_stream_writer(object):
+    """Write a spreadsheet document row by row, straight into the Zip
+    archive. Rows are serialized and compressed as they are appended, so
+    memory stays flat whatever the size of the tables. The other parts are
+    copied from the template when the writer is closed. Leaving the "with"
+    block on an exception drops the partial output instead: a target path
+    is removed, a seekable file is truncated back to where the writer
+    started.
+
+    Example::
+
+        >>> with odf_spreadsheet_stream_writer('/tmp/report.ods') as writer:
+        ...     table = writer.add_table('Report')
+        ...     table.append_row(['Name', 'Total'])
+        ...     for name, total in records:
+        ...         table.append_row([name, total])
+    """
+
+    def __init__(self, target, template='spreadsheet'):
+        """Open the target and write the beginning of the document.
+
+        Arguments:
+
+            target -- str or file-like object
+
+            template -- str, a template type or path, see
+                        ``odf_new_document``
+        """
+        document = odf_new_document(template)
+        if document.get_type() != 'spreadsheet':
+            raise ValueError('template is not a spreadsheet')
+        # Split the content around the (emptied) spreadsheet body
+        content = document.get_part(ODF_CONTENT)
+        body = content.get_body()
+        for table in body.get_elements('table:table'):
+            body.delete(table)
+        marker = uuid4().hex
+        body.set_text(marker)
+        header, footer = content.serialize().split(marker)
+        self.__document = document
+        self.__footer = footer.encode('utf-8')
+        self.__path = target if isinstance(target, str) else None
+        self.__start = None
+        if (self.__path is None and hasattr(target, 'seekable')
+                and target.seekable()):
+            self.__start = target.tell()
+        compression = ZIP_DEFLATED
+        try:
+            filezip = ZipFile(target, 'w', compression=compression)
+        except RuntimeError:
+            # No zlib module
+            compression = ZIP_STORED
+            filezip = ZipFile(target, 'w', compression=compression)
+        self.__zipfile = filezip
+        # mimetype requires to be first and uncompressed
+        filezip.compression = ZIP_STORED
+        filezip.writestr('mimetype',
+                document.container.get_part('mimetype'))
+        filezip.compression = compression
+        info = ZipInfo(ODF_CONTENT, date_time=localtime()[:6])
+        info.compress_type = compression
+        self.__file = filezip.open(info, 'w')
+        self.__file.write(header.encode('utf-8'))
+        self.__table = None
+        self.closed = False
+
+
+    def add_table(self, name, width=None, style=None):
+        """Start a new table, ending the previous one.
+
+        Arguments:
+
+            name -- unicode
+
+            width -- int, number of columns, else given by the first row
+
+            style -- unicode
+
+        Return: odf_table_writer
+        """
+        if self.closed:
+            raise ValueError('writer is closed')
+        if self.__table is not None:
+            self.__table.close()
+        self.__table = odf_table_writer(self.__file, name, width=width,
+                style=style)
+        return self.__table
+
+
+    def close(self):
+        """End the content and write the other parts of the document.
+        """
+        if self.closed:
+            return
+        if self.__table is not None:
+            self.__table.close()
+        self.__file.write(self.__footer)
+        self.__file.close()
+        document = self.__document
+        container = document.container
+        filezip = self.__zipfile
+        # Some advertising
+        meta = document.get_part(ODF_META)
+        if not meta._generator_modified:
+            meta.set_generator("lpOD Python %s" % __version__)
+        part_names = container.get_parts()
+        for path in ODF_META, ODF_SETTINGS, ODF_STYLES:
+            if path in part_names:
+                filezip.writestr(path, document.get_part(path).serialize())
+        for path in part_names:
+            if path in ('mimetype', ODF_CONTENT, ODF_META, ODF_SETTINGS,
+                    ODF_STYLES, ODF_MANIFEST):
+                continue
+            filezip.writestr(path, container.get_part(path))
+        filezip.writestr(ODF_MANIFEST, container.get_part(ODF_MANIFEST))
+        filezip.close()
+        self.closed = True
+
+
+    def abort(self):
+        """Stop writing without ending the document, and drop what was
+        written when possible, see the class documentation.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        filezip = self.__zipfile
+        try:
+            self.__file.close()
+        finally:
+            # No ending records
+            fp = filezip.fp
+            filezip.fp = None
+            if self.__path is not None:
+                fp.close()
+                os.remove(self.__path)
+            elif self.__start is not None:
+                fp.seek(self.__start)
+                fp.truncate()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
@@ -28,7 +28,10 @@
 
 # Import from the Standard Library
 import sys
+from bisect import bisect_right
+from collections import OrderedDict
 from copy import deepcopy
+from weakref import WeakKeyDictionary, WeakValueDictionary
 import re
 
 # Import from lxml
@@ -39,6 +42,8 @@ from lxml.etree import XPath
 # Import from lpod
 from .datatype import DateTime, Boolean
 from .utils import _get_abspath, _get_elements, _get_element
+from .utils import _iter_elements, _count_elements
+from .utils import _position_map, _make_xpath_attributes
 from .utils import _get_style_tagname, get_value  #, obsolete
 from .utils import _get_style_tagname, get_value
 
@@ -84,7 +89,15 @@ FIRST_CHILD, LAST_CHILD, NEXT_SIBLING, PREV_SIBLING, STOPMARKER = list(range(5))
 
 ns_stripper = re.compile(r' xmlns:\w*="[\w:\-\/\.#]*"')
 
-__xpath_query_cache = {}
+# Compiled XPath queries, least recently used first
+__xpath_query_cache = OrderedDict()
+__xpath_query_cache_max = 1000
+__xpath_query_cache_stats = {'hits': 0, 'misses': 0}
+
+# Parsed documents of the elements already created, least recently used
+# first, see odf_create_element
+__element_prototypes = OrderedDict()
+__element_prototypes_max = 1000
 
 # An empty XML document with all namespaces declared
 ns_document_path = _get_abspath('templates/namespaces.xml')
@@ -133,13 +146,36 @@ def _xpath_compile(path):
 
 
 def _find_query_in_cache(query):
-    xpath = __xpath_query_cache.get(query, None)
+    cache = __xpath_query_cache
+    stats = __xpath_query_cache_stats
+    xpath = cache.get(query, None)
     if xpath is None:
+        stats['misses'] += 1
         xpath = _xpath_compile(query)
-        __xpath_query_cache[query] = xpath
+        cache[query] = xpath
+        if len(cache) > __xpath_query_cache_max:
+            cache.popitem(last=False)
+    else:
+        stats['hits'] += 1
+        cache.move_to_end(query)
     return xpath
 
 
+
+def xpath_cache_info():
+    """Return the statistics of the cache of compiled XPath queries.
+
+    Queries built by lpOD pass values as XPath variables, so the cache holds
+    one entry per shape of query.
+
+    Return: dict with 'hits', 'misses', 'size' and 'maxsize' keys
+    """
+    info = dict(__xpath_query_cache_stats)
+    info['size'] = len(__xpath_query_cache)
+    info['maxsize'] = __xpath_query_cache_max
+    return info
+
+
 _xpath_text = _find_query_in_cache("//text()")   #  descendant and self
 _xpath_text_descendant = _find_query_in_cache("descendant::text()")
 _xpath_text_main = _find_query_in_cache(
@@ -182,17 +218,29 @@ def register_element_class(qname, cls, family=None, caching=False):
 
 
 
+# The wrappers in use, by lxml element, see _make_odf_element
+__element_wrappers = WeakValueDictionary()
+
+_family_attribute = "{%s}family" % ODF_NAMESPACES['style']
+
 def _make_odf_element(native_element, cache=None):
     """Turn an lxml Element into an odf_element (or the registered subclass).
 
+    As long as it is referenced, the same wrapper is returned for the same
+    element, unless its class keeps a state of its own (see
+    "odf_element._reuse_wrapper").
+
     Arguments:
 
         native_element -- lxml.Element
 
     Return: odf_element
     """
+    element = __element_wrappers.get(native_element)
+    if element is not None:
+        return element
     tag = native_element.tag
-    family = native_element.get("{%s}family" % ODF_NAMESPACES['style'])
+    family = native_element.get(_family_attribute)
     cls, caching = __class_registry.get((tag, family), (None, None))
     if cls is None and family is not None:
         cls, caching = __class_registry.get((tag, None), (None, None))
@@ -200,8 +248,847 @@ def _make_odf_element(native_element, cache=None):
         cls = odf_element
     if caching:
         return cls(native_element, cache)
+    element = cls(native_element)
+    if cls._reuse_wrapper:
+        __element_wrappers[native_element] = element
+    return element
+
+
+
+def _forget_odf_element(native_element):
+    """Drop the wrapper of the given lxml Element, when its tag or family
+    changes its class.
+    """
+    __element_wrappers.pop(native_element, None)
+
+
+
+# Queries iter_elements can answer with lxml iterators instead of XPath:
+# "prefix:name" (children) or "descendant::prefix:name"
+_iter_tag_query = re.compile(r'^(descendant::)?(\w+:[\w-]+)$')
+
+
+# Name indexes of the trees where enabled, by root lxml element, see
+# odf_xmlpart.enable_name_index
+__name_indexes = {}
+
+# The attribute naming the elements indexed, by tag
+_indexed_attributes = {}
+for __qname, __attribute in (
+        ('table:table', 'table:name'),
+        ('table:named-range', 'table:name'),
+        ('text:section', 'text:name'),
+        ('text:bookmark', 'text:name'),
+        ('text:bookmark-start', 'text:name'),
+        ('text:bookmark-end', 'text:name'),
+        ('text:reference-mark', 'text:name'),
+        ('text:reference-mark-start', 'text:name'),
+        ('text:reference-mark-end', 'text:name'),
+        ('text:note', 'text:id'),
+        ('draw:frame', 'draw:name'),
+        ('draw:page', 'draw:name'),
+        ('style:style', 'style:name'),
+        ('style:default-style', 'style:name'),
+        ('style:page-layout', 'style:name'),
+        ('style:master-page', 'style:name'),
+        ('style:font-face', 'style:name'),
+        ('text:list-style', 'style:name'),
+        ('number:number-style', 'style:name'),
+        ('number:percentage-style', 'style:name'),
+        ('number:time-style', 'style:name'),
+        ('number:date-style', 'style:name'),
+        ('number:currency-style', 'style:name')):
+    _indexed_attributes['{%s}%s' % _decode_qname(__qname)] = (
+            '{%s}%s' % _decode_qname(__attribute), __attribute)
+
+# Tags and axis of the queries answered by the name indexes
+__index_queries = {}
+__index_tag = re.compile(r'^\w+:[\w-]+$')
+
+
+
+class _name_index(object):
+    """The named elements of a tree, by (tag, name). The lists may hold
+    elements moved or renamed outside the odf_element API: they are checked
+    at lookup.
+    """
+    __slots__ = ('root', 'entries', 'stale')
+
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = {}
+        self.stale = False
+        self.add(root)
+
+
+    def add(self, native_element, recursive=True):
+        entries = self.entries
+        if recursive:
+            elements = native_element.iter(*_indexed_attributes)
+        else:
+            elements = (native_element,)
+        for element in elements:
+            indexed = _indexed_attributes.get(element.tag)
+            if indexed is None:
+                continue
+            name = element.get(indexed[0])
+            if name is None:
+                continue
+            found = entries.setdefault((element.tag, name), [])
+            if element not in found:
+                found.append(element)
+
+
+    def remove(self, native_element, recursive=True):
+        entries = self.entries
+        if recursive:
+            elements = native_element.iter(*_indexed_attributes)
+        else:
+            elements = (native_element,)
+        for element in elements:
+            indexed = _indexed_attributes.get(element.tag)
+            if indexed is None:
+                continue
+            key = (element.tag, element.get(indexed[0]))
+            found = entries.get(key)
+            if found and element in found:
+                found.remove(element)
+                if not found:
+                    del entries[key]
+
+
+    def rebuild(self):
+        self.entries.clear()
+        self.stale = False
+        self.add(self.root)
+
+
+
+def _get_name_index(native_element, attribute=None):
+    """Return the name index of the tree of the given element, or None.
+
+    If an attribute is given, the index is only returned if the element is
+    named by this attribute.
+    """
+    if not __name_indexes:
+        return None
+    if attribute is not None:
+        indexed = _indexed_attributes.get(native_element.tag)
+        if indexed is None or indexed[0] != attribute:
+            return None
+    return __name_indexes.get(native_element.getroottree().getroot())
+
+
+
+def _parse_index_query(element_name):
+    """Return the tags and the axis (descendant or not) of the queries made
+    of tag names, or None.
+    """
+    if element_name in __index_queries:
+        return __index_queries[element_name]
+    parsed = None
+    names = element_name
+    if names.startswith('(') and names.endswith(')'):
+        names = names[1:-1]
+    names = [name.strip() for name in names.split('|')]
+    axes = set(name.startswith('descendant::') for name in names)
+    if len(axes) == 1:
+        descendant = axes.pop()
+        if descendant:
+            names = [name[12:] for name in names]
+        if all(__index_tag.match(name) for name in names):
+            tags = ['{%s}%s' % _decode_qname(name) for name in names]
+            if all(tag in _indexed_attributes for tag in tags):
+                parsed = (tags, descendant)
+    __index_queries[element_name] = parsed
+    return parsed
+
+
+
+def _find_in_name_index(context, element_name, kw):
+    """Return the only element under the context that would match the query
+    made of the element name and the attributes given as in
+    "_make_xpath_query", using the name index of the tree. None if there is
+    no index or it cannot answer for sure.
+    """
+    index = _get_name_index(context)
+    if index is None:
+        return None
+    parsed = _parse_index_query(element_name)
+    if parsed is None:
+        return None
+    tags, descendant = parsed
+    if index.stale:
+        index.rebuild()
+    attributes = [('{%s}%s' % _decode_qname(qname), value)
+                  for qname, value in _make_xpath_attributes(**kw).items()]
+    values = dict(attributes)
+    candidates = []
+    for tag in tags:
+        value = values.get(_indexed_attributes[tag][0])
+        if value is None or value is True:
+            return None
+        candidates.extend(index.entries.get((tag, str(value)), ()))
+    result = []
+    for element in candidates:
+        indexed = _indexed_attributes.get(element.tag)
+        if (element.tag not in tags
+                or element.get(indexed[0]) != str(values[indexed[0]])):
+            # Renamed outside the API
+            index.stale = True
+            continue
+        for name, value in attributes:
+            actual = element.get(name)
+            if actual is None or (value is not True and actual != str(value)):
+                break
+        else:
+            # Where is it now?
+            inside = False
+            parent = element.getparent()
+            if descendant:
+                top = element
+                while parent is not None:
+                    if parent is context:
+                        inside = True
+                    top, parent = parent, parent.getparent()
+            else:
+                inside = parent is context
+                top = element.getroottree().getroot()
+            if top is not index.root:
+                # Moved outside the API
+                index.stale = True
+            elif inside:
+                result.append(element)
+    if len(result) == 1:
+        return result[0]
+    # The XPath query knows the document order
+    return None
+
+
+
+def _enable_name_index(native_root):
+    if native_root not in __name_indexes:
+        __name_indexes[native_root] = _name_index(native_root)
+
+
+
+def _disable_name_index(native_root):
+    __name_indexes.pop(native_root, None)
+
+
+
+# Allocators of unique names, by root element, see get_unique_name
+__name_allocators = WeakKeyDictionary()
+
+# The attribute holding the names and the default prefix, by kind of name
+_unique_name_kinds = {
+        'office': ('office:name', '__Fieldmark__lpod_')}
+_clark_unique_name_kinds = dict((kind, ('{%s}%s' % _decode_qname(
+    attribute), prefix)) for kind, (attribute, prefix)
+    in _unique_name_kinds.items())
+
+
+
+class _name_allocator(object):
+    """The names of each kind used in a tree, scanned once, and the next
+    number to try by prefix. The names brought in afterwards by the
+    odf_element API are added by "_index_inserted" and "set_attribute".
+    """
+    __slots__ = ('root', 'used', 'numbers')
+
+
+    def __init__(self, root):
+        self.root = root
+        self.used = {}
+        self.numbers = {}
+
+
+    def add(self, native_element):
+        """Reserve the names used in the subtree of the given element.
+        """
+        for kind, used in self.used.items():
+            attribute = _clark_unique_name_kinds[kind][0]
+            for element in native_element.iter(Element):
+                name = element.get(attribute)
+                if name is not None:
+                    used.add(name)
+
+
+    def add_name(self, attribute, name):
+        """Reserve the given name set to the given attribute, in "{uri}name"
+        syntax.
+        """
+        for kind, used in self.used.items():
+            if _clark_unique_name_kinds[kind][0] == attribute:
+                used.add(name)
+
+
+    def allocate(self, kind, prefix=None):
+        attribute, default_prefix = _clark_unique_name_kinds[kind]
+        if prefix is None:
+            prefix = default_prefix
+        used = self.used.get(kind)
+        if used is None:
+            used = set(element.get(attribute)
+                       for element in self.root.iter(Element)
+                       if element.get(attribute) is not None)
+            self.used[kind] = used
+        i = self.numbers.get((kind, prefix), 1)
+        while True:
+            name = prefix + str(i)
+            if name not in used:
+                break
+            i += 1
+        used.add(name)
+        self.numbers[(kind, prefix)] = i + 1
+        return name
+
+
+
+def _get_unique_name(root, native_root, kind, prefix=None):
+    """Return a name of the given kind unused in the tree of the given root,
+    see odf_element.get_unique_name. The allocator lives as long as the
+    odf_element of the root.
+    """
+    allocator = __name_allocators.get(root)
+    if allocator is None:
+        allocator = _name_allocator(native_root)
+        __name_allocators[root] = allocator
+    return allocator.allocate(kind, prefix)
+
+
+
+def _get_name_allocator(native_element):
+    """Return the unique name allocator of the tree of the given element, or
+    None.
+    """
+    if not __name_allocators:
+        return None
+    root = __element_wrappers.get(native_element.getroottree().getroot())
+    if root is None:
+        return None
+    return __name_allocators.get(root)
+
+
+
+def _index_inserted(native_element):
+    """Add the subtree of the given element, just inserted, to the name
+    index and the unique name allocator of its tree.
+    """
+    name_index = _get_name_index(native_element)
+    if name_index is not None:
+        name_index.add(native_element)
+    allocator = _get_name_allocator(native_element)
+    if allocator is not None:
+        allocator.add(native_element)
+
+
+
+# The attributes applying a style to an element, see get_styled_elements
+_styled_attributes = ('text:style-name', 'draw:style-name',
+        'draw:text-style-name', 'table:style-name', 'style:page-layout-name',
+        'draw:master-page-name', 'style:parent-style-name')
+
+# All the attributes referencing a style by its name, see get_style_usage
+_style_reference_attributes = _styled_attributes + (
+        'presentation:style-name', 'chart:style-name',
+        'presentation:presentation-page-layout-name',
+        'style:next-style-name', 'style:list-style-name',
+        'text:list-style-name', 'style:data-style-name',
+        'style:percentage-data-style-name', 'style:master-page-name',
+        'style:apply-style-name', 'table:default-cell-style-name',
+        'text:visited-style-name', 'text:main-entry-style-name',
+        'text:citation-style-name', 'text:citation-body-style-name',
+        'text:default-style-name', 'text:cond-style-name',
+        'draw:fill-image-name', 'draw:fill-gradient-name',
+        'draw:fill-hatch-name', 'draw:opacity-name', 'draw:marker-start',
+        'draw:marker-end', 'draw:stroke-dash')
+
+# The family of the styles referenced by these attributes, or by tag of the
+# element when it depends on it. Data styles share their names whatever
+# their family, so their references are not listed.
+_style_reference_families = {
+        'text:style-name': {
+            'text:p': 'paragraph', 'text:h': 'paragraph',
+            'text:span': 'text', 'text:a': 'text',
+            'text:list': 'list', 'text:numbered-paragraph': 'list',
+            'text:section': 'section', 'text:ruby': 'ruby',
+            'text:list-level-style-number': 'text',
+            'text:list-level-style-bullet': 'text',
+            'text:outline-level-style': 'text'},
+        'draw:style-name': {
+            'draw:page': 'drawing-page', 'presentation:notes': 'drawing-page',
+            'style:master-page': 'drawing-page',
+            'style:handout-master': 'drawing-page',
+            None: 'graphic'},
+        'draw:text-style-name': 'paragraph',
+        'table:style-name': {
+            'table:table': 'table', 'table:table-column': 'table-column',
+            'table:table-row': 'table-row', 'table:table-cell': 'table-cell',
+            'table:covered-table-cell': 'table-cell'},
+        'style:page-layout-name': 'page-layout',
+        'draw:master-page-name': 'master-page',
+        'style:master-page-name': 'master-page',
+        'presentation:style-name': 'presentation',
+        'chart:style-name': 'chart',
+        'presentation:presentation-page-layout-name':
+            'presentation-page-layout',
+        'style:list-style-name': 'list', 'text:list-style-name': 'list',
+        'table:default-cell-style-name': 'table-cell',
+        'text:visited-style-name': 'text',
+        'text:main-entry-style-name': 'text',
+        'text:citation-style-name': 'text',
+        'text:citation-body-style-name': 'text',
+        'text:default-style-name': 'paragraph',
+        'text:cond-style-name': 'paragraph',
+        'draw:fill-image-name': 'fill-image',
+        'draw:fill-gradient-name': 'gradient',
+        'draw:fill-hatch-name': 'hatch', 'draw:opacity-name': 'opacity',
+        'draw:marker-start': 'marker', 'draw:marker-end': 'marker',
+        'draw:stroke-dash': 'stroke-dash'}
+
+# The attributes referencing a style of the family of the element, or of
+# its parent for style:map
+_style_own_family_attributes = ('style:parent-style-name',
+        'style:next-style-name', 'style:apply-style-name')
+
+# The family of the styles not having a "style:family" attribute
+_style_tag_families = {
+        'text:list-style': 'list', 'text:outline-style': 'outline',
+        'style:page-layout': 'page-layout', 'style:master-page': 'master-page',
+        'style:presentation-page-layout': 'presentation-page-layout',
+        'style:font-face': 'font-face', 'number:number-style': 'number',
+        'number:percentage-style': 'percentage',
+        'number:time-style': 'time', 'number:date-style': 'date',
+        'number:currency-style': 'currency',
+        'number:boolean-style': 'boolean', 'number:text-style': 'text',
+        'draw:marker': 'marker', 'draw:fill-image': 'fill-image',
+        'draw:gradient': 'gradient', 'draw:hatch': 'hatch',
+        'draw:opacity': 'opacity', 'draw:stroke-dash': 'stroke-dash'}
+
+__clark_styled_attributes = tuple('{%s}%s' % _decode_qname(attribute)
+        for attribute in _styled_attributes)
+__clark_style_reference_attributes = tuple('{%s}%s' % _decode_qname(
+    attribute) for attribute in _style_reference_attributes)
+__clark_style_reference_families = {}
+for __attribute, __family in _style_reference_families.items():
+    if type(__family) is dict:
+        __family = dict((__tag and '{%s}%s' % _decode_qname(__tag),
+                         __tag_family)
+                        for __tag, __tag_family in __family.items())
+    __clark_style_reference_families['{%s}%s' % _decode_qname(
+        __attribute)] = __family
+__clark_style_own_family_attributes = frozenset('{%s}%s' % _decode_qname(
+    attribute) for attribute in _style_own_family_attributes)
+__clark_style_tag_families = dict(('{%s}%s' % _decode_qname(tag), family)
+        for tag, family in _style_tag_families.items())
+__clark_style_family = '{%s}family' % ODF_NAMESPACES['style']
+__clark_master_page = '{%s}master-page' % ODF_NAMESPACES['style']
+__clark_map = '{%s}map' % ODF_NAMESPACES['style']
+
+
+
+def _get_styled_elements(native_element):
+    """Return the lxml elements below the given one having a style, in
+    document order.
+    """
+    result = []
+    for element in native_element.iterdescendants(Element):
+        get = element.get
+        for attribute in __clark_styled_attributes:
+            if get(attribute) is not None:
+                result.append(element)
+                break
+    return result
+
+
+
+def _get_style_family(native_style):
+    """Return the family of the given lxml style element, or None if it is
+    unknown.
+    """
+    family = native_style.get(__clark_style_family)
+    if family is None:
+        family = __clark_style_tag_families.get(native_style.tag)
+    return family
+
+
+
+def _get_reference_family(native_element, attribute):
+    """Return the family of the style the given lxml Element references
+    through the given attribute, in "{uri}name" syntax, or None if it is
+    unknown.
+    """
+    if attribute in __clark_style_own_family_attributes:
+        if native_element.tag == __clark_master_page:
+            return 'master-page'
+        if native_element.tag == __clark_map:
+            native_element = native_element.getparent()
+            if native_element is None:
+                return None
+        return native_element.get(__clark_style_family)
+    family = __clark_style_reference_families.get(attribute)
+    if type(family) is dict:
+        return family.get(native_element.tag, family.get(None))
+    return family
+
+
+
+def _get_style_usage(native_element, references=False, families=False):
+    """Map the style names used below the given lxml Element to the lxml
+    elements using them, in document order, in a single traversal.
+
+    Arguments:
+
+        native_element -- lxml.Element
+
+        references -- bool, also count every other reference to a style
+                      (list style, data style, next style...)
+
+        families -- bool, map (family, name) pairs instead, the family being
+                    None when it is unknown
+
+    Return: dict
+    """
+    if references:
+        attributes = __clark_style_reference_attributes
     else:
-        return cls(native_element)
+        attributes = __clark_styled_attributes
+    usage = {}
+    for element in native_element.iterdescendants(Element):
+        get = element.get
+        for attribute in attributes:
+            name = get(attribute)
+            if name is None:
+                continue
+            if families:
+                name = (_get_reference_family(element, attribute), name)
+            elements = usage.setdefault(name, [])
+            # One entry per element using the style
+            if not elements or elements[-1] is not element:
+                elements.append(element)
+    return usage
+
+
+
+def _get_content_key(native_element, ignored=()):
+    """Return a hashable summary of the tag, attributes, text and children
+    of the given lxml Element, equal for equal elements.
+
+    Arguments:
+
+        native_element -- lxml.Element
+
+        ignored -- sequence of attribute names in "{uri}name" syntax
+
+    Return: tuple
+    """
+    attributes = tuple(sorted(item for item
+                              in native_element.attrib.items()
+                              if item[0] not in ignored))
+    children = tuple((_get_content_key(child), child.tail)
+                     for child in native_element)
+    return (native_element.tag, attributes, native_element.text, children)
+
+
+
+def _locate_text(native_element, offset, main_text=False, at_end=False):
+    """Return the text node below the given lxml Element containing the
+    character at the given offset, or ending at the offset if "at_end" is
+    True, and the offset within this node, or None.
+    """
+    if offset < 0:
+        return None
+    if main_text:
+        xpath_text = _xpath_text_main_descendant
+    else:
+        xpath_text = _xpath_text_descendant
+    count = 0
+    for text in xpath_text(native_element):
+        end = count + len(text)
+        if end > offset or (at_end and end == offset):
+            return text, offset - count
+        count = end
+    return None
+
+
+
+# Outlines of the trees, by odf_element and outline level, see
+# odf_element.get_outline
+__outlines = WeakKeyDictionary()
+
+_tag_heading = '{%s}h' % ODF_NAMESPACES['text']
+_attr_outline_level = '{%s}outline-level' % ODF_NAMESPACES['text']
+
+
+
+class _outline(object):
+    """The headings under an element, in document order, as (level, number,
+    heading) tuples, the number being the tuple of the counters of each
+    level, e.g. (2, 1) for "2.1.".
+
+    The headings are listed again at each lookup, without wrapping them. The
+    numbers are only computed again from the first heading inserted,
+    removed, moved or changed of level.
+    """
+    __slots__ = ('outline_level', 'keys', 'entries', 'tree')
+
+
+    def __init__(self, outline_level=None):
+        self.outline_level = outline_level
+        self.keys = []
+        self.entries = ()
+        self.tree = None
+
+
+    def update(self, native_element):
+        outline_level = self.outline_level
+        keys = []
+        for heading in native_element.iterdescendants(_tag_heading):
+            level = heading.get(_attr_outline_level)
+            level = int(level) if level else 1
+            if outline_level is None or level <= outline_level:
+                keys.append((heading, level))
+        old_keys = self.keys
+        if keys == old_keys:
+            return
+        # Keep the entries up to the first change
+        start = 0
+        for key, old_key in zip(keys, old_keys):
+            if key != old_key:
+                break
+            start += 1
+        entries = list(self.entries[:start])
+        number = entries[-1][1] if entries else ()
+        for heading, level in keys[start:]:
+            number = _next_outline_number(number, level)
+            entries.append((level, number, _make_odf_element(heading)))
+        self.keys = keys
+        self.entries = tuple(entries)
+        self.tree = None
+
+
+    def get_tree(self):
+        if self.tree is None:
+            nodes = []
+            stack = [(0, nodes)]
+            for level, number, heading in self.entries:
+                while stack[-1][0] >= level:
+                    stack.pop()
+                children = []
+                stack[-1][1].append((level, number, heading, children))
+                stack.append((level, children))
+            self.tree = _freeze_outline_tree(nodes)
+        return self.tree
+
+
+
+def _next_outline_number(number, level):
+    """Return the number of a heading of the given level following the
+    heading of the given number. Missing levels count for 1.
+    """
+    number = list(number[:level])
+    if len(number) < level:
+        number.extend([1] * (level - len(number)))
+    else:
+        number[-1] += 1
+    return tuple(number)
+
+
+
+def _freeze_outline_tree(nodes):
+    return tuple((level, number, heading, _freeze_outline_tree(children))
+                 for level, number, heading, children in nodes)
+
+
+
+def _get_outline(element, native_element, outline_level=None):
+    """Return the up-to-date outline of the given odf_element.
+    """
+    outlines = __outlines.get(element)
+    if outlines is None:
+        outlines = __outlines[element] = {}
+    outline = outlines.get(outline_level)
+    if outline is None:
+        outline = outlines[outline_level] = _outline(outline_level)
+    outline.update(native_element)
+    return outline
+
+
+
+# The elements whose text is matched as a whole by replace_many
+_paragraph_tags = ('{%s}p' % ODF_NAMESPACES['text'],
+                   '{%s}h' % ODF_NAMESPACES['text'])
+
+
+
+def _get_text_blocks(native_element, across_spans=False):
+    """Return the text and tail nodes of the given lxml Element as lists of
+    (element, is_text) pairs, in document order. Each text node is a list of
+    its own, unless "across_spans" is True: the text nodes of a same
+    paragraph or heading are then gathered.
+    """
+    blocks = []
+
+    def visit(element, block):
+        if across_spans and element.tag in _paragraph_tags:
+            block = []
+            blocks.append(block)
+        if element.text:
+            if block is None:
+                blocks.append([(element, True)])
+            else:
+                block.append((element, True))
+        for child in element:
+            # Skip the content of comments and processing instructions
+            if type(child.tag) is str:
+                visit(child, block)
+            if child.tail:
+                if block is None:
+                    blocks.append([(child, False)])
+                else:
+                    block.append((child, False))
+
+    block = None
+    # Within a paragraph, e.g. a span
+    if across_spans and next(native_element.iterancestors(*_paragraph_tags),
+            None) is not None:
+        block = []
+        blocks.append(block)
+    visit(native_element, block)
+    return blocks
+
+
+
+def _replace_in_block(block, cpattern, replace):
+    """Replace the matches of the given pattern in the text nodes of the
+    given block, as a single string. The replacement text goes to the node
+    where the match starts, the rest of the match is removed from the
+    following nodes. Return the number of replacements.
+    """
+    texts = [element.text if is_text else element.tail
+             for element, is_text in block]
+    if len(texts) == 1:
+        new_text, count = cpattern.subn(replace, texts[0])
+        if count:
+            element, is_text = block[0]
+            if is_text:
+                element.text = new_text
+            else:
+                element.tail = new_text
+        return count
+    joined = ''.join(texts)
+    starts = []
+    start = 0
+    for text in texts:
+        starts.append(start)
+        start += len(text)
+    output = [[] for text in texts]
+
+    def copy(start, end):
+        i = bisect_right(starts, start) - 1
+        while start < end:
+            chunk_end = min(end, starts[i] + len(texts[i]))
+            if chunk_end > start:
+                output[i].append(joined[start:chunk_end])
+            start = chunk_end
+            i += 1
+
+    count = 0
+    position = 0
+    for match in cpattern.finditer(joined):
+        copy(position, match.start())
+        i = bisect_right(starts, match.start()) - 1
+        output[i].append(replace(match))
+        position = match.end()
+        count += 1
+    if not count:
+        return 0
+    copy(position, len(joined))
+    for (element, is_text), text, new_text in zip(block, texts, output):
+        new_text = ''.join(new_text)
+        if new_text == text:
+            continue
+        if is_text:
+            element.text = new_text or None
+        else:
+            element.tail = new_text or None
+    return count
+
+
+
+# The group references and the escapes of a replacement template, as
+# parsed by "re": \g<name>, octal escapes, \N group numbers, other escapes
+_template_reference = re.compile(
+        r'\\(?:g<([^>]*)>|(0[0-7]{0,2}|[0-7]{3})|([1-9][0-9]?)|(.))',
+        re.DOTALL)
+
+def _shift_template(template, offset, groups):
+    """Renumber the group references of the given replacement template,
+    written for a pattern of the given number of groups, for this pattern
+    wrapped in the group of the given number of a larger pattern.
+    """
+    def shift(match):
+        name, octal, number, escape = match.groups()
+        if name is not None and not name.isdigit():
+            return match.group(0)
+        if name is None and number is None:
+            return match.group(0)
+        number = int(name if name is not None else number)
+        if number > groups:
+            raise re.error("invalid group reference %d" % number)
+        return '\\g<%d>' % (offset + number)
+
+    return _template_reference.sub(shift, template)
+
+
+
+def _make_replacer(replacements, regex=False):
+    """Combine the given patterns into one alternation, longest literals
+    first. Return the compiled pattern and the function giving the
+    replacement text of a match.
+    """
+    if isinstance(replacements, dict):
+        replacements = list(replacements.items())
+    if not replacements:
+        raise ValueError("no pattern to replace")
+    if regex:
+        patterns = []
+        values = {}
+        # Number of the group wrapping the next pattern
+        offset = 1
+        for i, (pattern, new) in enumerate(replacements):
+            group = 'lpod%d' % i
+            patterns.append('(?P<%s>%s)' % (group, pattern))
+            groups = re.compile(pattern).groups
+            if not callable(new):
+                new = _shift_template(new, offset, groups)
+            values[group] = new
+            offset += groups + 1
+        cpattern = re.compile('|'.join(patterns))
+
+        def replace(match):
+            new = values[match.lastgroup]
+            if callable(new):
+                return new(match)
+            return match.expand(new)
+    else:
+        values = {}
+        for pattern, new in replacements:
+            if not pattern:
+                raise ValueError("cannot replace an empty string")
+            values[pattern] = new
+        literals = sorted(values, key=len, reverse=True)
+        cpattern = re.compile('|'.join(re.escape(literal)
+                                       for literal in literals))
+
+        def replace(match):
+            new = values[match.group(0)]
+            if callable(new):
+                return new(match)
+            return new
+    return cpattern, replace
 
 
 
@@ -217,24 +1104,28 @@ def odf_create_element(element_data, cache=None):
     else:
         raise TypeError("element data is not str or unicode")
     element_data = element_data.strip()
-    #element_data = element_data.encode('utf-8')
     if not element_data:
         raise ValueError("element data is empty")
-    if '<' not in element_data:
-        # Qualified name
-        # XXX don't build the element from scratch or lxml will pollute with
-        # repeated namespace declarations
-        if type(element_data) is str:
-            element_data = element_data.encode()
-        element_data = f'<{element_data.decode()}/>'
-    # XML fragment
-    if type(element_data) is str:
-        element_data = element_data.encode()
-    
-    t = element_data.decode()
-    data = ns_document_data % element_data
-    root = fromstring(data)
-    element = root[0]
+    prototypes = __element_prototypes
+    root = prototypes.get(element_data)
+    if root is None:
+        if '<' not in element_data:
+            # Qualified name
+            # XXX don't build the element from scratch or lxml will pollute
+            # with repeated namespace declarations
+            fragment = '<%s/>' % element_data
+        else:
+            # XML fragment
+            fragment = element_data
+        root = fromstring(ns_document_data % fragment.encode())
+        prototypes[element_data] = root
+        if len(prototypes) > __element_prototypes_max:
+            # One-off fragments go first, the frequent ones stay
+            prototypes.popitem(last=False)
+    else:
+        prototypes.move_to_end(element_data)
+    # Copying the parsed document is much cheaper than parsing it again
+    element = deepcopy(root)[0]
     return _make_odf_element(element, cache)
 
 
@@ -279,6 +1170,10 @@ class odf_element(object):
     """Representation of an XML element. Abstraction of the XML library
     behind.
     """
+    __slots__ = ('__element', '__weakref__')
+
+    # Wrappers holding no state of their own are shared
+    _reuse_wrapper = True
 
     def __init__(self, native_element, cache=None):
         if not isinstance(native_element, _Element):
@@ -297,6 +1192,28 @@ class odf_element(object):
                             self.get_tag())
 
 
+    def _get_indexed_element(self, element_name, kw):
+        """Return the element "_get_element" would find at position 0, from
+        the name index of the tree, or None if it cannot tell.
+        """
+        if hasattr(self, '_tmap'):
+            return None
+        element = _find_in_name_index(self.__element, element_name, kw)
+        if element is None:
+            return None
+        return _make_odf_element(element)
+
+
+    def _set_name_index(self, enabled):
+        """Maintain or drop the name index of the tree rooted here, see
+        odf_xmlpart.enable_name_index.
+        """
+        if enabled:
+            _enable_name_index(self.__element)
+        else:
+            _disable_name_index(self.__element)
+
+
     def _insert(self, element, before=None, after=None, position=0,
                 main_text=False):
         """Insert an element before or after the characters in the text which
@@ -365,20 +1282,14 @@ class odf_element(object):
             # Hack if position is negative => quickly
             if position < 0:
                 current.append(element)
+                _index_inserted(element)
                 return
 
             # Found the text
-            count = 0
-            for text in xpath_text(current):
-                found_nb = len(text)
-                if found_nb + count >= position:
-                    break
-                count += found_nb
-            else:
+            found = _locate_text(current, position, main_text, at_end=True)
+            if found is None:
                 raise ValueError("text not found")
-
-            # We insert before the character
-            pos = position - count
+            text, pos = found
         else:
             raise ValueError("bad combination of arguments")
 
@@ -396,6 +1307,53 @@ class odf_element(object):
             parent.addnext(element)
             parent.tail = text_before
             element.tail = text_after
+        _index_inserted(element)
+
+
+    def _insert_at_offset(self, make_element, offset, length=0):
+        """Cut the text of the element at the given character offset, up to
+        the given length or the end of the text node, and insert in its
+        place the element returned by make_element(match, tail), e.g. a span
+        of the matched text followed by the tail. Nothing is inserted if the
+        offset is out of the text.
+
+        Arguments:
+
+            make_element -- function
+
+            offset -- int
+
+            length -- int
+
+        Return: odf_element or None
+        """
+        found = _locate_text(self.__element, offset)
+        if found is None:
+            return None
+        text, start = found
+        container = text.getparent()
+        is_text = text.is_text
+        size = len(text)
+        if length > 0:
+            end = start + min(length, size)
+        else:
+            end = size
+        before = text[:start]
+        match = text[start:end]
+        tail = text[end:]
+        result = make_element(match, tail)
+        wrapper = _make_odf_element(container)
+        if is_text:
+            wrapper.set_text(before)
+            # Insert as first child
+            wrapper.insert(result, position=0)
+        else:
+            wrapper.set_tail(before)
+            # Insert as next sibling
+            upper = wrapper.get_parent()
+            index = upper.index(wrapper)
+            upper.insert(result, position=index + 1)
+        return result
 
 
     def _insert_between(self, element, from_, to):
@@ -515,7 +1473,13 @@ class odf_element(object):
 
     def _set_tag_raw(self, qname):
         element = self.__element
+        name_index = _get_name_index(element)
+        if name_index is not None:
+            name_index.remove(element, False)
         element.tag = '{%s}%s' % _decode_qname(qname)
+        _forget_odf_element(element)
+        if name_index is not None:
+            name_index.add(element, False)
 
     def set_tag(self, qname):
         """Change the tag name of the element with the given qualified name.
@@ -528,9 +1492,8 @@ class odf_element(object):
 
         Return: odf_element or a subclass
         """
-        element = self.__element
-        element.tag = '{%s}%s' % _decode_qname(qname)
-        return _make_odf_element(element)
+        self._set_tag_raw(qname)
+        return _make_odf_element(self.__element)
 
     def elements_repeated_sequence(self, xpath_instance, name):
         uri, name = _decode_qname(name)
@@ -553,13 +1516,13 @@ class odf_element(object):
             result.append((idx, max(value, 1)))
         return result
 
-    def get_elements(self, xpath_query):
+    def get_elements(self, xpath_query, **variables):
         element = self.__element
         if isinstance(xpath_query, XPath):
-            result = xpath_query(element)
+            result = xpath_query(element, **variables)
         else:
             new_xpath_query = _find_query_in_cache(xpath_query)
-            result = new_xpath_query(element)
+            result = new_xpath_query(element, **variables)
         if hasattr(self, '_tmap'):
             if hasattr(self, '_rmap'):
                 cache = (self._tmap, self._cmap, self._rmap)
@@ -569,19 +1532,75 @@ class odf_element(object):
             cache = None
         return [_make_odf_element(e, cache) for e in result]
 
+    def iter_elements(self, xpath_query, **variables):
+        """Same as "get_elements" but yield the elements one by one, so
+        they are only wrapped when consumed.
+
+        Plain "prefix:name" and "descendant::prefix:name" queries walk the
+        tree with lxml iterators instead of XPath. The tree should not be
+        modified while iterating.
+
+        Arguments:
+
+            xpath_query -- unicode or XPath
+
+        Return: iterator of odf_element
+        """
+        element = self.__element
+        match = None
+        if not variables and not isinstance(xpath_query, XPath):
+            match = _iter_tag_query.match(xpath_query)
+        if match is not None:
+            descendant, qname = match.groups()
+            tag = '{%s}%s' % _decode_qname(qname)
+            if descendant:
+                result = element.iterdescendants(tag)
+            else:
+                result = element.iterchildren(tag)
+        elif isinstance(xpath_query, XPath):
+            result = xpath_query(element, **variables)
+        else:
+            new_xpath_query = _find_query_in_cache(xpath_query)
+            result = new_xpath_query(element, **variables)
+        if hasattr(self, '_tmap'):
+            if hasattr(self, '_rmap'):
+                cache = (self._tmap, self._cmap, self._rmap)
+            else:
+                cache = (self._tmap, self._cmap)
+        else:
+            cache = None
+        for e in result:
+            yield _make_odf_element(e, cache)
+
+
+    def count_elements(self, xpath_query, **variables):
+        """Return the number of elements matching the query, counted by
+        XPath without wrapping them.
+
+        Arguments:
+
+            xpath_query -- unicode
+
+        Return: int
+        """
+        xpath_instance = _find_query_in_cache("count(%s)" % xpath_query)
+        return int(xpath_instance(self.__element, **variables))
+
+
     # fixme : need original get_element as wrapper of get_elements
 
-    def get_element(self, xpath_query):
+    def get_element(self, xpath_query, **variables):
         element = self.__element
-        result = element.xpath("(%s)[1]" % xpath_query, namespaces=ODF_NAMESPACES)
+        xpath_instance = _find_query_in_cache("(%s)[1]" % xpath_query)
+        result = xpath_instance(element, **variables)
         if result:
             return _make_odf_element(result[0])
         return None
 
     def _get_element_idx(self, xpath_query, idx):
         element = self.__element
-        result = element.xpath("(%s)[%s]" % (xpath_query, idx+1),
-                               namespaces=ODF_NAMESPACES)
+        xpath_instance = _find_query_in_cache("(%s)[$idx]" % xpath_query)
+        result = xpath_instance(element, idx=idx+1)
         if result:
             return _make_odf_element(result[0])
         return None
@@ -593,6 +1612,14 @@ class odf_element(object):
             return _make_odf_element(result[0])
         return None
 
+    def _get_native_elements(self, xpath_instance):
+        return xpath_instance(self.__element)
+
+    def _get_elements_idx2(self, xpath_instance, start, end):
+        element = self.__element
+        result = xpath_instance(element)[start:end + 1]
+        return [_make_odf_element(e) for e in result]
+
     def get_attributes(self):
         attributes = {}
         element = self.__element
@@ -620,15 +1647,25 @@ class odf_element(object):
         uri, name = _decode_qname(name)
         if uri is not None:
             name = '{%s}%s' % (uri, name)
+        if name == _family_attribute:
+            _forget_odf_element(element)
+        name_index = _get_name_index(element, name)
+        if name_index is not None:
+            name_index.remove(element, False)
         if type(value) is bool:
             value = Boolean.encode(value)
-        elif value is None:
+        if value is None:
             try:
                 del element.attrib[name]
             except KeyError:
                 pass
-            return
-        element.set(name, value)
+        else:
+            element.set(name, value)
+            allocator = _get_name_allocator(element)
+            if allocator is not None:
+                allocator.add_name(name, value)
+        if name_index is not None:
+            name_index.add(element, False)
 
 
     def set_style_attribute(self, name, value):
@@ -644,6 +1681,11 @@ class odf_element(object):
         uri, name = _decode_qname(name)
         if uri is not None:
             name = '{%s}%s' % (uri, name)
+        if name == _family_attribute:
+            _forget_odf_element(element)
+        name_index = _get_name_index(element, name)
+        if name_index is not None:
+            name_index.remove(element, False)
         del element.attrib[name]
 
 
@@ -762,6 +1804,44 @@ class odf_element(object):
         return count
 
 
+    def replace_many(self, replacements, regex=False, across_spans=False):
+        """Replace all the given patterns at once, in a single walk of the
+        text of the element, and return the number of replacements.
+
+        The replacements are given as a mapping or a list of (pattern, new
+        text) pairs. By default, patterns are plain text, the longest one
+        found at a given position is replaced. If regex is True, they follow
+        the Python regular expression syntax (without numbered
+        back-references within the patterns), the first one in the order
+        given is replaced, and the new texts may refer to the groups of
+        their own pattern.
+
+        The new text may also be a function taking the match object and
+        returning the text, e.g. to look up a database.
+
+        If across_spans is True, patterns found across several elements of
+        a paragraph or a heading, like a word split into two consecutive
+        spans, are replaced too: the new text goes to the element where the
+        pattern starts.
+
+        Arguments:
+
+            replacements -- dict or list of (unicode, unicode) tuples
+
+            regex -- bool
+
+            across_spans -- bool
+
+        Return: int
+        """
+        cpattern, replace = _make_replacer(replacements, regex=regex)
+        count = 0
+        for block in _get_text_blocks(self.__element, across_spans):
+            if block:
+                count += _replace_in_block(block, cpattern, replace)
+        return count
+
+
     def get_root(self):
         element = self.__element
         tree = element.getroottree()
@@ -799,6 +1879,27 @@ class odf_element(object):
         return [_make_odf_element(e) for e in element.getchildren()]
 
 
+    def iter_children(self):
+        element = self.__element
+        for e in element.iterchildren():
+            yield _make_odf_element(e)
+
+
+    def _iter_text_and_children(self):
+        """Yield the text nodes (as unicode) and the children elements, in
+        document order, like xpath('*|text()') but lazily.
+        """
+        element = self.__element
+        if element.text:
+            yield element.text
+        for child in element.iterchildren():
+            # Comments and processing instructions only count by their tail
+            if type(child) is _Element:
+                yield _make_odf_element(child)
+            if child.tail:
+                yield child.tail
+
+
     def index(self, child):
         """Return the position of the child in this element.
 
@@ -1092,6 +2193,7 @@ class odf_element(object):
             parent.insert(index, element)
         else:
             raise ValueError("(xml)position must be defined")
+        _index_inserted(element)
 
 
     def extend(self, odf_elements):
@@ -1101,6 +2203,8 @@ class odf_element(object):
             current = self.__element
             elements = [ element.__element for element in odf_elements]
             current.extend(elements)
+            for element in elements:
+                _index_inserted(element)
 
 
     def append(self, unicode_or_element):
@@ -1126,7 +2230,9 @@ class odf_element(object):
                 text += unicode_or_element
                 current.text = text
         elif isinstance(unicode_or_element, odf_element):
-            current.append(unicode_or_element.__element)
+            element = unicode_or_element.__element
+            current.append(element)
+            _index_inserted(element)
         else:
             raise TypeError('odf_element or unicode expected, not "%s"' % (
                     type(unicode_or_element)))
@@ -1168,6 +2274,9 @@ class odf_element(object):
                     parent.__element.text = tail
                 else:
                     parent.__element.text += tail
+        name_index = _get_name_index(child.__element)
+        if name_index is not None:
+            name_index.remove(child.__element)
         parent.__element.remove(child.__element)
 
 
@@ -1178,7 +2287,15 @@ class odf_element(object):
         Warning : no clone for old element.
         """
         current = self.__element
+        name_index = _get_name_index(current)
+        if name_index is not None:
+            name_index.remove(old_element.__element)
         current.replace(old_element.__element, new_element.__element)
+        if name_index is not None:
+            name_index.add(new_element.__element)
+        allocator = _get_name_allocator(current)
+        if allocator is not None:
+            allocator.add(new_element.__element)
 
 
     def strip_elements(self, sub_elements):
@@ -1290,13 +2407,16 @@ class odf_element(object):
         return (element, True)
 
 
-    def xpath(self, xpath_query):
+    def xpath(self, xpath_query, **variables):
         """Apply XPath query to the element and its subtree. Return list of
         odf_element or odf_text instances translated from the nodes found.
+
+        Values given as keyword arguments are bound to the "$name" variables
+        of the query, which is then compiled once whatever the values.
         """
         element = self.__element
         xpath_instance = _find_query_in_cache(xpath_query)
-        elements = xpath_instance(element)
+        elements = xpath_instance(element, **variables)
         result = []
         for obj in elements:
             if (type(obj) is _ElementStringResult or
@@ -1312,13 +2432,16 @@ class odf_element(object):
     def clear(self):
         """Remove text, children and attributes from the element.
         """
+        name_index = _get_name_index(self.__element)
+        if name_index is not None:
+            name_index.remove(self.__element)
         self.__element.clear()
         if hasattr(self, '_tmap'):
-            self._tmap = []
+            self._tmap = _position_map()
         if hasattr(self, '_cmap'):
-            self._cmap = []
+            self._cmap = _position_map()
         if hasattr(self, '_rmap'):
-            self._rmap = []
+            self._rmap = _position_map()
         if hasattr(self, '_indexes'):
             remember = False
             if '_rmap' in self._indexes:
@@ -1339,10 +2462,12 @@ class odf_element(object):
         root.append(clone)
         if hasattr(self, '_tmap'):
             if hasattr(self, '_rmap'):
-                return self.__class__(clone, (self._tmap[:], self._cmap[:],
-                                              self._rmap[:]))
+                return self.__class__(clone, (self._tmap.copy(),
+                                              self._cmap.copy(),
+                                              self._rmap.copy()))
             else:
-                return self.__class__(clone, (self._tmap[:], self._cmap[:]))
+                return self.__class__(clone, (self._tmap.copy(),
+                                              self._cmap.copy()))
         return self.__class__(clone)
 
 
@@ -1386,23 +2511,72 @@ class odf_element(object):
 
 
     def get_styled_elements(self, name=True):
-        """Brute-force to find paragraphs, tables, etc. using the given style
-        name (or all by default).
+        """Find paragraphs, tables, etc. using the given style name (or all
+        by default), in a single traversal.
 
         Arguments:
 
             name -- unicode
 
-        Return: list
+        Return: list
+        """
+        # FIXME incomplete (and possibly inaccurate)
+        if name is True:
+            result = _get_styled_elements(self.__element)
+        else:
+            result = _get_style_usage(self.__element).get(name, [])
+        return [_make_odf_element(element) for element in result]
+
+
+    def get_style_usage(self):
+        """Map the family and name of every style referenced in the subtree
+        to the elements referencing it, in a single traversal. Styles
+        referencing other styles (parent, list, data style...) are included.
+
+        The family is None when the reference does not tell it, e.g. for
+        data styles.
+
+        Return: dict of (str, unicode): list of odf_element
+        """
+        usage = _get_style_usage(self.__element, references=True,
+                families=True)
+        return dict((key, [_make_odf_element(element)
+                           for element in elements])
+                    for key, elements in usage.items())
+
+
+    def _get_style_family(self):
+        """Return the family of this style element, from its "style:family"
+        attribute or its tag, or None if it is unknown.
+
+        Return: str
+        """
+        return _get_style_family(self.__element)
+
+
+    def _is_same(self, other):
+        """Tell whether the given odf_element wraps the same XML element,
+        whatever the wrappers.
+
+        Return: bool
+        """
+        return (isinstance(other, odf_element)
+                and other.__element is self.__element)
+
+
+    def _get_content_key(self, ignored=()):
+        """Return a hashable summary of the element and its children, equal
+        for equal elements, e.g. two styles only differing by the given
+        attributes.
+
+        Arguments:
+
+            ignored -- list of attribute names, e.g. ['style:name']
+
+        Return: tuple
         """
-        # FIXME incomplete (and possibly inaccurate)
-        return (  _get_elements(self, 'descendant::*', text_style=name)
-                + _get_elements(self, 'descendant::*', draw_style=name)
-                + _get_elements(self, 'descendant::*', draw_text_style=name)
-                + _get_elements(self, 'descendant::*', table_style=name)
-                + _get_elements(self, 'descendant::*', page_layout=name)
-                + _get_elements(self, 'descendant::*', master_page=name)
-                + _get_elements(self, 'descendant::*', parent_style=name))
+        ignored = ['{%s}%s' % _decode_qname(name) for name in ignored]
+        return _get_content_key(self.__element, ignored)
 
     #
     # Common attributes
@@ -1518,6 +2692,36 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_sections(self, style=None, content=None):
+        """Same as "get_sections" but yield the sections one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: iterator of odf_element
+        """
+        return _iter_elements(self, 'text:section', text_style=style,
+                content=content)
+
+
+    def count_sections(self, style=None, content=None):
+        """Return the number of sections "get_sections" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'text:section', text_style=style,
+                content=content)
+
+
     def get_section(self, position=0, content=None):
         """Return the section that matches the criteria.
 
@@ -1552,6 +2756,36 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_paragraphs(self, style=None, content=None):
+        """Same as "get_paragraphs" but yield the paragraphs one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: iterator of odf_paragraph
+        """
+        return _iter_elements(self, 'descendant::text:p', text_style=style,
+                content=content)
+
+
+    def count_paragraphs(self, style=None, content=None):
+        """Return the number of paragraphs "get_paragraphs" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::text:p', text_style=style,
+                content=content)
+
+
     def get_paragraph(self, position=0, content=None):
         """Return the paragraph that matches the criteria.
 
@@ -1586,6 +2820,36 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_spans(self, style=None, content=None):
+        """Same as "get_spans" but yield the spans one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: iterator of odf_span
+        """
+        return _iter_elements(self, 'descendant::text:span', text_style=style,
+                content=content)
+
+
+    def count_spans(self, style=None, content=None):
+        """Return the number of spans "get_spans" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::text:span', text_style=style,
+                content=content)
+
+
     def get_span(self, position=0, content=None):
         """Return the span that matches the criteria.
 
@@ -1620,6 +2884,40 @@ class odf_element(object):
                 outline_level=outline_level, content=content)
 
 
+    def iter_headings(self, style=None, outline_level=None, content=None):
+        """Same as "get_headings" but yield the headings one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            outline_level -- int
+
+            content -- unicode regex
+
+        Return: iterator of odf_heading
+        """
+        return _iter_elements(self, 'descendant::text:h', text_style=style,
+                outline_level=outline_level, content=content)
+
+
+    def count_headings(self, style=None, outline_level=None, content=None):
+        """Return the number of headings "get_headings" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            outline_level -- int
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::text:h', text_style=style,
+                outline_level=outline_level, content=content)
+
+
     def get_heading(self, position=0, outline_level=None, content=None):
         """Return the heading that matches the criteria.
 
@@ -1635,6 +2933,38 @@ class odf_element(object):
                 outline_level=outline_level, content=content)
 
 
+    def get_outline(self, outline_level=None):
+        """Return the headings with their outline level and number, in
+        document order. The number is the tuple of the counters of each
+        level, e.g. (2, 1) for "2.1.", as in a table of contents. Headings
+        deeper than the given outline level are ignored.
+
+        The result is cached and only numbered again from the first heading
+        inserted, removed or changed of level since the last call.
+
+        Arguments:
+
+            outline_level -- int
+
+        Return: tuple of (int, tuple of int, odf_heading)
+        """
+        return _get_outline(self, self.__element, outline_level).entries
+
+
+    def get_outline_tree(self, outline_level=None):
+        """Same as "get_outline" but nest the headings under the previous
+        heading of a lower level, as (level, number, heading, children)
+        tuples, for navigation.
+
+        Arguments:
+
+            outline_level -- int
+
+        Return: tuple of (int, tuple of int, odf_heading, tuple)
+        """
+        return _get_outline(self, self.__element, outline_level).get_tree()
+
+
     #
     # Lists
     #
@@ -1654,6 +2984,36 @@ class odf_element(object):
                 content=content)
 
 
+    def iter_lists(self, style=None, content=None):
+        """Same as "get_lists" but yield the lists one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: iterator of odf_list
+        """
+        return _iter_elements(self, 'descendant::text:list', text_style=style,
+                content=content)
+
+
+    def count_lists(self, style=None, content=None):
+        """Return the number of lists "get_lists" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::text:list', text_style=style,
+                content=content)
+
+
     def get_list(self, position=0, content=None):
         """Return the list that matches the criteria.
 
@@ -1694,6 +3054,48 @@ class odf_element(object):
                 svg_title=title, svg_desc=description, content=content)
 
 
+    def iter_frames(self, presentation_class=None, style=None, title=None,
+            description=None, content=None):
+        """Same as "get_frames" but yield the frames one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            title -- unicode regex
+
+            description -- unicode regex
+
+            content -- unicode regex
+
+        Return: iterator of odf_frame
+        """
+        return _iter_elements(self, 'descendant::draw:frame',
+                presentation_class=presentation_class, draw_style=style,
+                svg_title=title, svg_desc=description, content=content)
+
+
+    def count_frames(self, presentation_class=None, style=None, title=None,
+            description=None, content=None):
+        """Return the number of frames "get_frames" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            title -- unicode regex
+
+            description -- unicode regex
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::draw:frame',
+                presentation_class=presentation_class, draw_style=style,
+                svg_title=title, svg_desc=description, content=content)
+
+
     def get_frame(self, position=0, name=None,
             presentation_class=None, title=None, description=None,
             content=None):
@@ -1737,6 +3139,40 @@ class odf_element(object):
                 url=url, content=content)
 
 
+    def iter_images(self, style=None, url=None, content=None):
+        """Same as "get_images" but yield the images one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            url -- unicode regex
+
+            content -- unicode regex
+
+        Return: iterator of odf_element
+        """
+        return _iter_elements(self, 'descendant::draw:image', text_style=style,
+                url=url, content=content)
+
+
+    def count_images(self, style=None, url=None, content=None):
+        """Return the number of images "get_images" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            url -- unicode regex
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::draw:image',
+                text_style=style, url=url, content=content)
+
+
     def get_image(self, position=0, name=None, url=None, content=None):
         """Return the image that matches the criteria.
 
@@ -1779,6 +3215,36 @@ class odf_element(object):
                 table_style=style, content=content)
 
 
+    def iter_tables(self, style=None, content=None):
+        """Same as "get_tables" but yield the tables one by one.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: iterator of odf_table
+        """
+        return _iter_elements(self, 'descendant::table:table',
+                table_style=style, content=content)
+
+
+    def count_tables(self, style=None, content=None):
+        """Return the number of tables "get_tables" would return.
+
+        Arguments:
+
+            style -- unicode
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::table:table',
+                table_style=style, content=content)
+
+
     def get_table(self, position=0, name=None, content=None):
         """Return the table that matches the criteria.
 
@@ -1792,12 +3258,8 @@ class odf_element(object):
 
         Return: odf_table or None if not found
         """
-        if name is None and content is None:
-            result = self._get_element_idx('descendant::table:table', position)
-        else :
-            result = _get_element(self, 'descendant::table:table', position,
+        return _get_element(self, 'descendant::table:table', position,
                 table_name=name, content=content)
-        return result
 
     #
     # Named Range
@@ -1822,12 +3284,8 @@ class odf_element(object):
 
         Return: odf_named_range
         """
-        named_range = self.get_elements(
-        'descendant::table:named-expressions/table:named-range[@table:name="%s"][1]' % name)
-        if named_range:
-            return named_range[0]
-        else:
-            return None
+        return _get_element(self, 'descendant::table:named-range', 0,
+                table_name=name)
 
 
     def append_named_range(self, named_range):
@@ -1847,7 +3305,7 @@ class odf_element(object):
             self.append(named_expressions)
         # exists ?
         current = named_expressions.get_element(
-            'table:named-range[@table:name="%s"][1]' % named_range.name)
+            'table:named-range[@table:name=$name][1]', name=named_range.name)
         if current:
             named_expressions.delete(current)
         named_expressions.append(named_range)
@@ -1892,6 +3350,36 @@ class odf_element(object):
                 note_class=note_class, content=content)
 
 
+    def iter_notes(self, note_class=None, content=None):
+        """Same as "get_notes" but yield the notes one by one.
+
+        Arguments:
+
+            note_class -- 'footnote' or 'endnote'
+
+            content -- unicode regex
+
+        Return: iterator of odf_note
+        """
+        return _iter_elements(self, 'descendant::text:note',
+                note_class=note_class, content=content)
+
+
+    def count_notes(self, note_class=None, content=None):
+        """Return the number of notes "get_notes" would return.
+
+        Arguments:
+
+            note_class -- 'footnote' or 'endnote'
+
+            content -- unicode regex
+
+        Return: int
+        """
+        return _count_elements(self, 'descendant::text:note',
+                note_class=note_class, content=content)
+
+
     def get_note(self, position=0, note_id=None, note_class=None,
             content=None):
         """Return the note that matches the criteria.
@@ -2018,6 +3506,30 @@ class odf_element(object):
         return uniq_names
 
 
+    def get_unique_name(self, kind='office', prefix=None):
+        """Return a name unused in the document of the element (or the tree
+        it belongs to), made of the prefix and a number.
+
+        The names in use are scanned once per document and kind, the names
+        returned are then reserved: allocating many costs no new scan. Names
+        inserted or set afterwards through the odf_element API are reserved
+        too, not those changed by other means.
+
+        Arguments:
+
+            kind -- 'office' (annotations)
+
+            prefix -- str, e.g. "__Fieldmark__lpod_" for office names
+
+        Return: str
+        """
+        if kind not in _unique_name_kinds:
+            raise ValueError('unknown kind of name: "%s"' % kind)
+        native_root = self.__element.getroottree().getroot()
+        return _get_unique_name(_make_odf_element(native_root), native_root,
+                kind, prefix)
+
+
     #
     # Variables
     #
@@ -2460,11 +3972,9 @@ class odf_element(object):
         Return: odf_element or None if not found
         """
         if name:
-            request = ('descendant::text:reference-mark-start[@text:name="%s"] '
-                   '| descendant::text:reference-mark[@text:name="%s"]') % (
-                                                                    name, name)
-
-            return _get_element(self, request, position=0)
+            request = ('(descendant::text:reference-mark-start '
+                   '| descendant::text:reference-mark)')
+            return _get_element(self, request, 0, text_name=name)
         else:
             request = ('descendant::text:reference-mark-start '
                    '| descendant::text:reference-mark')
@@ -2483,8 +3993,8 @@ class odf_element(object):
         """
         if name is None:
             return _get_elements(self, 'descendant::text:reference-ref')
-        request = 'descendant::text:reference-ref[@text:ref-name="%s"]' % name
-        return _get_elements(self, request)
+        request = 'descendant::text:reference-ref[@text:ref-name=$name]'
+        return self.get_elements(request, name=name)
 
 
     #
@@ -2808,9 +4318,9 @@ class odf_element(object):
         Return: odf_element or None if not found
         """
         if idx:
-            request = ('descendant::text:change-start[@text:change-id="%s"] '
-            '| descendant::text:change[@text:change-id="%s"]') % (idx, idx)
-            return _get_element(self, request, position=0)
+            request = ('descendant::text:change-start[@text:change-id=$idx] '
+            '| descendant::text:change[@text:change-id=$idx]')
+            return self.get_element(request, idx=idx)
         else:
             request = ('descendant::text:change-start '
                    '| descendant::text:change')
@@ -74,6 +74,7 @@ class odf_heading(odf_paragraph):
     """Specialised element for headings, which themselves are Specialised
     paragraphs.
     """
+    __slots__ = ()
 
     def get_formatted_text(self, context=None):
         if not context:
@@ -49,6 +49,7 @@ def odf_create_image(url, type='simple', show='embed', actuate='onLoad'):
 
 
 class odf_image(odf_element):
+    __slots__ = ()
 
     def get_url(self):
         return self.get_attribute('xlink:href')
@@ -76,6 +76,7 @@ def odf_create_link(url, name=None, title=None, text=None, target_frame=None,
 
 
 class odf_link(paragraph_base):
+    __slots__ = ()
 
     def get_name(self):
         return self.get_attribute('office:name')
@@ -39,6 +39,37 @@ def odf_create_file_entry(full_path, media_type):
 
 
 class odf_manifest(odf_xmlpart):
+    """The manifest part. The file entries are indexed by full path on first
+    access, so looking up, adding or deleting one costs no scan of the
+    tree. The index follows the methods below, not the changes made to the
+    XML tree directly.
+    """
+
+    def __init__(self, part_name, container):
+        odf_xmlpart.__init__(self, part_name, container)
+        # The file entries by full path, see __get_entries
+        self.__entries = None
+
+
+    def __get_entries(self):
+        entries = self.__entries
+        if entries is None:
+            self.__entries = entries = {}
+            for file_entry in self.get_root().get_children():
+                full_path = file_entry.get_attribute('manifest:full-path')
+                if full_path is not None:
+                    entries.setdefault(full_path, file_entry)
+        return entries
+
+
+    def clone(self):
+        # The clone indexes its own tree
+        entries = self.__entries
+        self.__entries = None
+        try:
+            return odf_xmlpart.clone(self)
+        finally:
+            self.__entries = entries
 
     #
     # Public API
@@ -49,8 +80,7 @@ class odf_manifest(odf_xmlpart):
 
         Return: list of unicode
         """
-        expr = '//manifest:file-entry/attribute::manifest:full-path'
-        return self.xpath(expr)
+        return list(self.__get_entries())
 
     #get_path_list = obsolete('get_path_list', get_paths)
 
@@ -60,10 +90,9 @@ class odf_manifest(odf_xmlpart):
 
         Return: list of (unicode, str) tuples
         """
-        expr = '//manifest:file-entry'
         result = []
-        for file_entry in self.xpath(expr):
-            result.append((file_entry.get_attribute('manifest:full-path'),
+        for full_path, file_entry in self.__get_entries().items():
+            result.append((full_path,
                            file_entry.get_attribute('manifest:media-type')))
         return result
 
@@ -75,12 +104,10 @@ class odf_manifest(odf_xmlpart):
 
         Return: str
         """
-        expr = ('//manifest:file-entry[attribute::manifest:full-path="%s"]'
-                '/attribute::manifest:media-type')
-        result = self.xpath(expr % full_path)
-        if not result:
+        file_entry = self.__get_entries().get(full_path)
+        if file_entry is None:
             return None
-        return result[0]
+        return file_entry.get_attribute('manifest:media-type')
 
 
     def set_media_type(self, full_path, media_type):
@@ -92,29 +119,26 @@ class odf_manifest(odf_xmlpart):
 
             media_type -- str
         """
-        expr = '//manifest:file-entry[attribute::manifest:full-path="%s"]'
-        result = self.xpath(expr % full_path)
-        if not result:
+        file_entry = self.__get_entries().get(full_path)
+        if file_entry is None:
             raise KeyError('path "%s" not found' % full_path)
-        file_entry = result[0]
         file_entry.set_attribute('manifest:media-type', str(media_type))
 
 
     def add_full_path(self, full_path, media_type=''):
+        entries = self.__get_entries()
         # Existing?
-        existing = self.get_media_type(full_path)
-        if existing is not None:
-            self.set_media_type(full_path, media_type)
+        if full_path in entries:
+            return self.set_media_type(full_path, media_type)
         root = self.get_root()
         file_entry = odf_create_file_entry(full_path, media_type)
         root.append(file_entry)
+        entries[full_path] = file_entry
 
 
     def del_full_path(self, full_path):
-        expr = '//manifest:file-entry[attribute::manifest:full-path="%s"]'
-        result = self.xpath(expr % full_path)
-        if not result:
+        file_entry = self.__get_entries().pop(full_path, None)
+        if file_entry is None:
             raise KeyError('path "%s" not found' % full_path)
-        file_entry = result[0]
         root = self.get_root()
         root.delete(file_entry)
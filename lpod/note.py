@@ -69,26 +69,12 @@ def odf_create_note(note_class='footnote', note_id=None, citation=None,
 
 def get_unique_office_name(element=None):
     """Provide an autogenerated unique <office:name> for the document.
+
+    See odf_element.get_unique_name.
     """
-    if element is not None:
-        body = element.get_document_body()
-    else:
-        body = None
-    if body:
-        used = body.get_office_names()
-    else:
-        used = []
-    # unplugged current paragraph:
-    if element is not None:
-        used.extend(element.get_office_names())
-    i = 1
-    while True:
-        name = '__Fieldmark__lpod_%s' % i
-        if name in used:
-            i += 1
-            continue
-        break
-    return name
+    if element is None:
+        return '__Fieldmark__lpod_1'
+    return element.get_unique_name('office')
 
 
 
@@ -123,7 +109,7 @@ def odf_create_annotation(text_or_element=None, creator=None, date=None,
     element.set_dc_date(date)
     if not name:
         name = get_unique_office_name(parent)
-        element.set_name(name)
+    element.set_name(name)
     return element
 
 
@@ -152,6 +138,7 @@ def odf_create_annotation_end(annotation=None, name=None):
 
 
 class odf_note(odf_element):
+    __slots__ = ()
 
     def get_class(self):
         return self.get_attribute('text:note-class')
@@ -213,6 +200,7 @@ class odf_note(odf_element):
 
 
 class odf_annotation(odf_element):
+    __slots__ = ()
 
     def get_body(self):
         return self.get_text_content()
@@ -332,6 +320,8 @@ class odf_annotation_end(odf_element):
     element without a preceding <office:annotation> element that has the same
     name assigned is ignored.
     """
+    __slots__ = ()
+
     def get_name(self):
         return self.get_attribute('office:name')
 
@@ -115,42 +115,14 @@ def _by_regex_offset(method):
         """
         offset = kwargs.get('offset', None)
         regex = kwargs.get('regex', None)
-        if offset:
+        if offset is not None:
             length = kwargs.get('length', 0)
-            counted = 0
-            for text in element.xpath("//text()"):
-                if len(text) + counted <= offset:
-                    counted += len(text)
-                    continue
-                if length > 0:
-                    length = min(length, len(text))
-                else:
-                    length = len(text)
-                # Static information about the text node
-                container = text.get_parent()
-                upper = container.get_parent()
-                is_text = text.is_text()
-                start = offset - counted
-                end = start + length
-                # Do not use the text node as it changes at each loop
-                if is_text:
-                    text = container.get_text()
-                else:
-                    text = container.get_tail()
-                before = text[:start]
-                match = text[start:end]
-                tail = text[end:]
-                result = method(element, match, tail, *args, **kwargs)
-                if is_text:
-                    container.set_text(before)
-                    # Insert as first child
-                    container.insert(result, position=0)
-                else:
-                    container.set_tail(before)
-                    # Insert as next sibling
-                    index = upper.index(container)
-                    upper.insert(result, position=index + 1)
-                return
+
+            def make_element(match, tail):
+                return method(element, match, tail, *args, **kwargs)
+
+            element._insert_at_offset(make_element, offset, length=length)
+            return
         if regex:
             pattern = re.compile(str(regex), re.UNICODE)
             for text in element.xpath('descendant::text()'):
@@ -189,6 +161,7 @@ class odf_paragraph(paragraph_base):
     represents a paragraph, which is the basic unit of text in an OpenDocument
     file.
     """
+    __slots__ = ()
 
     def insert_note(self, note_element=None, after=None,
                     note_class='footnote', note_id=None, citation=None,
@@ -720,7 +693,7 @@ class odf_paragraph(paragraph_base):
 
 
 class odf_span(odf_paragraph):
-    pass
+    __slots__ = ()
 
 
 
@@ -31,7 +31,6 @@
 import re
 
 # Import from lpod
-from .element import odf_text
 from .element import odf_element, odf_create_element
 
 
@@ -64,11 +63,11 @@ def _get_formatted_text(element, context, with_text=True):
 
     result = []
     if with_text:
-        objects = element.xpath('*|text()')
+        objects = element._iter_text_and_children()
     else:
-        objects = element.get_children()
+        objects = element.iter_children()
     for obj in objects:
-        if type(obj) is odf_text:
+        if type(obj) is str:
             result.append(obj)
         else:
             tag = obj.get_tag()
@@ -90,8 +89,8 @@ def _get_formatted_text(element, context, with_text=True):
                     result.append(text)
                     continue
                 if document:
-                    style = document.get_style("text", style)
-                    properties = style.get_properties()
+                    properties = document.get_style_properties("text",
+                            style)
                 else:
                     properties = None
                 if properties is None:
@@ -227,6 +226,8 @@ def odf_create_line_break():
 class paragraph_base(odf_element):
     """Base class for paragraph like classes.
     """
+    __slots__ = ()
+
     def get_style(self):
         return self.get_attribute('text:style-name')
 
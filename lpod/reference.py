@@ -51,6 +51,7 @@ class odf_reference_mark(odf_element):
     A point reference marks a position in text and is represented by a single
     <text:reference-mark> element.
     """
+    __slots__ = ()
 
     def get_name(self):
         return self.get_attribute('text:name')
@@ -76,6 +77,7 @@ class odf_reference_mark_end(odf_reference_mark):
     """The <text:reference-mark-end> element represents the end of a range
     reference.
     """
+    __slots__ = ()
 
     def get_referenced_text(self):
         """Return the text between reference-mark-start and reference-mark-end.
@@ -95,6 +97,7 @@ class odf_reference_mark_start(odf_reference_mark_end):
     """The <text:reference-mark-start> element represents the start of a
     range reference.
     """
+    __slots__ = ()
 
     def delete(self, child=None, keep_tail=True):
         """Delete the given element from the XML tree. If no element is given,
@@ -214,6 +217,7 @@ class odf_reference(odf_element):
         referenced item.
 
     """
+    __slots__ = ()
 
     format_allowed = ('chapter', 'direction', 'page', 'text', 'caption',
         'category-and-value', 'value', 'number', 'number-all-superior',
@@ -586,6 +586,8 @@ def odf_create_style(family, name=None, display_name=None, parent=None,
 class odf_style(odf_element):
     """Specialised element for styles, yet generic to all style types.
     """
+    __slots__ = ()
+
     def get_name(self):
         return self.get_attribute('style:name')
 
@@ -805,6 +807,8 @@ class odf_style(odf_element):
 class odf_list_style(odf_style):
     """A list style is a container for list level styles.
     """
+    __slots__ = ()
+
     any_style = ('(text:list-level-style-number'
                  '|text:list-level-style-bullet'
                  '|text:list-level-style-image)')
@@ -900,6 +904,7 @@ class odf_list_style(odf_style):
 
 
 class odf_outline_style(odf_list_style):
+    __slots__ = ()
 
     # FIXME stubs
     def get_family(self):
@@ -912,6 +917,8 @@ class odf_page_layout(odf_style):
 
     XXX to verify
     """
+    __slots__ = ()
+
     def get_family(self):
         return 'page-layout'
 
@@ -950,6 +957,8 @@ class odf_master_page(odf_style):
 
     XXX to verify
     """
+    __slots__ = ()
+
     def __set_header_or_footer(self, text_or_element, name='header',
                                style="Header"):
         if name == 'header':
@@ -1053,6 +1062,7 @@ class odf_master_page(odf_style):
 
 
 class odf_font_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'font-face'
@@ -1071,6 +1081,7 @@ class odf_font_style(odf_style):
 
 
 class odf_number_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'number'
@@ -1078,6 +1089,7 @@ class odf_number_style(odf_style):
 
 
 class odf_percentage_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'percentage'
@@ -1085,6 +1097,7 @@ class odf_percentage_style(odf_style):
 
 
 class odf_time_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'time'
@@ -1092,6 +1105,7 @@ class odf_time_style(odf_style):
 
 
 class odf_date_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'date'
@@ -1099,13 +1113,31 @@ class odf_date_style(odf_style):
 
 
 class odf_currency_style(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'currency'
 
 
 
+class odf_boolean_style(odf_style):
+    __slots__ = ()
+
+    def get_family(self):
+        return 'boolean'
+
+
+
+class odf_text_style(odf_style):
+    __slots__ = ()
+
+    def get_family(self):
+        return 'text'
+
+
+
 class odf_presentation_page_layout(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'presentation-page-layout'
@@ -1113,6 +1145,7 @@ class odf_presentation_page_layout(odf_style):
 
 
 class odf_list_level_style_number(odf_style):
+    __slots__ = ()
 
     def get_text_style(self):
         return self.get_attribute('text:style-name')
@@ -1124,6 +1157,7 @@ class odf_list_level_style_number(odf_style):
 
 
 class odf_marker(odf_style):
+    __slots__ = ()
 
     def get_family(self):
         return 'marker'
@@ -1131,6 +1165,7 @@ class odf_marker(odf_style):
 
 
 class odf_background_image(odf_image):
+    __slots__ = ()
 
     def get_position(self):
         return self.get_attribute('style:position')
@@ -1263,6 +1298,8 @@ register_style('number:percentage-style', odf_percentage_style)
 register_style('number:time-style', odf_time_style)
 register_style('number:date-style', odf_date_style)
 register_style('number:currency-style', odf_currency_style)
+register_style('number:boolean-style', odf_boolean_style)
+register_style('number:text-style', odf_text_style)
 register_style('style:presentation-page-layout',
         odf_presentation_page_layout)
 register_style('text:list-level-style-number', odf_list_level_style_number)
@@ -28,17 +28,31 @@
 #
 
 # Import from the Standard Library
+from array import array
+from copy import copy
 from io import StringIO
 from csv import reader, Sniffer
 from textwrap import wrap
-from bisect import bisect_left, insort
+from itertools import groupby
+from xml.sax.saxutils import quoteattr
 import string
 
+# Import from lxml
+from lxml.etree import iterparse, Element, SubElement, tostring
+
+# Import from numpy (optional)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Import from lpod
 from .datatype import Boolean, Date, DateTime, Duration
 from .element import odf_create_element, register_element_class, odf_element
-from .element import _xpath_compile
+from .element import _xpath_compile, _decode_qname, ns_stripper
+from .element import ODF_NAMESPACES
 from .utils import get_value, _set_value_and_type, isiterable   #, obsolete
+from .utils import _position_map
 
 
 
@@ -49,6 +63,26 @@ _xpath_column_idx = _xpath_compile('(table:table-column)[$idx]')
 _xpath_cell = _xpath_compile('(table:table-cell|table:covered-table-cell)')
 _xpath_cell_idx = _xpath_compile('(table:table-cell|table:covered-table-cell)[$idx]')
 
+# lxml tags for the incremental parser
+_tag_table = '{%s}%s' % _decode_qname('table:table')
+_tag_row = '{%s}%s' % _decode_qname('table:table-row')
+_tag_column = '{%s}%s' % _decode_qname('table:table-column')
+_tag_cells = ('{%s}%s' % _decode_qname('table:table-cell'),
+              '{%s}%s' % _decode_qname('table:covered-table-cell'))
+_attr_name = '{%s}%s' % _decode_qname('table:name')
+_attr_rows_repeated = '{%s}%s' % _decode_qname('table:number-rows-repeated')
+_attr_columns_repeated = '{%s}%s' % _decode_qname(
+        'table:number-columns-repeated')
+_attr_style_name = '{%s}%s' % _decode_qname('table:style-name')
+_tag_paragraph = '{%s}%s' % _decode_qname('text:p')
+_attr_value_type = '{%s}%s' % _decode_qname('office:value-type')
+_attr_value = '{%s}%s' % _decode_qname('office:value')
+_attr_boolean_value = '{%s}%s' % _decode_qname('office:boolean-value')
+_numeric_types = ('float', 'percentage', 'currency')
+# Prefixes used by the rows of the stream writer
+_writer_nsmap = dict((prefix, ODF_NAMESPACES[prefix])
+                     for prefix in ('office', 'table', 'text'))
+
 
 
 def _table_name_check(name):
@@ -279,7 +313,7 @@ def _set_item_in_vault(position, item, vault, vault_scheme, vault_map_name, clon
     # update cache
     # remove existing
     idx = odf_idx
-    map = _erase_map_once(vault_map, idx)
+    map = _erase_map_once(vault_map.copy(), idx)
     # add before if any:
     if repeated_before >= 1:
         map = _insert_map_once(map, idx, repeated_before)
@@ -336,12 +370,12 @@ def _insert_item_in_vault(position, item, vault, vault_scheme, vault_map_name):
         vault.insert(new_item, position = target_idx)
     # update cache
     if repeated_before >= 1:
-        map = _erase_map_once(vault_map, odf_idx)
+        map = _erase_map_once(vault_map.copy(), odf_idx)
         map = _insert_map_once(map, odf_idx, repeated_before)
         map = _insert_map_once(map, odf_idx + 1, repeated)
         setattr(vault, vault_map_name, _insert_map_once(map, odf_idx + 2, repeated_after))
     else:
-        setattr(vault, vault_map_name, _insert_map_once(vault_map, odf_idx, repeated))
+        setattr(vault, vault_map_name, _insert_map_once(vault_map.copy(), odf_idx, repeated))
     return new_item
 
 
@@ -366,18 +400,36 @@ def _delete_item_in_vault(position, vault, vault_scheme, vault_map_name):
     current_pos = before_cache + 1
     current_repeated = current_cache - before_cache
     new_repeated = current_repeated - 1
+    map = vault_map.copy()
     if new_repeated >= 1:
         current_item._set_repeated(new_repeated)
-        setattr(vault, vault_map_name, vault_map[:odf_idx] + [(x - 1) for x in vault_map[odf_idx:]] )
+        map.set_repeated(odf_idx, new_repeated)
     else:
         # actual erase
         vault.delete(current_item)
-        setattr(vault, vault_map_name, vault_map[:odf_idx] + [(x - 1) for x in vault_map[odf_idx + 1:]] )
+        map.erase(odf_idx)
+    setattr(vault, vault_map_name, map)
+
+
+
+def _cache_items(vault, xpath_instance, vault_map_name, start, end):
+    """Load in the cache of the vault (row, table) the items (cell, row) from
+    odf_idx "start" to "end", with a single query.
+    """
+    cache = vault._indexes[vault_map_name]
+    for idx in range(start, end + 1):
+        if idx not in cache:
+            break
+    else:
+        return
+    items = vault._get_elements_idx2(xpath_instance, start, end)
+    for idx, item in enumerate(items, start):
+        cache.setdefault(idx, item)
 
 
 
 def _insert_map_once(map, odf_idx, repeated):
-    """Add an item (cell or row) to the map
+    """Add an item (cell or row) to the map, in place
 
             map  --  cache map
 
@@ -387,26 +439,15 @@ def _insert_map_once(map, odf_idx, repeated):
 
         odf_idx is NOT position (col or row), neither raw XML position, but ODF index
     """
-    repeated = repeated or 1
     if odf_idx > len(map):
         raise IndexError
-    if odf_idx > 0 :
-        before = map[odf_idx - 1]
-    else:
-        before = -1
-    juska = before + repeated # aka max position value for item
-    if odf_idx == len(map):
-        insort(map, juska)
-        return map
-    new_map = map[:odf_idx]
-    new_map.append(juska)
-    new_map.extend([(x + repeated) for x in map[odf_idx:]])
-    return new_map
+    map.insert(odf_idx, repeated or 1)
+    return map
 
 
 
 def _erase_map_once(map, odf_idx):
-    """Remove an item (cell or row) from the map
+    """Remove an item (cell or row) from the map, in place
 
             map  --  cache map
 
@@ -414,13 +455,7 @@ def _erase_map_once(map, odf_idx):
     """
     if odf_idx >= len(map):
         raise IndexError
-    if odf_idx > 0 :
-        before = map[odf_idx - 1]
-    else:
-        before = -1
-    current = map[odf_idx]
-    repeated = current - before
-    map = map[:odf_idx] + [(x - repeated) for x in map[odf_idx + 1:]]
+    map.erase(odf_idx)
     return map
 
 
@@ -428,20 +463,14 @@ def _erase_map_once(map, odf_idx):
 def _make_cache_map(idx_repeated_seq):
     """Build the initial cache map of the table.
     """
-    map = []
-    for odf_idx, repeated in idx_repeated_seq:
-        map = _insert_map_once(map, odf_idx, repeated)
-    return map
+    return _position_map(repeated for odf_idx, repeated in idx_repeated_seq)
 
 
 
 def _find_odf_idx(map, position):
     """Find odf_idx in the map from the position (col or row).
     """
-    odf_idx = bisect_left(map, position)
-    if odf_idx < len(map):
-        return odf_idx
-    return None
+    return map.find(position)
 
 
 
@@ -674,6 +703,10 @@ class odf_cell(odf_element):
     """Class for the table cell element.
     """
 
+    # Positions and caches are kept by each wrapper
+    _reuse_wrapper = False
+
+
     def __init__(self, native_element):
         odf_element.__init__(self, native_element)
         self.y = None
@@ -885,6 +918,9 @@ class odf_cell(odf_element):
 
 class odf_row(odf_element):
 
+    # Positions and caches are kept by each wrapper
+    _reuse_wrapper = False
+
     # Private API
     def __init__(self, native_element, cache=None):
         odf_element.__init__(self, native_element, cache)
@@ -893,8 +929,8 @@ class odf_row(odf_element):
         if not hasattr(self, '_rmap'):
             self._compute_row_cache()
             if not hasattr(self, '_tmap'):
-                self._tmap = []
-                self._cmap = []
+                self._tmap = _position_map()
+                self._cmap = _position_map()
         if not hasattr(self, '_indexes'):
             self._indexes={}
             self._indexes['_rmap'] = {}
@@ -995,8 +1031,7 @@ class odf_row(odf_element):
         if isinstance(upper, odf_table):
             upper._compute_table_cache()
             if hasattr(self, '_tmap'):
-                del self._tmap[:]
-                self._tmap.extend(upper._tmap)
+                self._tmap.update(upper._tmap)
             else:
                 self._tmap = upper._tmap
 
@@ -1034,7 +1069,7 @@ class odf_row(odf_element):
         return w
 
 
-    def traverse(self, start=None, end=None):
+    def traverse(self, start=None, end=None, clone=True):
         """Yield as many cell elements as expected cells in the row, i.e.
         expand repetitions by returning the same cell as many times as
         necessary.
@@ -1045,12 +1080,19 @@ class odf_row(odf_element):
 
                 end -- int
 
+                clone -- boolean
+
         Copies are returned, use ``set_cell`` to push them back.
+
+        If clone is False, the cells of the row are returned as is, with
+        their repetition, for reading only. Each position gets a wrapper of
+        its own, with its "x" position, around the same XML element.
         """
         idx = -1
         before = -1
         x = 0
         if start is None and end is None:
+            _cache_items(self, _xpath_cell, '_rmap', 0, len(self._rmap) - 1)
             for juska in self._rmap:
                 idx += 1
                 if idx in self._indexes['_rmap']:
@@ -1064,10 +1106,13 @@ class odf_row(odf_element):
                     # Return a copy without the now obsolete repetition
                     if cell is None:
                         cell = odf_create_cell()
-                    else:
+                    elif clone:
                         cell = cell.clone()
                         if repeated > 1:
                             cell.set_repeated(None)
+                    else:
+                        # A wrapper of its own for each position
+                        cell = copy(cell)
                     cell.y = self.y
                     cell.x = x
                     x += 1
@@ -1084,12 +1129,18 @@ class odf_row(odf_element):
             start_map = _find_odf_idx(self._rmap, start)
             if start_map is None:
                 return
+            end_map = _find_odf_idx(self._rmap, end)
+            if end_map is None:
+                end_map = len(self._rmap) - 1
+            _cache_items(self, _xpath_cell, '_rmap', start_map, end_map)
             if start_map > 0:
                 before = self._rmap[start_map - 1]
             idx = start_map - 1
             before = start - 1
             x = start
-            for juska in self._rmap[start_map:]:
+            for juska in self._rmap.iter_from(start_map):
+                if before >= end:
+                    break
                 idx += 1
                 if idx in self._indexes['_rmap']:
                     cell = self._indexes['_rmap'][idx]
@@ -1102,10 +1153,13 @@ class odf_row(odf_element):
                     if x <= end:
                         if cell is None:
                             cell = odf_create_cell()
-                        else:
+                        elif clone:
                             cell = cell.clone()
                             if repeated > 1 or (x == start and start > 0):
                                 cell.set_repeated(None)
+                        else:
+                            # A wrapper of its own for each position
+                            cell = copy(cell)
                         cell.y = self.y
                         cell.x = x
                         x += 1
@@ -1408,7 +1462,7 @@ class odf_row(odf_element):
         if cell_type:
             cell_type = cell_type.lower().strip()
             values = []
-            for cell in self.traverse(start = x, end = z):
+            for cell in self.traverse(start = x, end = z, clone = False):
                 # Filter the cells by cell_type
                 ctype = cell.get_type()
                 if not ctype or not (ctype == cell_type or cell_type == 'all'):
@@ -1422,7 +1476,7 @@ class odf_row(odf_element):
             return values
         else:
             return [ cell.get_value(get_type = get_type)
-                                for cell in self.traverse(start = x, end = z) ]
+                    for cell in self.traverse(start = x, end = z, clone = False) ]
 
 
     def set_cells(self, cells=[], start=0, clone=True):
@@ -1528,13 +1582,18 @@ class odf_row(odf_element):
 class odf_row_group(odf_element):
     """Class to group rows with common properties.
     """
+    __slots__ = ()
+
     # TODO
-    pass
 
 
 
 class odf_column(odf_element):
 
+    # Positions and caches are kept by each wrapper
+    _reuse_wrapper = False
+
+
     def __init__(self, native_element, cache=None):
         odf_element.__init__(self, native_element, cache)
         self.x = None
@@ -1608,8 +1667,7 @@ class odf_column(odf_element):
         if isinstance(upper, odf_table):
             upper._compute_table_cache()
             if hasattr(self, '_cmap'):
-                del self._cmap[:]
-                self._cmap.extend(upper._cmap)
+                self._cmap.update(upper._cmap)
             else:
                 self._cmap = upper._cmap
 
@@ -1634,6 +1692,10 @@ class odf_column(odf_element):
 
 
 class odf_table(odf_element):
+
+    # Positions and caches are kept by each wrapper
+    _reuse_wrapper = False
+
     #
     # Private API
     #
@@ -1809,8 +1871,8 @@ class odf_table(odf_element):
 
     def __get_formatted_text_normal(self, context):
         result = []
-        for row in self.traverse():
-            for cell in row.traverse():
+        for row in self.traverse(clone=False):
+            for cell in row.traverse(clone=False):
                 value = get_value(cell, try_get_text=False)
                 # None ?
                 if value is None:
@@ -1837,9 +1899,9 @@ class odf_table(odf_element):
         rows = []
         cols_nb = 0
         cols_size = {}
-        for odf_row in table.traverse():
+        for odf_row in table.traverse(clone=False):
             row = []
-            for i, cell in enumerate(odf_row.traverse()):
+            for i, cell in enumerate(odf_row.traverse(clone=False)):
                 value = get_value(cell, try_get_text=False)
                 # None ?
                 if value is None:
@@ -2134,7 +2196,7 @@ class odf_table(odf_element):
         else:
             x = y = z = t = None
         data = []
-        for row in self.traverse(start = y, end = t):
+        for row in self.traverse(start = y, end = t, clone = False):
             if z is None:
                 width = self.get_width()
             else:
@@ -2184,7 +2246,7 @@ class odf_table(odf_element):
             x, y, z, t = self._translate_table_coordinates(coord)
         else:
             x = y = z = t = None
-        for row in self.traverse(start = y, end = t):
+        for row in self.traverse(start = y, end = t, clone = False):
             if z is None:
                 width = self.get_width()
             else:
@@ -2203,6 +2265,132 @@ class odf_table(odf_element):
             yield values
 
 
+    def _translate_area(self, coord):
+        """Return the (x, y, z, t) area of the given coordinates, defaulting
+        to the whole table.
+        """
+        if coord:
+            x, y, z, t = self._translate_table_coordinates(coord)
+        else:
+            x = y = z = t = None
+        width = self.get_width()
+        height = self.get_height()
+        x = x or 0
+        y = y or 0
+        z = width - 1 if z is None else min(z, width - 1)
+        t = height - 1 if t is None else min(t, height - 1)
+        return x, y, z, t
+
+
+    def get_columns_arrays(self, coord=None):
+        """Get the values of the table column by column, decoded in one pass
+        over the cells, repetitions included.
+
+        A column is an array('d') when all its non-empty cells are numbers
+        (float, percentage or currency), with 0.0 for the empty cells.
+        Else it is a list of Python types, with None for the empty cells.
+        Numbers are always returned as float.
+
+        The mask of a column is an array('B') of 1 for the empty cells and
+        0 for the others.
+
+        Filter by coordinates will parse the area defined by the coordinates.
+
+        Arguments:
+
+            coord -- str or tuple of int : coordinates of area
+
+        Return: tuple (list of columns, list of masks)
+        """
+        x, y, z, t = self._translate_area(coord)
+        width = max(z - x + 1, 0)
+        height = max(t - y + 1, 0)
+        # Columns are numeric until a value of another type is found
+        columns = [array('d', [0.0]) * height for i in range(width)]
+        masks = [array('B', [1]) * height for i in range(width)]
+        numeric = [True] * width
+        rows = self._get_native_elements(_xpath_row)
+        for r, rows_repeated, c, repeated, cell in _iter_area_runs(rows, x, y,
+                z, t):
+            if cell.get(_attr_value_type) in _numeric_types:
+                value = _get_cell_number(cell)
+                if value is None:
+                    # Unreadable number, left empty
+                    continue
+                numbers = array('d', [value]) * rows_repeated
+                is_number = True
+            else:
+                value = get_value(odf_cell(cell))
+                is_number = False
+            values = [value] * rows_repeated
+            filled = array('B', [0]) * rows_repeated
+            for i in range(c, c + repeated):
+                if numeric[i] and not is_number:
+                    column = columns[i]
+                    mask = masks[i]
+                    columns[i] = [None if mask[j] else column[j]
+                                  for j in range(height)]
+                    numeric[i] = False
+                if numeric[i]:
+                    columns[i][r:r + rows_repeated] = numbers
+                else:
+                    columns[i][r:r + rows_repeated] = values
+                masks[i][r:r + rows_repeated] = filled
+        return columns, masks
+
+
+    def to_numpy(self, coord=None, dtype=float):
+        """Get the values of the table as a NumPy masked array of shape
+        (height, width), where empty cells are masked. The cells are decoded
+        in one pass, repeated cells and rows being broadcast.
+
+        With a numeric dtype, numbers (float, percentage or currency) and
+        booleans are converted, other cells are masked as empty cells. With
+        the object dtype, the Python values of ``get_values`` are used.
+
+        Filter by coordinates will parse the area defined by the coordinates.
+
+        Requires NumPy.
+
+        Arguments:
+
+            coord -- str or tuple of int : coordinates of area
+
+            dtype -- NumPy dtype
+
+        Return: numpy.ma.MaskedArray
+        """
+        if numpy is None:
+            raise ImportError('NumPy is required by "to_numpy"')
+        dtype = numpy.dtype(dtype)
+        x, y, z, t = self._translate_area(coord)
+        shape = (max(t - y + 1, 0), max(z - x + 1, 0))
+        if dtype.kind == 'O':
+            data = numpy.empty(shape, dtype=dtype)
+        else:
+            data = numpy.zeros(shape, dtype=dtype)
+        mask = numpy.ones(shape, dtype=bool)
+        rows = self._get_native_elements(_xpath_row)
+        for r, rows_repeated, c, repeated, cell in _iter_area_runs(rows, x, y,
+                z, t):
+            value_type = cell.get(_attr_value_type)
+            if value_type in _numeric_types and (dtype.kind != 'O'
+                    or cell.get(_attr_value) is None):
+                value = _get_cell_number(cell)
+                if value is None:
+                    # Unreadable number, masked
+                    continue
+            elif dtype.kind == 'O':
+                value = get_value(odf_cell(cell))
+            elif value_type == 'boolean':
+                value = cell.get(_attr_boolean_value) == 'true'
+            else:
+                continue
+            data[r:r + rows_repeated, c:c + repeated] = value
+            mask[r:r + rows_repeated, c:c + repeated] = False
+        return numpy.ma.MaskedArray(data, mask=mask)
+
+
     def set_values(self, values, coord=None, style=None, cell_type=None,
                    currency=None):
         """set the value of cells in the table, from the 'coord' position
@@ -2256,6 +2444,79 @@ class odf_table(odf_element):
     #set_table_values = obsolete('set_table_values', set_values)
 
 
+    def set_values_from_arrays(self, columns, coord=None, style=None,
+            cell_type=None, currency=None):
+        """Set the value of cells in the table from columns of values, from
+        the 'coord' position, default (0, 0) ("A1").
+
+        A list of columns is expected, each column being a sequence of
+        Python values: list, array.array or NumPy array (masked values are
+        None). Shorter columns are completed with None, which create empty
+        cells.
+
+        The rows beyond the current height of the table are built directly,
+        equal consecutive values and rows being merged into repeated cells
+        and rows. Existing rows are updated like ``set_values`` does.
+
+        Arguments:
+
+            columns -- list of sequences of Python types
+
+            coord -- tuple or str
+
+            style -- unicode
+
+            cell_type -- 'boolean', 'currency', 'date', 'float',
+                         'percentage', 'string' or 'time'
+
+            currency -- three-letter str
+        """
+        if coord:
+            x, y = self._translate_cell_coordinates(coord)
+        else:
+            x = y = 0
+        x = x or 0
+        y = y or 0
+        columns = [(column.tolist() if hasattr(column, 'tolist')
+                    else list(column)) for column in columns]
+        if not columns:
+            return
+        height = max(len(column) for column in columns)
+        for column in columns:
+            column.extend([None] * (height - len(column)))
+        padding = [None] * x
+        table_height = self.get_height()
+        if y > table_height:
+            self.append_row(odf_row(_make_row([],
+                    repeated=y - table_height)), clone=False,
+                    _repeated=y - table_height)
+            table_height = y
+        for key, rows in groupby(zip(*columns),
+                lambda values: tuple(map(_run_key, values))):
+            rows = list(rows)
+            values = list(rows[0])
+            repeated = len(rows)
+            while repeated and y < table_height:
+                # Update an existing row
+                row = self.get_row(y, clone=True)
+                if row.get_repeated():
+                    row.set_repeated(None)
+                row.set_values(values, start=x, cell_type=cell_type,
+                        currency=currency, style=style)
+                self.set_row(y, row, clone=False)
+                self.__update_width(row)
+                y += 1
+                repeated -= 1
+            if not repeated:
+                continue
+            row = _make_row(padding + values, cell_style=style,
+                    cell_type=cell_type, currency=currency,
+                    repeated=repeated)
+            self.append_row(odf_row(row), clone=False, _repeated=repeated)
+            y += repeated
+            table_height += repeated
+
+
     def rstrip(self, aggressive=False):
         """Remove *in-place* empty rows below and empty cells at the right of
         the table. Cells are empty if they contain no value or it evaluates
@@ -2394,7 +2655,7 @@ class odf_table(odf_element):
         return self.get_elements(_xpath_row)
 
 
-    def traverse(self, start=None, end=None):
+    def traverse(self, start=None, end=None, clone=True):
         """Yield as many row elements as expected rows in the table, i.e.
         expand repetitions by returning the same row as many times as
         necessary.
@@ -2405,12 +2666,19 @@ class odf_table(odf_element):
 
                 end -- int
 
+                clone -- boolean
+
         Copies are returned, use ``set_row`` to push them back.
+
+        If clone is False, the rows of the table are returned as is, with
+        their repetition, for reading only. Each position gets a wrapper of
+        its own, with its "y" position, around the same XML element.
         """
         idx = -1
         before = -1
         y = 0
         if start is None and end is None:
+            _cache_items(self, _xpath_row, '_tmap', 0, len(self._tmap) - 1)
             for juska in self._tmap:
                 idx += 1
                 if idx in self._indexes['_tmap']:
@@ -2422,11 +2690,15 @@ class odf_table(odf_element):
                 before = juska
                 for i in range(repeated or 1):
                     # Return a copy without the now obsolete repetition
-                    row = row.clone()
+                    if clone:
+                        row = row.clone()
+                        if repeated > 1:
+                            row.set_repeated(None)
+                    else:
+                        # A wrapper of its own for each position
+                        row = copy(row)
                     row.y = y
                     y += 1
-                    if repeated > 1:
-                        row.set_repeated(None)
                     yield row
         else:
             if start is None:
@@ -2440,12 +2712,18 @@ class odf_table(odf_element):
             start_map = _find_odf_idx(self._tmap, start)
             if start_map is None:
                 return
+            end_map = _find_odf_idx(self._tmap, end)
+            if end_map is None:
+                end_map = len(self._tmap) - 1
+            _cache_items(self, _xpath_row, '_tmap', start_map, end_map)
             if start_map > 0:
                 before = self._tmap[start_map - 1]
             idx = start_map - 1
             before = start - 1
             y = start
-            for juska in self._tmap[start_map:]:
+            for juska in self._tmap.iter_from(start_map):
+                if before >= end:
+                    break
                 idx += 1
                 if idx in self._indexes['_tmap']:
                     row = self._indexes['_tmap'][idx]
@@ -2456,11 +2734,15 @@ class odf_table(odf_element):
                 before = juska
                 for i in range(repeated or 1):
                     if y <= end:
-                        row = row.clone()
+                        if clone:
+                            row = row.clone()
+                            if repeated > 1 or (y == start and start > 0):
+                                row.set_repeated(None)
+                        else:
+                            # A wrapper of its own for each position
+                            row = copy(row)
                         row.y = y
                         y += 1
-                        if repeated > 1 or (y == start and start > 0):
-                            row.set_repeated(None)
                         yield row
 
 
@@ -2626,7 +2908,7 @@ class odf_table(odf_element):
         self._compute_table_cache()
         # Update width if necessary
         width = self.get_width()
-        for row in self.traverse():
+        for row in self.traverse(clone=False):
             if row.get_width() > width:
                 width = row.get_width()
         diff = width - self.get_width()
@@ -3224,7 +3506,7 @@ class odf_table(odf_element):
             idx = start_map - 1
             before = start - 1
             x = start
-            for juska in self._cmap[start_map:]:
+            for juska in self._cmap.iter_from(start_map):
                 idx += 1
                 if idx in self._indexes['_cmap']:
                     column = self._indexes['_cmap'][idx]
@@ -3467,10 +3749,10 @@ class odf_table(odf_element):
             cell_type = cell_type.lower().strip()
         cells = []
         if not style and not content and not cell_type:
-            for row in self.traverse():
+            for row in self.traverse(clone=False):
                 cells.append(row.get_cell(x, clone=True))
             return cells
-        for row in self.traverse():
+        for row in self.traverse(clone=False):
             cell = row.get_cell(x, clone=True)
         # Filter the cells by cell_type
             if cell_type:
@@ -3924,6 +4206,10 @@ class odf_named_range(odf_element):
 
         usage -- None or str, usage of the named range.
     """
+    # The attributes above are read by each wrapper
+    _reuse_wrapper = False
+
+
     def __init__(self, native_element):
         odf_element.__init__(self, native_element)
         self.name = self.get_attribute('table:name')
@@ -4195,6 +4481,314 @@ def import_from_csv(path_or_file, name, style=None, delimiter=None,
 
 
 
+def _iter_table_rows(file, name=None, position=0, get_type=False,
+        complete=False):
+    """Yield the lists of Python values of the rows of a table, reading the
+    given "content.xml" file-like object incrementally.
+
+    Only one row element is alive at a time: it is decoded, then freed
+    before the next one is parsed, like the rows of the tables skipped.
+    Repetitions are expanded on the fly.
+
+    See ``odf_document.iter_table_rows`` for the arguments.
+    """
+    empty = (None, None) if get_type else None
+    depth = 0
+    count = -1
+    target_depth = None
+    width = 0
+    # Empty rows are only yielded when followed by a non-empty one
+    pending_rows = 0
+    for event, element in iterparse(file, events=('start', 'end'),
+            tag=(_tag_table, _tag_row, _tag_column)):
+        tag = element.tag
+        if tag == _tag_table:
+            if event == 'start':
+                depth += 1
+                if target_depth is not None:
+                    continue
+                count += 1
+                if name is not None:
+                    found = element.get(_attr_name) == name
+                else:
+                    found = count == position
+                if found:
+                    target_depth = depth
+                continue
+            depth -= 1
+            if target_depth is None and depth == 0:
+                # Free the tables we are not interested in
+                _free_element(element)
+            elif target_depth is not None and depth < target_depth:
+                # End of our table
+                break
+            continue
+        if event != 'end':
+            continue
+        if target_depth is None:
+            # Rows and columns of the tables skipped
+            _free_element(element)
+            continue
+        if depth != target_depth:
+            continue
+        if tag == _tag_column:
+            width += int(element.get(_attr_columns_repeated) or 1)
+            continue
+        # Decode the row, expanding the repeated cells
+        values = []
+        pending_cells = 0
+        for cell in element.iterchildren(*_tag_cells):
+            repeated = int(cell.get(_attr_columns_repeated) or 1)
+            value = get_value(odf_cell(cell), get_type=get_type)
+            if value == empty:
+                pending_cells += repeated
+                continue
+            if pending_cells:
+                values.extend([empty] * pending_cells)
+                pending_cells = 0
+            if repeated > 1:
+                values.extend([value] * repeated)
+            else:
+                values.append(value)
+        if complete:
+            values.extend([empty] * (max(width, len(values) + pending_cells)
+                                     - len(values)))
+        repeated = int(element.get(_attr_rows_repeated) or 1)
+        _free_element(element)
+        if not values and not complete:
+            pending_rows += repeated
+            continue
+        for i in range(pending_rows):
+            yield []
+        pending_rows = 0
+        for i in range(repeated):
+            yield values[:]
+    if target_depth is None:
+        if name is not None:
+            raise ValueError('table "%s" not found' % name)
+        raise ValueError('no table at position %s' % position)
+
+
+
+def _get_cell_number(cell):
+    """Return the float value of the given numeric lxml cell, read from its
+    text when office:value is missing, or None if unreadable.
+    """
+    value = cell.get(_attr_value)
+    if value is None:
+        value = ''.join(cell.itertext()).strip()
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+
+def _iter_area_runs(rows, x, y, z, t):
+    """Yield the runs of non-empty cells of the given area, from the lxml
+    row elements of a table, as tuples (row, rows repeated, column, columns
+    repeated, cell). Positions are relative to the area and repetitions are
+    clipped to the area, not expanded.
+    """
+    row_pos = 0
+    for row in rows:
+        if row_pos > t:
+            break
+        row_end = row_pos + int(row.get(_attr_rows_repeated) or 1) - 1
+        if row_end >= y:
+            start = max(row_pos, y)
+            height = min(row_end, t) - start + 1
+            col_pos = 0
+            for cell in row.iterchildren(*_tag_cells):
+                if col_pos > z:
+                    break
+                col_end = col_pos + int(cell.get(_attr_columns_repeated)
+                                        or 1) - 1
+                if col_end >= x and cell.get(_attr_value_type) is not None:
+                    col_start = max(col_pos, x)
+                    yield (start - y, height, col_start - x,
+                           min(col_end, z) - col_start + 1, cell)
+                col_pos = col_end + 1
+        row_pos = row_end + 1
+
+
+
+def _free_element(element):
+    """Release an element parsed by iterparse and its previous siblings.
+    """
+    element.clear()
+    parent = element.getparent()
+    if parent is None:
+        return
+    while element.getprevious() is not None:
+        del parent[0]
+
+
+
+def _run_key(value):
+    # 1, 1.0 and True are equal but not the same cell
+    return (value.__class__, value)
+
+
+
+def _make_row(values, style=None, cell_style=None, cell_type=None,
+        currency=None, repeated=None):
+    """Return a new lxml row holding the given Python values. Equal
+    consecutive values are merged into a repeated cell.
+    """
+    row = Element(_tag_row, nsmap=_writer_nsmap)
+    if style is not None:
+        row.set(_attr_style_name, style)
+    if repeated and repeated > 1:
+        row.set(_attr_rows_repeated, str(repeated))
+    for (cls, value), run in groupby(values, _run_key):
+        repeated = sum(1 for i in run)
+        if value is None:
+            _append_empty_cell(row, repeated, cell_style)
+            continue
+        cell = SubElement(row, _tag_cells[0])
+        if repeated > 1:
+            cell.set(_attr_columns_repeated, str(repeated))
+        text = _set_value_and_type(odf_cell(cell), value=value,
+                value_type=cell_type, currency=currency)
+        if text is not None:
+            SubElement(cell, _tag_paragraph).text = text
+        if cell_style is not None:
+            cell.set(_attr_style_name, cell_style)
+    if not len(row):
+        # A row must hold at least one cell
+        _append_empty_cell(row, 1, cell_style)
+    return row
+
+
+
+def _serialize_row(values, style=None, cell_style=None, cell_type=None,
+        currency=None, repeated=None):
+    """Return the UTF-8 XML of a row holding the given Python values, without
+    namespace declarations.
+    """
+    row = _make_row(values, style=style, cell_style=cell_style,
+            cell_type=cell_type, currency=currency, repeated=repeated)
+    data = tostring(row, encoding='unicode')
+    return ns_stripper.sub('', data).encode('utf-8')
+
+
+
+def _append_empty_cell(row, repeated, style=None):
+    cell = SubElement(row, _tag_cells[0])
+    if repeated > 1:
+        cell.set(_attr_columns_repeated, str(repeated))
+    if style is not None:
+        cell.set(_attr_style_name, style)
+
+
+
+class odf_table_writer(object):
+    """Write a table row by row in a binary file-like object, typically the
+    "content.xml" member of a Zip archive opened for writing. Each row is
+    serialized as soon as it is appended, so the memory used does not grow
+    with the size of the table.
+
+    The file-like object is expected to be positioned inside the
+    "office:spreadsheet" element. See ``odf_spreadsheet_stream_writer`` to
+    produce a complete document.
+    """
+
+    def __init__(self, file, name, width=None, style=None):
+        """Start the table in the file.
+
+        Arguments:
+
+            file -- binary file-like object
+
+            name -- unicode
+
+            width -- int, number of columns, else given by the first row
+
+            style -- unicode
+        """
+        self.file = file
+        self.name = _table_name_check(name)
+        self.width = width
+        self.height = 0
+        self.closed = False
+        data = '<table:table table:name=%s' % quoteattr(self.name)
+        if style is not None:
+            data += ' table:style-name=%s' % quoteattr(style)
+        file.write(data.encode('utf-8') + b'>')
+        self.__columns_written = False
+
+
+    def __write_columns(self, width):
+        if self.width is None:
+            self.width = width or 1
+        data = '<table:table-column'
+        if self.width > 1:
+            data += ' table:number-columns-repeated="%d"' % self.width
+        self.file.write(data.encode('utf-8') + b'/>')
+        self.__columns_written = True
+
+
+    def append_row(self, values, style=None, cell_style=None, cell_type=None,
+            currency=None, repeated=None):
+        """Write a row made of the given Python values. None values are
+        written as empty cells. Cell type is guessed from the values, unless
+        provided.
+
+        Arguments:
+
+            values -- list of Python types
+
+            style -- unicode, the style of the row
+
+            cell_style -- unicode, the style of the cells
+
+            cell_type -- 'boolean', 'float', 'date', 'string', 'time',
+                        'currency' or 'percentage'
+
+            currency -- three-letter str
+
+            repeated -- int
+        """
+        if self.closed:
+            raise ValueError('table "%s" is closed' % self.name)
+        if not self.__columns_written:
+            self.__write_columns(len(values))
+        self.file.write(_serialize_row(values, style=style,
+            cell_style=cell_style, cell_type=cell_type, currency=currency,
+            repeated=repeated))
+        self.height += repeated if repeated and repeated > 1 else 1
+
+
+    def append_rows(self, rows, style=None, cell_style=None, cell_type=None,
+            currency=None):
+        """Write each list of Python values of the given iterable as a row.
+        See ``append_row``.
+
+        Arguments:
+
+            rows -- iterable of lists of Python types
+        """
+        for values in rows:
+            self.append_row(values, style=style, cell_style=cell_style,
+                    cell_type=cell_type, currency=currency)
+
+
+    def close(self):
+        """End the table. The file is left open.
+        """
+        if self.closed:
+            return
+        if not self.__columns_written:
+            self.__write_columns(self.width)
+        if not self.height:
+            # A table must hold at least one row
+            self.file.write(_serialize_row([]))
+        self.file.write(b'</table:table>')
+        self.closed = True
+
+
+
 # Register
 register_element_class('table:table-cell', odf_cell)
 register_element_class('table:covered-table-cell', odf_cell)
@@ -24,8 +24,11 @@
 #    http://www.apache.org/licenses/LICENSE-2.0
 #
 
+# Import from the Standard Library
+from difflib import SequenceMatcher
+
 # Import from lpod
-from .element import FIRST_CHILD
+from .element import FIRST_CHILD, PREV_SIBLING
 from .element import register_element_class, odf_create_element, odf_element
 from .paragraph import odf_create_paragraph
 from .style import odf_create_style
@@ -158,6 +161,7 @@ def odf_create_toc_level_style(level):
 
 
 class odf_toc(odf_element):
+    __slots__ = ()
 
     def get_formatted_text(self, context):
         index_body = self.get_element('text:index-body')
@@ -279,13 +283,8 @@ class odf_toc(odf_element):
 
             use_default_styles -- bool
         """
-        # Find the body
-        if document is not None:
-            body = document.get_body()
-        else:
-            body = self.get_document_body()
-        if body is None:
-            raise ValueError("the TOC must be related to a document somehow")
+        # Check the body
+        self.__get_document_body(document)
 
         # Save the title
         index_body = self.get_body()
@@ -297,48 +296,95 @@ class odf_toc(odf_element):
         # Restore the title
         index_body.insert(title, position=0)
 
+        # Auto-fill the index
+        self.update(document, use_default_styles=use_default_styles)
+
+
+    def update(self, document=None, use_default_styles=True):
+        """Update the TOC to the titles found in the document, only touching
+        the entries that changed since the last fill or update. See fill.
+
+        Arguments:
+
+            document -- odf_document
+
+            use_default_styles -- bool
+        """
+        body = self.__get_document_body(document)
+        index_body = self.get_body()
+        if index_body is None:
+            index_body = self.set_body()
+
+        # Make the entries with "1.2.3. Title" format
+        outline_level = self.get_outline_level() or 10
+        entries = []
+        levels = set()
+        for level, number, heading in body.get_outline(outline_level):
+            number = '.'.join([str(index) for index in number]) + '.'
+            title = "%s %s" % (number, heading.get_text())
+            if use_default_styles:
+                levels.add(level)
+                entries.append((title, TOC_ENTRY_STYLE_PATTERN % level))
+            else:
+                entries.append((title, None))
+
         # Insert default TOC style
         if use_default_styles:
             automatic_styles = body.get_element('//office:automatic-styles')
-            for level in range(1, 11):
-                if automatic_styles.get_style('paragraph',
-                        TOC_ENTRY_STYLE_PATTERN % level) is None:
+            names = set(automatic_styles.xpath('style:style/@style:name'))
+            for level in sorted(levels):
+                if TOC_ENTRY_STYLE_PATTERN % level not in names:
                     level_style = odf_create_toc_level_style(level)
                     automatic_styles.append(level_style)
 
-        # Auto-fill the index
-        outline_level = self.get_outline_level() or 10
-        level_indexes = {}
-        for heading in body.get_headings():
-            level = heading.get_outline_level()
-            if level > outline_level:
+        # Only touch the entries that changed
+        paragraphs = index_body.get_elements('text:p')
+        old_entries = [(paragraph.get_text(), paragraph.get_text_style())
+                       for paragraph in paragraphs]
+        matcher = SequenceMatcher(None, old_entries, entries, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
                 continue
-            number = []
-            # 1. l < level
-            for l in range(1, level):
-                index = level_indexes.setdefault(l, 1)
-                number.append(str(index))
-            # 2. l == level
-            index = level_indexes.setdefault(level, 0) + 1
-            level_indexes[level] = index
-            number.append(str(index))
-            # 3. l > level
-            for l in range(level + 1, 11):
-                if l in level_indexes:
-                    del level_indexes[l]
-            number = '.'.join(number) + '.'
-            # Make the title with "1.2.3. Title" format
-            title = "%s %s" % (number, heading.get_text())
-            paragraph = odf_create_paragraph(title)
-            if use_default_styles:
-                paragraph.set_text_style(TOC_ENTRY_STYLE_PATTERN % level)
-            index_body.append(paragraph)
+            # Update the plain entries in place
+            while i1 < i2 and j1 < j2:
+                paragraph = paragraphs[i1]
+                if paragraph.get_children():
+                    # Made by an office suite (tabs, page numbers...)
+                    break
+                title, style = entries[j1]
+                paragraph.set_text(title)
+                if style != old_entries[i1][1]:
+                    if style is None:
+                        paragraph.del_attribute('text:style-name')
+                    else:
+                        paragraph.set_text_style(style)
+                i1 += 1
+                j1 += 1
+            for paragraph in paragraphs[i1:i2]:
+                index_body.delete(paragraph)
+            for title, style in entries[j1:j2]:
+                paragraph = odf_create_paragraph(title, style=style)
+                if i2 < len(paragraphs):
+                    paragraphs[i2].insert(paragraph, PREV_SIBLING)
+                else:
+                    index_body.append(paragraph)
+
+
+    def __get_document_body(self, document=None):
+        if document is not None:
+            body = document.get_body()
+        else:
+            body = self.get_document_body()
+        if body is None:
+            raise ValueError("the TOC must be related to a document somehow")
+        return body
 
     #toc_fill = obsolete('toc_fill', fill)
 
 
 
 class odf_index_title_template(odf_element):
+    __slots__ = ()
 
     def get_style(self):
         return self.get_attribute('text:style-name')
@@ -350,6 +396,7 @@ class odf_index_title_template(odf_element):
 
 
 class odf_toc_entry_template(odf_element):
+    __slots__ = ()
 
     def get_style(self):
         return self.get_attribute('text:style-name')
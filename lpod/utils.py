@@ -31,6 +31,7 @@ from datetime import date, datetime, timedelta
 from decimal import Decimal as dec
 from os import getcwd
 from os.path import splitdrive, join, sep
+from random import random
 from re import search
 from sys import _getframe, modules
 from warnings import warn
@@ -88,14 +89,16 @@ def _get_abspath(local_path):
 
 
 
-def _make_xpath_query(element_name, family=None, text_style=None,
+def _make_xpath_attributes(family=None, text_style=None,
         draw_id=None, draw_name=None, draw_style=None, draw_text_style=None,
         table_name=None, table_style=None, style_name=None,
         display_name=None, note_class=None, text_id=None, text_name=None,
         change_id=None, office_name=None, office_title=None, outline_level=None,
         level=None, page_layout=None, master_page=None, parent_style=None,
-        presentation_class=None, position=None, **kw):
-    query = [element_name]
+        presentation_class=None, **kw):
+    """Map the keyword arguments of the get_xxx methods to the attributes
+    to match, by qualified name.
+    """
     attributes = kw
     if text_style:
         attributes['text:style-name'] = text_style
@@ -141,22 +144,45 @@ def _make_xpath_query(element_name, family=None, text_style=None,
         attributes['style:parent-style-name'] = parent_style
     if presentation_class:
         attributes['presentation:class'] = presentation_class
+    return attributes
+
+
+
+def _make_xpath_query(element_name, position=None, variables=None, **kw):
+    """Build an XPath query from the element name and the attributes to
+    match.
+
+    If a "variables" dict is given, values and position are not written in
+    the query but stored in the dict, to pass as XPath variables: the query
+    is then the same for any value.
+    """
+    query = [element_name]
+    attributes = _make_xpath_attributes(**kw)
     # Sort attributes for reproducible test cases
     for qname in sorted(attributes):
         value = attributes[qname]
         if value is True:
             query.append('[@%s]' % qname)
+        elif variables is not None:
+            name = qname.replace(':', '_').replace('-', '_')
+            variables[name] = str(value)
+            query.append('[@%s=$%s]' % (qname, name))
         else:
             query.append('[@%s="%s"]' % (qname, str(value)))
     query = ''.join(query)
     if position is not None:
         # A position argument that mimics the behaviour of a python's list
-        if position >= 0:
-            position = str(position + 1)
-        elif position == -1:
+        if position == -1:
             position = 'last()'
         else:
-            position = 'last()-%d' % (abs(position) - 1)
+            if position >= 0:
+                template, position = '%s', position + 1
+            else:
+                template, position = 'last()-%s', abs(position) - 1
+            if variables is not None:
+                variables['position'] = position
+                position = '$position'
+            position = template % position
         query = '(%s)[%s]' % (query, position)
     return query
 
@@ -274,8 +300,9 @@ def _merge_dicts(d, *args, **kw):
 
 def _get_elements(context, element_name, content=None, url=None,
         svg_title=None, svg_desc=None, dc_creator=None, dc_date=None, **kw):
-    query = _make_xpath_query(element_name, **kw)
-    elements = context.get_elements(query)
+    variables = {}
+    query = _make_xpath_query(element_name, variables=variables, **kw)
+    elements = context.get_elements(query, **variables)
     # Filter the elements with the regex (TODO use XPath)
     if content is not None:
         elements = [element for element in elements if element.match(content)]
@@ -306,9 +333,77 @@ def _get_elements(context, element_name, content=None, url=None,
 
 
 
-def _get_element(context, element_name, position, **kw):
-    # TODO Transmit position not to load the whole list
-    result = _get_elements(context, element_name, **kw)
+def _iter_elements(context, element_name, content=None, url=None,
+        svg_title=None, svg_desc=None, dc_creator=None, dc_date=None, **kw):
+    """Same as "_get_elements" but yield the elements one by one, applying
+    the regex filters as they come.
+    """
+    variables = {}
+    query = _make_xpath_query(element_name, variables=variables, **kw)
+    if dc_date is not None:
+        # XXX Date or DateTime?
+        dc_date = DateTime.encode(dc_date)
+    children = [(variable, childname) for variable, childname in [
+            (svg_title, 'svg:title'),
+            (svg_desc, 'svg:desc'),
+            (dc_creator, 'descendant::dc:creator'),
+            (dc_date, 'descendant::dc:date')] if variable]
+    for element in context.iter_elements(query, **variables):
+        if content is not None and not element.match(content):
+            continue
+        if url is not None:
+            url_attr = element.get_attribute('xlink:href')
+            if search(url, url_attr) is None:
+                continue
+        for variable, childname in children:
+            child = element.get_element(childname)
+            if not (child and child.match(variable)):
+                break
+        else:
+            yield element
+
+
+
+def _count_elements(context, element_name, content=None, url=None,
+        svg_title=None, svg_desc=None, dc_creator=None, dc_date=None, **kw):
+    """Count the elements "_get_elements" would return. Without regex
+    filters, XPath does the counting and no element is wrapped.
+    """
+    if (content is None and url is None and not svg_title and not svg_desc
+            and not dc_creator and not dc_date):
+        variables = {}
+        query = _make_xpath_query(element_name, variables=variables, **kw)
+        return context.count_elements(query, **variables)
+    count = 0
+    for element in _iter_elements(context, element_name, content=content,
+            url=url, svg_title=svg_title, svg_desc=svg_desc,
+            dc_creator=dc_creator, dc_date=dc_date, **kw):
+        count += 1
+    return count
+
+
+
+def _get_element(context, element_name, position, content=None, url=None,
+        svg_title=None, svg_desc=None, dc_creator=None, dc_date=None, **kw):
+    if (content is None and url is None and not svg_title and not svg_desc
+            and not dc_creator and not dc_date):
+        if position == 0:
+            # Named elements may be found in the name index of the document
+            element = context._get_indexed_element(element_name, kw)
+            if element is not None:
+                return element
+        # Attribute filters and position in a single query
+        variables = {}
+        query = _make_xpath_query(element_name, position=position,
+                                  variables=variables, **kw)
+        result = context.get_elements(query, **variables)
+        if result:
+            return result[0]
+        return None
+    # Regex filters are applied in Python on the whole list
+    result = _get_elements(context, element_name, content=content, url=url,
+            svg_title=svg_title, svg_desc=svg_desc, dc_creator=dc_creator,
+            dc_date=dc_date, **kw)
     try:
         return result[position]
     except IndexError:
@@ -399,6 +494,254 @@ def _set_value_and_type(element, value=None, value_type=None, text=None,
 
 
 
+#
+# Position index of repeated items (rows, columns, cells)
+#
+# The nodes are tuples forming a persistent treap keyed by the index of the
+# item in the XML:
+# (repeated, total of repetitions, number of items, priority, left, right)
+# Nodes are never modified: an update copies the O(log n) nodes of its path,
+# so copying an index or iterating over it while updating it is cheap.
+
+def _pm_node(repeated, priority, left, right):
+    total = repeated
+    size = 1
+    if left is not None:
+        total += left[1]
+        size += left[2]
+    if right is not None:
+        total += right[1]
+        size += right[2]
+    return (repeated, total, size, priority, left, right)
+
+
+
+def _pm_build(repeats, start, end, priority):
+    """Build a balanced tree of the given slice of repetitions. Priorities are
+    decreasing with the depth and stay above those of inserted nodes.
+    """
+    if start >= end:
+        return None
+    middle = (start + end) // 2
+    left = _pm_build(repeats, start, middle, priority - 1)
+    right = _pm_build(repeats, middle + 1, end, priority - 1)
+    return _pm_node(repeats[middle], priority, left, right)
+
+
+
+def _pm_merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left[3] > right[3]:
+        return _pm_node(left[0], left[3], left[4], _pm_merge(left[5], right))
+    return _pm_node(right[0], right[3], _pm_merge(left, right[4]), right[5])
+
+
+
+def _pm_split(node, count):
+    """Split the tree between its "count" first items and the others.
+    """
+    if node is None:
+        return None, None
+    left = node[4]
+    left_size = left[2] if left is not None else 0
+    if count <= left_size:
+        first, last = _pm_split(left, count)
+        return first, _pm_node(node[0], node[3], last, node[5])
+    first, last = _pm_split(node[5], count - left_size - 1)
+    return _pm_node(node[0], node[3], left, first), last
+
+
+
+class _position_map(object):
+    """Index of the repeated items of a table, row or column sequence.
+
+    It behaves like the sorted list of the last position (column or row)
+    covered by each item, e.g. repetitions of 2, 1 and 3 give [1, 2, 5]. The
+    index of an item in this list is its "odf_idx", i.e. its index among the
+    items in the XML.
+
+    Lookup by position or by index, insertion, deletion and change of
+    repetition are O(log n), copy is O(1).
+    """
+    __slots__ = ('_root',)
+
+
+    def __init__(self, repeats=()):
+        repeats = [(repeated or 1) for repeated in repeats]
+        self._root = _pm_build(repeats, 0, len(repeats),
+                               float(len(repeats).bit_length() + 2))
+
+
+    def __len__(self):
+        root = self._root
+        return root[2] if root is not None else 0
+
+
+    def __getitem__(self, odf_idx):
+        """Return the last position covered by the item at the given index.
+        """
+        size = len(self)
+        if odf_idx < 0:
+            odf_idx += size
+        if not 0 <= odf_idx < size:
+            raise IndexError('position map index out of range')
+        node = self._root
+        total = 0
+        while True:
+            left = node[4]
+            left_size = left[2] if left is not None else 0
+            if odf_idx < left_size:
+                node = left
+                continue
+            if left is not None:
+                total += left[1]
+            total += node[0]
+            if odf_idx == left_size:
+                return total - 1
+            odf_idx -= left_size + 1
+            node = node[5]
+
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+
+    def __repr__(self):
+        return '<_position_map %s>' % list(self)
+
+
+    def copy(self):
+        clone = _position_map()
+        clone._root = self._root
+        return clone
+
+
+    def iter_from(self, odf_idx):
+        """Yield the last position covered by each item, starting at the
+        given index.
+        """
+        # The tree is persistent: updates do not disturb the iteration
+        stack = []
+        node = self._root
+        total = 0
+        while node is not None:
+            left = node[4]
+            left_size = left[2] if left is not None else 0
+            if odf_idx < left_size:
+                stack.append(node)
+                node = left
+                continue
+            if left is not None:
+                total += left[1]
+            if odf_idx == left_size:
+                stack.append(node)
+                break
+            total += node[0]
+            odf_idx -= left_size + 1
+            node = node[5]
+        while stack:
+            node = stack.pop()
+            total += node[0]
+            yield total - 1
+            node = node[5]
+            while node is not None:
+                stack.append(node)
+                node = node[4]
+
+
+    def find(self, position):
+        """Return the index of the item covering the given position, or None
+        if the position is beyond the last item.
+        """
+        position = max(position, 0)
+        node = self._root
+        odf_idx = 0
+        while node is not None:
+            left = node[4]
+            if left is not None:
+                if position < left[1]:
+                    node = left
+                    continue
+                position -= left[1]
+                odf_idx += left[2]
+            if position < node[0]:
+                return odf_idx
+            position -= node[0]
+            odf_idx += 1
+            node = node[5]
+        return None
+
+
+    def get_repeated(self, odf_idx):
+        """Return the number of positions covered by the item at the given
+        index.
+        """
+        if not 0 <= odf_idx < len(self):
+            raise IndexError('position map index out of range')
+        node = self._root
+        while True:
+            left = node[4]
+            left_size = left[2] if left is not None else 0
+            if odf_idx < left_size:
+                node = left
+            elif odf_idx == left_size:
+                return node[0]
+            else:
+                odf_idx -= left_size + 1
+                node = node[5]
+
+
+    def insert(self, odf_idx, repeated):
+        """Insert an item covering "repeated" positions before the given
+        index.
+        """
+        if not 0 <= odf_idx <= len(self):
+            raise IndexError('position map index out of range')
+        first, last = _pm_split(self._root, odf_idx)
+        node = _pm_node(repeated or 1, random(), None, None)
+        self._root = _pm_merge(_pm_merge(first, node), last)
+
+
+    def append(self, repeated):
+        self.insert(len(self), repeated)
+
+
+    def erase(self, odf_idx):
+        """Remove the item at the given index.
+        """
+        if not 0 <= odf_idx < len(self):
+            raise IndexError('position map index out of range')
+        first, last = _pm_split(self._root, odf_idx)
+        _, last = _pm_split(last, 1)
+        self._root = _pm_merge(first, last)
+
+
+    def set_repeated(self, odf_idx, repeated):
+        """Change the number of positions covered by the item at the given
+        index.
+        """
+        if not 0 <= odf_idx < len(self):
+            raise IndexError('position map index out of range')
+        first, last = _pm_split(self._root, odf_idx)
+        node, last = _pm_split(last, 1)
+        node = _pm_node(repeated or 1, node[3], None, None)
+        self._root = _pm_merge(_pm_merge(first, node), last)
+
+
+    def clear(self):
+        self._root = None
+
+
+    def update(self, other):
+        """Replace the content by the content of the other index.
+        """
+        self._root = other._root
+
+
+
 ######################################################################
 # Public API
 ######################################################################
@@ -28,6 +28,7 @@
 # Import from the Standard Library
 from copy import deepcopy
 from io import StringIO, BytesIO
+from weakref import finalize
 
 # Import from lxml
 from lxml.etree import parse, tostring
@@ -48,6 +49,7 @@ class odf_xmlpart(object):
         # Internal state
         self.__tree = None
         self.__root = None
+        self.__name_index = None
 
 
     def __get_tree(self):
@@ -69,15 +71,19 @@ class odf_xmlpart(object):
         return self.__root
 
 
-    def get_elements(self, xpath_query):
+    def get_elements(self, xpath_query, **variables):
         root = self.get_root()
-        return root.xpath(xpath_query)
+        return root.xpath(xpath_query, **variables)
 
     #get_element_list = obsolete('get_element_list', get_elements)
 
 
-    def get_element(self, xpath_query):
-        result = self.get_elements(xpath_query)
+    def _get_indexed_element(self, element_name, kw):
+        return self.get_root()._get_indexed_element(element_name, kw)
+
+
+    def get_element(self, xpath_query, **variables):
+        result = self.get_elements(xpath_query, **variables)
         if not result:
             return None
         return result[0]
@@ -87,12 +93,15 @@ class odf_xmlpart(object):
         child.delete()
 
 
-    def xpath(self, xpath_query):
+    def xpath(self, xpath_query, **variables):
         """Apply XPath query to the XML part. Return list of odf_element or
         odf_text instances translated from the nodes found.
+
+        Values given as keyword arguments are bound to the "$name" variables
+        of the query.
         """
         root = self.get_root()
-        return root.xpath(xpath_query)
+        return root.xpath(xpath_query, **variables)
 
 
     def clone(self):
@@ -100,7 +109,7 @@ class odf_xmlpart(object):
         for name in self.__dict__:
             if name == 'container':
                 setattr(clone, name, self.container.clone())
-            elif name in ('_odf_xmlpart__tree',):
+            elif name in ('_odf_xmlpart__tree', '_odf_xmlpart__name_index'):
                 setattr(clone, name, None)
             else:
                 value = getattr(self, name)
@@ -109,6 +118,30 @@ class odf_xmlpart(object):
         return clone
 
 
+    def enable_name_index(self):
+        """Index the named elements of the part: tables, named ranges,
+        sections, bookmarks, reference marks, notes, frames, draw pages and
+        styles. Looking one up by name, e.g. "get_table(name=...)" or
+        "get_style(family, name)", then costs no scan of the tree.
+
+        The index follows "insert", "append", "delete", "set_attribute",
+        etc. Elements renamed or moved by other means are found by a scan,
+        and the index is rebuilt at the next lookup.
+        """
+        if self.__name_index is None:
+            root = self.get_root()
+            root._set_name_index(True)
+            self.__name_index = finalize(self, root._set_name_index, False)
+
+
+    def disable_name_index(self):
+        """Drop the index of the named elements of the part.
+        """
+        if self.__name_index is not None:
+            self.__name_index()
+            self.__name_index = None
+
+
     def serialize(self, pretty=False):
         tree = self.__get_tree()
         # Lxml declaration is too exotic to me
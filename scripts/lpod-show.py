@@ -169,9 +169,13 @@ if  __name__ == '__main__':
             'presentation-template'):
         if options.output:
             to_file = open(join(target, 'content.rst'), 'wb')
-            dump(document.get_formatted_text(rst_mode=options.rst), to_file)
         elif not options.no_content:
-            dump(document.get_formatted_text(rst_mode=options.rst), stdout)
+            to_file = stdout
+        else:
+            to_file = None
+        if to_file is not None:
+            for chunk in document.iter_formatted_text(rst_mode=options.rst):
+                dump(chunk, to_file)
     # spreadsheet
     elif doc_type in ('spreadsheet', 'spreadsheet-template'):
         if options.output:
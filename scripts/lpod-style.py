@@ -60,6 +60,29 @@ def delete_styles(document, target, pretty=True):
 
 
 
+def show_unused_styles(document, target, common=False):
+    """Show the styles of a document no element nor style uses.
+    """
+    output = []
+    for style in document.get_unused_styles(common=common):
+        output.append("family:%s name:%s" % (style.get_family() or "",
+            style.get_name()))
+    output.append("")
+    # Print the output
+    if target is None:
+        target = stdout
+    target.write("\n".join(output))
+    target.flush()
+
+
+
+def purge_styles(document, target, common=False, pretty=True):
+    n = document.purge_unused_styles(common=common)
+    document.save(target=target, pretty=pretty)
+    printinfo(str(n), "unused styles removed (0 error, 0 warning).")
+
+
+
 def find_presentation_list_style(body):
     for frame in body.get_frames(presentation_class='outline'):
         first_list = frame.get_list()
@@ -148,6 +171,13 @@ if  __name__ == '__main__':
     help = ("return a copy with all styles (except default) deleted from "
             "<file>")
     parser.add_option('-d', '--delete', action='store_true', help=help)
+    # --unused
+    parser.add_option('-u', '--unused', action='store_true',
+            help="show unused automatic styles (and common ones with -c)")
+    # --purge
+    help = ("return a copy with unused automatic styles (and common ones "
+            "with -c) deleted from <file>")
+    parser.add_option('--purge', action='store_true', help=help)
     # --merge
     help = ('copy styles from FILE to <file>. Any style with the same name '
             'will be replaced.')
@@ -172,6 +202,24 @@ if  __name__ == '__main__':
         else:
             check_target_file(target)
         delete_styles(document, target)
+    elif options.purge:
+        target = options.output
+        if target is None:
+            printerr("Will not purge in-place: ",
+                    'output file needed or "-" for stdout')
+            exit(1)
+        elif target == "-":
+            target = StdoutWriter()
+        else:
+            check_target_file(target)
+        purge_styles(document, target, common=options.common)
+    elif options.unused:
+        target = options.output
+        if target is None:
+            show_unused_styles(document, target, common=options.common)
+        else:
+            with open(target, 'w') as target:
+                show_unused_styles(document, target, common=options.common)
     elif options.merge:
         merge_styles(document, options.merge, target=options.output)
     else:
@@ -29,16 +29,19 @@
 
 # Import from the Standard Library
 import os
-from io import StringIO
+from concurrent.futures import Future
+from io import StringIO, BytesIO
 from ftplib import FTP
 from os import mkdir
-from shutil import rmtree
+from shutil import rmtree, copyfile
+from zipfile import ZipFile
 from unittest import TestCase, main
 from urllib.request import urlopen
 
 # Import from lpod
-from lpod.const import ODF_EXTENSIONS, ODF_CONTENT, ODF_META
+from lpod.const import ODF_EXTENSIONS, ODF_CONTENT, ODF_META, ODF_STYLES
 from lpod.container import odf_get_container, odf_new_container
+import lpod.container as container_module
 
 
 class NewContainerFromTemplateTestCase(TestCase):
@@ -173,6 +176,44 @@ class ContainerTestCase(TestCase):
 
 
 
+class LazyContainerTestCase(TestCase):
+
+    def test_get_part(self):
+        container = odf_get_container('samples/example.odt', lazy=True)
+        self.assertEqual(container.get_part('mimetype'),
+                         ODF_EXTENSIONS['odt'].encode())
+        content = container.get_part(ODF_CONTENT)
+        self.assertTrue(b'<office:document-content' in content)
+
+
+    def test_file_like(self):
+        with open('samples/example.odt', 'rb') as file:
+            data = file.read()
+        file = BytesIO(data)
+        container = odf_get_container(file, lazy=True)
+        content = container.get_part(ODF_CONTENT)
+        self.assertTrue(b'<office:document-content' in content)
+        # The parts are read from the file on demand
+        file.close()
+        self.assertRaises(ValueError, container.get_part, ODF_STYLES)
+
+
+    def test_close(self):
+        with odf_get_container('samples/example.odt', lazy=True) as container:
+            container.get_part(ODF_CONTENT)
+        self.assertRaises(ValueError, container.get_part, ODF_STYLES)
+
+
+    def test_clone_shares_data(self):
+        container = odf_get_container('samples/example.odt', lazy=True)
+        clone = container.clone()
+        self.assertTrue(clone._odf_container__data
+                        is container._odf_container__data)
+        self.assertEqual(clone.get_part(ODF_CONTENT),
+                         container.get_part(ODF_CONTENT))
+
+
+
 class ContainerSaveTestCase(TestCase):
 
     def setUp(self):
@@ -241,6 +282,141 @@ class ContainerSaveTestCase(TestCase):
 
 
 
+    def test_save_lazy(self):
+        container = odf_get_container('samples/frame_image.odp', lazy=True)
+        container.set_part(ODF_META, container.get_part(ODF_META))
+        container.save('trash/frame_image.odp')
+        source = ZipFile('samples/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        self.assertEqual(result.namelist()[0], 'mimetype')
+        self.assertEqual(sorted(result.namelist()),
+                         sorted(source.namelist()))
+        for name in source.namelist():
+            self.assertEqual(result.read(name), source.read(name))
+
+
+    def test_save_lazy_same_path(self):
+        copyfile('samples/frame_image.odp', 'trash/frame_image.odp')
+        container = odf_get_container('trash/frame_image.odp', lazy=True)
+        container.save()
+        source = ZipFile('samples/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        for name in source.namelist():
+            self.assertEqual(result.read(name), source.read(name))
+        # The container still reads the former file
+        self.assertEqual(container.get_part('mimetype'),
+                         source.read('mimetype'))
+
+
+    def test_save_lazy_keeps_mode(self):
+        copyfile('samples/frame_image.odp', 'trash/frame_image.odp')
+        os.chmod('trash/frame_image.odp', 0o644)
+        with odf_get_container('trash/frame_image.odp', lazy=True) as container:
+            container.save()
+        self.assertEqual(os.stat('trash/frame_image.odp').st_mode & 0o777,
+                         0o644)
+
+
+    def test_save_lazy_error(self):
+        copyfile('samples/frame_image.odp', 'trash/frame_image.odp')
+        container = odf_get_container('trash/frame_image.odp', lazy=True)
+        container.set_part_file('Pictures/missing.png', 'trash/missing.png')
+        self.assertRaises(IOError, container.save)
+        container.close()
+        # No temporary file left, the target is untouched
+        self.assertEqual(os.listdir('trash'), ['frame_image.odp'])
+        with open('samples/frame_image.odp', 'rb') as file:
+            data = file.read()
+        with open('trash/frame_image.odp', 'rb') as file:
+            self.assertEqual(file.read(), data)
+
+
+    def test_save_zip_raw_copy(self):
+        container = odf_get_container('samples/frame_image.odp')
+        meta = container.get_part(ODF_META)
+        container.set_part(ODF_META, meta.replace(b'<office:meta>',
+                                                   b'<office:meta> '))
+        container.save('trash/frame_image.odp')
+        source = ZipFile('samples/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.namelist()[0], 'mimetype')
+        self.assertEqual(result.namelist()[-1], 'META-INF/manifest.xml')
+        for info in source.infolist():
+            if info.filename == ODF_META:
+                continue
+            new_info = result.getinfo(info.filename)
+            self.assertEqual(new_info.CRC, info.CRC)
+            self.assertEqual(new_info.compress_size, info.compress_size)
+            self.assertEqual(result.read(info.filename), source.read(info))
+        self.assertTrue(b'<office:meta> ' in result.read(ODF_META))
+
+
+    def test_save_zip_deleted(self):
+        container = odf_get_container('samples/frame_image.odp')
+        path = 'Thumbnails/thumbnail.png'
+        container.del_part(path)
+        container.save('trash/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        self.assertFalse(path in result.namelist())
+
+
+    def test_save_zip_workers(self):
+        container = odf_get_container('samples/frame_image.odp')
+        for path in container.get_parts():
+            container.get_part(path)
+        container.save('trash/frame_image.odp', workers=4)
+        source = ZipFile('samples/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.namelist()[0], 'mimetype')
+        self.assertEqual(result.getinfo('mimetype').compress_type, 0)
+        self.assertEqual(result.namelist()[1], ODF_CONTENT)
+        self.assertEqual(result.namelist()[-1], 'META-INF/manifest.xml')
+        self.assertEqual(sorted(result.namelist()),
+                         sorted(source.namelist()))
+        for name in source.namelist():
+            self.assertEqual(result.read(name), source.read(name))
+
+
+    def test_save_zip_no_raw(self):
+        # Without the ZipFile internals, parts are compressed again
+        versions = container_module._zip_raw_versions
+        container_module._zip_raw_versions = ((0, 0), (0, 0))
+        try:
+            container = odf_get_container('samples/frame_image.odp')
+            container.get_part(ODF_CONTENT)
+            container.save('trash/frame_image.odp', workers=4)
+        finally:
+            container_module._zip_raw_versions = versions
+        source = ZipFile('samples/frame_image.odp')
+        result = ZipFile('trash/frame_image.odp')
+        self.assertEqual(result.testzip(), None)
+        self.assertEqual(result.namelist()[0], 'mimetype')
+        self.assertEqual(sorted(result.namelist()),
+                         sorted(source.namelist()))
+        for name in source.namelist():
+            self.assertEqual(result.read(name), source.read(name))
+
+
+    def test_deflate_window(self):
+        submitted = []
+
+        class executor(object):
+            def submit(self, function, data):
+                submitted.append(data)
+                future = Future()
+                future.set_result(function(data))
+                return future
+
+        parts = (b'part %d' % i for i in range(10))
+        deflated = container_module._iter_deflated_parts(executor(), parts, 3)
+        next(deflated)
+        # No more parts compressed ahead than the window
+        self.assertEqual(len(submitted), 3)
+        self.assertEqual(len(list(deflated)), 9)
+
+
     # XXX We must implement the flat xml part
     def xtest_save_flat(self):
         """TODO: 2 cases
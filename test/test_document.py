@@ -29,9 +29,15 @@
 #
 
 # Import from the Standard Library
-from io import StringIO
+import os
+from decimal import Decimal as dec
+from io import StringIO, BytesIO
+from operator import setitem
+from tempfile import mkstemp
+from zipfile import ZipFile
 from ftplib import FTP
 from unittest import TestCase, main
+from unittest.mock import patch
 from urllib.request import urlopen
 
 # Import from lpod
@@ -39,9 +45,12 @@ from lpod.const import ODF_EXTENSIONS, ODF_CONTENT, ODF_MANIFEST, ODF_META
 from lpod.const import ODF_STYLES
 from lpod.content import odf_content
 from lpod.document import odf_new_document, odf_get_document
+from lpod.document import odf_spreadsheet_stream_writer
 from lpod.manifest import odf_manifest
 from lpod.meta import odf_meta
+from lpod.style import odf_create_style
 from lpod.styles import odf_styles
+from lpod.table import odf_create_table
 
 
 class NewDocumentFromTemplateTestCase(TestCase):
@@ -192,6 +201,76 @@ class DocumentTestCase(TestCase):
 
 
 
+    def test_add_file_twice(self):
+        document = self.document.clone()
+        path = document.add_file('samples/image.png')
+        self.assertEqual(path, 'Pictures/image.png')
+        with open('samples/image.png', 'rb') as file:
+            data = file.read()
+        self.assertEqual(document.add_file(BytesIO(data)), path)
+        self.assertEqual(document.add_file('samples/image.png'), path)
+        other = document.add_file('samples/image2.jpg')
+        self.assertEqual(other, 'Pictures/image2.jpg')
+        manifest = document.get_part(ODF_MANIFEST)
+        self.assertEqual(manifest.get_media_type(path), 'image/png')
+
+
+    def test_add_file_stream(self):
+        document = self.document.clone()
+        path = document.add_file('samples/image.png', stream=True)
+        self.assertEqual(document.add_file('samples/image.png'), path)
+        with open('samples/image.png', 'rb') as file:
+            data = file.read()
+        self.assertEqual(document.get_part(path), data)
+        temp = BytesIO()
+        document.save(temp)
+        filezip = ZipFile(temp)
+        self.assertEqual(filezip.read(path), data)
+
+
+    def test_add_file_saved(self):
+        document = self.document.clone()
+        path = document.add_file('samples/image.png')
+        temp = BytesIO()
+        document.save(temp)
+        temp.seek(0)
+        new = odf_get_document(temp)
+        self.assertEqual(new.add_file('samples/image.png'), path)
+        other = new.add_file('samples/image2.jpg')
+        self.assertEqual(other, 'Pictures/image2.jpg')
+
+
+    def test_add_file_read_same_size(self):
+        document = self.document.clone()
+        path = document.add_file('samples/image.png')
+        temp = BytesIO()
+        document.save(temp)
+        temp.seek(0)
+        new = odf_get_document(temp)
+        with patch.object(new.container, 'open_part',
+                wraps=new.container.open_part) as open_part:
+            new.add_file('samples/image2.jpg')
+            # No other file of this size
+            self.assertFalse(open_part.called)
+            self.assertEqual(new.add_file('samples/image.png'), path)
+            self.assertEqual(open_part.call_count, 1)
+
+
+    def test_add_file_stream_file(self):
+        document = self.document.clone()
+        with open('samples/image.png', 'rb') as file:
+            self.assertRaises(TypeError, document.add_file, file,
+                              stream=True)
+
+
+    def test_add_file_stream_flat(self):
+        document = self.document.clone()
+        document.add_file('samples/image.png', stream=True)
+        self.assertRaises(ValueError, document.save, BytesIO(),
+                          packaging='flat')
+
+
+
 class TestStyle(TestCase):
 
     def setUp(self):
@@ -263,5 +342,393 @@ class TestStyle(TestCase):
 
 
 
+class StyleUsageTestCase(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/example.odt')
+
+
+    def test_style_usage(self):
+        document = self.document
+        usage = document.get_style_usage()
+        self.assertEqual(usage[('paragraph', 'P1')],
+                document.get_styled_elements('P1'))
+        # The parent of a style is used by the style
+        self.assertTrue(('paragraph', 'Heading') in usage)
+        self.assertFalse(('paragraph', 'Caption') in usage)
+
+
+    def test_style_usage_family(self):
+        document = self.document
+        usage = document.get_style_usage()
+        self.assertTrue(('text', 'T1') in usage)
+        # Same name as the used text style
+        style = odf_create_style('paragraph', 'T1')
+        document.insert_style(style, automatic=True)
+        unused = document.get_unused_styles()
+        self.assertEqual([(s.get_family(), s.get_name()) for s in unused],
+                [('paragraph', 'T1')])
+
+
+    def test_purge_unused_styles(self):
+        document = self.document
+        self.assertEqual(document.get_unused_styles(), [])
+        list_style = odf_create_style('list', 'L99')
+        document.insert_style(list_style, automatic=True)
+        style = odf_create_style('paragraph', 'P99')
+        style.set_attribute('style:list-style-name', 'L99')
+        document.insert_style(style, automatic=True)
+        unused = document.get_unused_styles()
+        self.assertEqual([s.get_name() for s in unused], ['P99'])
+        # The list style is only used by the purged style
+        self.assertEqual(document.purge_unused_styles(), 2)
+        self.assertEqual(document.get_style('list', 'L99'), None)
+        self.assertNotEqual(document.get_style('paragraph', 'P1'), None)
+        # Common styles only on demand
+        common = [s.get_name() for s in document.get_unused_styles(
+            automatic=False, common=True)]
+        self.assertTrue('Caption' in common)
+        self.assertFalse('Standard' in common)
+
+
+
+class StylePropertiesTestCase(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/example.odt')
+
+
+    def test_inherited(self):
+        document = self.document
+        properties = document.get_style_properties('paragraph',
+                'Heading_20_1', area='text')
+        # Own property
+        self.assertEqual(properties['fo:font-weight'], 'bold')
+        # From the "Heading" parent style
+        self.assertEqual(properties['style:font-name'], 'Liberation Sans')
+        # From the default style
+        properties = document.get_style_properties('paragraph',
+                'Heading_20_1')
+        self.assertEqual(properties['style:writing-mode'], 'page')
+
+
+    def test_cached_read_only(self):
+        document = self.document
+        properties = document.get_style_properties('paragraph', 'Heading')
+        self.assertTrue(document.get_style_properties('paragraph',
+            'Heading') is properties)
+        self.assertRaises(TypeError, setitem, properties, 'fo:color',
+                '#ff0000')
+        self.assertEqual(document.get_style_properties('paragraph', 'Bad'),
+                None)
+
+
+    def test_invalidated(self):
+        document = self.document
+        properties = document.get_style_properties('paragraph', 'P99')
+        self.assertEqual(properties, None)
+        style = odf_create_style('paragraph', 'P99', parent='Heading')
+        style.set_properties({'fo:color': '#ff0000'}, area='text')
+        document.insert_style(style, automatic=True)
+        properties = document.get_style_properties('paragraph', 'P99',
+                area='text')
+        self.assertEqual(properties['fo:color'], '#ff0000')
+        self.assertEqual(properties['style:font-name'], 'Liberation Sans')
+        document.delete_styles()
+        self.assertEqual(document.get_style_properties('paragraph', 'P99'),
+                None)
+
+
+    def test_missing_cached(self):
+        document = self.document
+        self.assertEqual(document.get_style_properties('paragraph', 'Bad'),
+                None)
+        with patch.object(document, 'get_style') as get_style:
+            self.assertEqual(document.get_style_properties('paragraph',
+                'Bad'), None)
+            self.assertFalse(get_style.called)
+
+
+    def test_failure_not_cached(self):
+        document = self.document
+        style = document.get_style('paragraph', 'Heading_20_1')
+        with patch.object(style.__class__, 'get_parent_style',
+                side_effect=RuntimeError):
+            self.assertRaises(RuntimeError, document.get_style_properties,
+                    'paragraph', 'Heading_20_1')
+        properties = document.get_style_properties('paragraph',
+                'Heading_20_1')
+        self.assertEqual(properties['style:writing-mode'], 'page')
+
+
+
+class StyleInterningTestCase(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/example.odt')
+
+
+    def test_insert_identical(self):
+        document = self.document
+        count = len(document.get_styles('text'))
+        names = []
+        for color in ('#ff0000', '#00ff00', '#ff0000'):
+            style = odf_create_style('text')
+            style.set_properties({'fo:color': color})
+            names.append(document.insert_style(style, automatic=True))
+        self.assertEqual(names, ['lpod_auto_1', 'lpod_auto_2',
+                                 'lpod_auto_1'])
+        self.assertEqual(len(document.get_styles('text')), count + 2)
+
+
+    def test_insert_modified(self):
+        document = self.document
+        style = odf_create_style('text')
+        name = document.insert_style(style, automatic=True)
+        style.set_properties({'fo:color': '#ff0000'})
+        other = odf_create_style('text')
+        self.assertNotEqual(document.insert_style(other, automatic=True),
+                name)
+
+
+    def test_insert_after_append(self):
+        document = self.document
+        style = odf_create_style('text')
+        self.assertEqual(document.insert_style(style, automatic=True),
+                'lpod_auto_1')
+        # Taken behind the back of insert_style
+        container = document.get_part(ODF_CONTENT).get_element(
+                'office:automatic-styles')
+        container.append(odf_create_style('text', 'lpod_auto_2'))
+        style = odf_create_style('text')
+        style.set_properties({'fo:color': '#ff0000'})
+        self.assertEqual(document.insert_style(style, automatic=True),
+                'lpod_auto_3')
+
+
+    def test_compact_styles(self):
+        document = self.document
+        for name in ('L98', 'L99'):
+            document.insert_style(odf_create_style('list', name),
+                    automatic=True)
+        paragraphs = document.get_body().get_paragraphs()
+        for name, list_name, paragraph in (('P98', 'L98', paragraphs[0]),
+                                            ('P99', 'L99', paragraphs[1])):
+            style = odf_create_style('paragraph', name)
+            style.set_attribute('style:list-style-name', list_name)
+            document.insert_style(style, automatic=True)
+            paragraph.set_style(name)
+        # The list styles, then the paragraph styles
+        self.assertEqual(document.compact_styles(), 2)
+        self.assertEqual(document.get_style('list', 'L99'), None)
+        self.assertEqual(document.get_style('paragraph', 'P99'), None)
+        self.assertEqual(paragraphs[1].get_style(), 'P98')
+
+
+
+class IterTableRowsTestCase(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/simple_table.ods')
+
+
+    def test_iter_by_name(self):
+        rows = list(self.document.iter_table_rows('Example1'))
+        self.assertEqual(rows, [[1, 1, 1, 2, 3, 3, 3],
+                                [1, 1, 1, 2, 3, 3, 3],
+                                [1, 1, 1, 2, 3, 3, 3],
+                                [1, 2, 3, 4, 5, 6, 7]])
+
+
+    def test_iter_by_position(self):
+        rows = list(self.document.iter_table_rows(position=2))
+        self.assertEqual(rows[0], ['A float', dec('3.14')])
+
+
+    def test_iter_get_type(self):
+        rows = list(self.document.iter_table_rows(position=2, get_type=True))
+        self.assertEqual(rows[0], [('A float', 'string'),
+                                   (dec('3.14'), 'float')])
+
+
+    def test_iter_strip(self):
+        document = odf_get_document('samples/styled_table.ods')
+        rows = list(document.iter_table_rows())
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[2], ['foo1', None, None, 3])
+
+
+    def test_iter_complete(self):
+        document = self.document
+        table = document.get_body().get_table(name='Example2')
+        expected = list(table.iter_values())
+        # Read the loaded content instead of the archive
+        self.assertEqual(list(document.iter_table_rows('Example2',
+                                                       complete=True)),
+                         expected)
+
+
+    def test_iter_not_loaded(self):
+        document = self.document
+        # Loading the content part would fail
+        with patch('lpod.document.odf_content', side_effect=AssertionError):
+            rows = list(document.iter_table_rows('Example1'))
+        self.assertEqual(len(rows), 4)
+
+
+    def test_iter_not_found(self):
+        document = self.document
+        self.assertRaises(ValueError, list,
+                          document.iter_table_rows('Missing'))
+        self.assertRaises(ValueError, list,
+                          document.iter_table_rows(position=10))
+
+
+
+class FormattedTextTestCase(TestCase):
+
+    def setUp(self):
+        self.document = odf_get_document('samples/example.odt')
+
+
+    def test_streamed(self):
+        document = self.document
+        chunks = list(document.iter_formatted_text())
+        self.assertTrue(len(chunks) > 1)
+        # The content part was read out of the archive
+        self.assertEqual(document._odf_document__xmlparts, {})
+        # Same text as from the loaded body
+        document.get_body()
+        self.assertEqual(''.join(chunks), document.get_formatted_text())
+
+
+    def test_write(self):
+        document = self.document
+        file = StringIO()
+        document.write_formatted_text(file, rst_mode=True)
+        self.assertEqual(file.getvalue(),
+                         document.get_formatted_text(rst_mode=True))
+
+
+
+class NameIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.document = document = odf_new_document('spreadsheet')
+        self.body = body = document.get_body()
+        for name in ('A', 'B', 'C'):
+            body.append(odf_create_table(name, width=1, height=1))
+        document.enable_name_index()
+
+
+    def test_get_table(self):
+        table = self.body.get_table(name='B')
+        self.assertEqual(table.get_name(), 'B')
+        self.assertEqual(self.body.get_table(name='D'), None)
+
+
+    def test_append(self):
+        self.body.append(odf_create_table('D', width=1, height=1))
+        self.assertEqual(self.body.get_table(name='D').get_name(), 'D')
+
+
+    def test_rename(self):
+        self.body.get_table(name='B').set_name('E')
+        self.assertEqual(self.body.get_table(name='B'), None)
+        self.assertEqual(self.body.get_table(name='E').get_name(), 'E')
+
+
+    def test_delete(self):
+        self.body.delete(self.body.get_table(name='C'))
+        self.assertEqual(self.body.get_table(name='C'), None)
+
+
+    def test_get_style(self):
+        style = self.document.get_style('table', 'ta1')
+        self.assertEqual(style.get_name(), 'ta1')
+        style = self.document.get_style('page-layout', 'Mpm1')
+        self.assertEqual(style.get_name(), 'Mpm1')
+        self.assertEqual(self.document.get_style('table', 'Nope'), None)
+
+
+    def test_disable(self):
+        self.document.disable_name_index()
+        self.assertEqual(self.body.get_table(name='A').get_name(), 'A')
+
+
+
+class SpreadsheetStreamWriterTestCase(TestCase):
+
+    def setUp(self):
+        self.file = BytesIO()
+
+
+    def test_write_rows(self):
+        with odf_spreadsheet_stream_writer(self.file) as writer:
+            table = writer.add_table('Report')
+            table.append_row(['Name', 'Total', None, True])
+            table.append_rows([['a', 1], ['b', dec('2.5')]])
+        self.file.seek(0)
+        document = odf_get_document(self.file)
+        table = document.get_body().get_table(name='Report')
+        self.assertEqual(table.get_values(),
+                [['Name', 'Total', None, True],
+                 ['a', 1, None, None],
+                 ['b', dec('2.5'), None, None]])
+
+
+    def test_several_tables(self):
+        with odf_spreadsheet_stream_writer(self.file) as writer:
+            writer.add_table('First').append_row([1])
+            writer.add_table('Empty', width=3)
+        self.file.seek(0)
+        document = odf_get_document(self.file)
+        tables = document.get_body().get_tables()
+        self.assertEqual([t.get_name() for t in tables], ['First', 'Empty'])
+        self.assertEqual(tables[1].get_size(), (3, 1))
+
+
+    def test_package(self):
+        with odf_spreadsheet_stream_writer(self.file) as writer:
+            writer.add_table('Report').append_row(['x'])
+        filezip = ZipFile(self.file)
+        names = filezip.namelist()
+        self.assertEqual(names[0], 'mimetype')
+        self.assertEqual(names[1], ODF_CONTENT)
+        self.assertEqual(names[-1], ODF_MANIFEST)
+        self.assertEqual(filezip.read('mimetype'),
+                b'application/vnd.oasis.opendocument.spreadsheet')
+
+
+    def test_closed_table(self):
+        writer = odf_spreadsheet_stream_writer(self.file)
+        first = writer.add_table('First')
+        writer.add_table('Second')
+        self.assertRaises(ValueError, first.append_row, [1])
+        writer.close()
+
+
+    def test_error_drops_output(self):
+        def write():
+            with odf_spreadsheet_stream_writer(self.file) as writer:
+                writer.add_table('Report').append_row(['x'])
+                raise RuntimeError
+        self.file.write(b'head')
+        self.assertRaises(RuntimeError, write)
+        self.assertEqual(self.file.getvalue(), b'head')
+
+
+    def test_error_removes_path(self):
+        def write():
+            with odf_spreadsheet_stream_writer(path) as writer:
+                writer.add_table('Report').append_row(['x'])
+                raise RuntimeError
+        fd, path = mkstemp(suffix='.ods')
+        os.close(fd)
+        self.assertRaises(RuntimeError, write)
+        self.assertFalse(os.path.exists(path))
+
+
+
 if __name__ == '__main__':
     main()
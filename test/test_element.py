@@ -34,6 +34,7 @@ from lpod.const import ODF_CONTENT
 from lpod.container import odf_get_container
 from lpod.element import register_element_class, odf_create_element
 from lpod.element import odf_element, FIRST_CHILD, NEXT_SIBLING, PREV_SIBLING
+from lpod.element import xpath_cache_info
 from lpod.xmlpart import odf_xmlpart
 
 
@@ -56,6 +57,23 @@ class CreateElementTestCase(TestCase):
         self.assertEqual(element.serialize(), '<text:p/>')
 
 
+    def test_copies(self):
+        first = odf_create_element('<text:p>Template Element</text:p>')
+        first.set_text('Changed')
+        second = odf_create_element('<text:p>Template Element</text:p>')
+        self.assertEqual(second.get_text(), 'Template Element')
+        self.assertEqual(second.get_tag(), 'text:p')
+        self.assertTrue(first.get_parent() is not None)
+
+
+    def test_copies_qname(self):
+        first = odf_create_element('text:span')
+        first.set_attribute('text:style-name', 'Bold')
+        second = odf_create_element(' text:span ')
+        self.assertEqual(second.get_tag(), 'text:span')
+        self.assertEqual(second.get_attributes(), {})
+
+
 
 class ElementTestCase(TestCase):
 
@@ -566,6 +584,100 @@ class ReplaceTestCase(TestCase):
         self.assertEqual(count, 0)
 
 
+
+class ReplaceManyTestCase(TestCase):
+
+    def setUp(self):
+        self.container = odf_get_container('samples/span_style.odt')
+        self.content = odf_xmlpart(ODF_CONTENT, self.container)
+        self.paragraph = self.content.get_element('//text:p').clone()
+
+
+    def test_literals(self):
+        paragraph = self.paragraph
+        count = paragraph.replace_many({'Père': 'Papa', 'Noël': 'Noel',
+                                        'Père Noël': 'Santa'})
+        # The longest literal wins
+        self.assertEqual(count, 1)
+        self.assertEqual(paragraph.get_text(recursive=True),
+                "Le Santa a une moustache rouge.")
+
+
+    def test_regex(self):
+        paragraph = self.paragraph
+        upper = lambda match: match.group(0).upper()
+        count = paragraph.replace_many([(r'(\w+)ache', r'\1oir'),
+                                        (r'r(ouge)', upper)], regex=True)
+        self.assertEqual(count, 2)
+        self.assertEqual(paragraph.get_text(recursive=True),
+                "Le Père Noël a une moustoir ROUGE.")
+
+
+    def test_regex_context(self):
+        paragraph = odf_create_element('<text:p>foo1bar foo2 x12y</text:p>')
+        count = paragraph.replace_many([(r'foo(\d)(?=bar)', r'<\1>'),
+                                        (r'\bx(\d)(?P<n>\d)y', r'\g<n>\\\1')],
+                                       regex=True)
+        self.assertEqual(count, 2)
+        self.assertEqual(paragraph.get_text(), r"<1>bar foo2 2\1")
+
+
+    def test_across_spans(self):
+        paragraph = self.paragraph
+        self.assertEqual(paragraph.replace_many({'moustache rouge': 'x'}),
+                0)
+        count = paragraph.replace_many({'moustache rouge': 'barbe blanche'},
+                across_spans=True)
+        self.assertEqual(count, 1)
+        self.assertEqual(paragraph.get_text(recursive=True),
+                "Le Père Noël a une barbe blanche.")
+        # The span is kept, emptied
+        self.assertNotEqual(paragraph.get_element('//text:span'), None)
+
+
+class IterElementsTestCase(TestCase):
+
+    def setUp(self):
+        container = odf_get_container('samples/example.odt')
+        self.content_part = odf_xmlpart(ODF_CONTENT, container)
+        self.body = self.content_part.get_element('//office:text')
+
+
+    def test_iter_elements(self):
+        body = self.body
+        for query in ('descendant::text:p', 'text:section',
+                      'descendant::text:p[@text:style-name]'):
+            iterator = body.iter_elements(query)
+            self.assertNotEqual(type(iterator), list)
+            self.assertEqual(list(iterator), body.get_elements(query))
+
+
+    def test_iter_children(self):
+        body = self.body
+        self.assertEqual(list(body.iter_children()), body.get_children())
+
+
+    def test_iter_paragraphs(self):
+        body = self.body
+        self.assertEqual(list(body.iter_paragraphs()),
+                         body.get_paragraphs())
+        self.assertEqual(list(body.iter_paragraphs(content='paragraph')),
+                         body.get_paragraphs(content='paragraph'))
+
+
+    def test_count(self):
+        body = self.body
+        self.assertEqual(body.count_elements('descendant::text:p'),
+                         len(body.get_paragraphs()))
+        self.assertEqual(body.count_paragraphs(), len(body.get_paragraphs()))
+        self.assertEqual(body.count_headings(outline_level=1),
+                         len(body.get_headings(outline_level=1)))
+        self.assertEqual(body.count_paragraphs(content='paragraph'),
+                         len(body.get_paragraphs(content='paragraph')))
+        self.assertEqual(body.count_tables(), 0)
+
+
+
 class XmlNamespaceTestCase(TestCase):
     """We must be able to use the API with unknown prefix/namespace"""
 
@@ -607,5 +719,67 @@ class RegisterTestCase(TestCase):
 
 
 
+class XPathVariablesTestCase(TestCase):
+
+    def setUp(self):
+        self.element = odf_create_element('<text:p><text:span text:style-name'
+                '="a"/><text:span text:style-name="b"/></text:p>')
+
+
+    def test_variables(self):
+        query = 'text:span[@text:style-name=$name]'
+        span = self.element.get_element(query, name='b')
+        self.assertEqual(span.get_attribute('text:style-name'), 'b')
+        self.assertEqual(len(self.element.xpath(query, name='a')), 1)
+        self.assertEqual(self.element.get_elements(query, name='c'), [])
+
+
+    def test_cache_info(self):
+        query = 'text:span[@text:style-name=$name]'
+        self.element.xpath(query, name='a')
+        before = xpath_cache_info()
+        for name in ('a', 'b', 'c'):
+            self.element.xpath(query, name=name)
+        after = xpath_cache_info()
+        self.assertEqual(after['hits'], before['hits'] + 3)
+        self.assertEqual(after['misses'], before['misses'])
+        self.assertTrue(after['size'] <= after['maxsize'])
+
+
+    def test_create_many_fragments(self):
+        for i in range(1500):
+            odf_create_element('<text:p text:style-name="P%d"/>' % i)
+            span = odf_create_element('text:span')
+            span.set_text(str(i))
+        element = odf_create_element('<text:p text:style-name="P0"/>')
+        self.assertEqual(element.get_attribute('text:style-name'), 'P0')
+        self.assertEqual(odf_create_element('text:span').get_text(), None)
+
+
+
+class WrapperIdentityTestCase(TestCase):
+
+    def setUp(self):
+        self.element = odf_create_element('<text:p><text:span/></text:p>')
+
+
+    def test_same_wrapper(self):
+        span = self.element.get_element('text:span')
+        self.assertTrue(self.element.get_element('text:span') is span)
+        self.assertTrue(span.get_parent() is self.element)
+
+
+    def test_set_tag(self):
+        span = self.element.get_element('text:span')
+        heading = span.set_tag('text:h')
+        self.assertEqual(heading.get_tag(), 'text:h')
+        self.assertTrue(self.element.get_element('text:h') is heading)
+
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(self.element, '__dict__'))
+
+
+
 if __name__ == '__main__':
     main()
@@ -115,5 +115,28 @@ class TestHeading(TestCase):
 
 
 
+    def test_get_outline(self):
+        body = self.body
+        outline = body.get_outline()
+        self.assertEqual([(level, number) for level, number, heading
+                          in outline], [(1, (1,)), (2, (1, 1)), (1, (2,))])
+        self.assertEqual(outline[1][2].get_text(), 'Level 2 Title')
+        # Cached until the headings change
+        self.assertTrue(body.get_outline() is outline)
+        body.append(odf_create_heading(3, 'Level 3 Title'))
+        outline = body.get_outline()
+        self.assertEqual(outline[-1][:2], (3, (2, 1, 1)))
+        self.assertEqual(len(body.get_outline(outline_level=2)), 3)
+
+
+    def test_get_outline_tree(self):
+        tree = self.body.get_outline_tree()
+        self.assertEqual(len(tree), 2)
+        level, number, heading, children = tree[0]
+        self.assertEqual(number, (1,))
+        self.assertEqual([child[2].get_text() for child in children],
+                         ['Level 2 Title'])
+
+
 if __name__ == '__main__':
     main()
@@ -101,6 +101,23 @@ class ManifestTestCase(TestCase):
         self.assertEqual(manifest.get_media_type(path), 'image/png')
         manifest.add_full_path(path, 'image/jpeg')
         self.assertEqual(manifest.get_media_type(path), 'image/jpeg')
+        # Not added twice
+        self.assertEqual(len(manifest.get_paths()), 20)
+        self.assertEqual(len(manifest.get_elements('manifest:file-entry')),
+                20)
+
+
+    def test_clone_index(self):
+        manifest = self.manifest
+        self.assertEqual(manifest.get_media_type(self.image_path),
+                'image/png')
+        clone = manifest.clone()
+        clone.del_full_path(self.image_path)
+        self.assertEqual(manifest.get_media_type(self.image_path),
+                'image/png')
+        self.assertTrue(clone.get_media_type(self.image_path) is None)
+        self.assertEqual(len(clone.get_elements('manifest:file-entry')),
+                19)
 
 
     def test_del_full_path(self):
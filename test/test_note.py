@@ -354,6 +354,41 @@ class TestAnnotation(TestCase):
         self.assertEqual(paragraph.serialize(), expected)
 
 
+    def test_unique_names(self):
+        body = self.body
+        names = body.get_office_names()
+        paragraph = body.get_paragraph()
+        created = [odf_create_annotation("Note", parent=paragraph).get_name()
+                   for i in range(3)]
+        self.assertEqual(len(set(created)), 3)
+        for name in created:
+            self.assertFalse(name in names)
+        self.assertEqual(body.get_unique_name(prefix='note'), 'note1')
+        self.assertEqual(body.get_unique_name(prefix='note'), 'note2')
+        self.assertRaises(ValueError, body.get_unique_name, 'bad')
+
+
+    def test_unique_names_inserted(self):
+        body = self.body
+        paragraph = body.get_paragraph()
+        name = odf_create_annotation("Note", parent=paragraph).get_name()
+        # A name taken after the scan, by an inserted subtree
+        number = int(name.rsplit('_', 1)[1])
+        taken = '__Fieldmark__lpod_%d' % (number + 1)
+        other = odf_create_paragraph()
+        other.append(odf_create_annotation("Other", name=taken))
+        body.append(other)
+        created = odf_create_annotation("Note", parent=paragraph).get_name()
+        self.assertNotEqual(created, taken)
+        self.assertFalse(created in body.get_office_names())
+        # A name set after the scan
+        taken = '__Fieldmark__lpod_%d' % (number + 3)
+        other.get_element('office:annotation').set_name(taken)
+        created = odf_create_annotation("Note", parent=paragraph).get_name()
+        self.assertNotEqual(created, taken)
+        self.assertFalse(created in body.get_office_names())
+
+
 
 if __name__ == '__main__':
     main()
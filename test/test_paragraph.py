@@ -272,6 +272,47 @@ class TestSetSpan(TestCase):
         self.assertEqual(paragraph.serialize(), expected)
 
 
+    def test_offset_in_document(self):
+        document = odf_get_document('samples/base_text.odt').clone()
+        paragraph = document.get_body().get_paragraph(position=1)
+        text = paragraph.get_text()
+        # Offsets are relative to the paragraph
+        paragraph.set_span("highlight", offset=text.index("second"),
+                           length=len("second"))
+        span = paragraph.get_span()
+        self.assertEqual(span.get_text(), "second")
+        paragraph.set_link("http://example.com", offset=0, length=4)
+        self.assertEqual(paragraph.get_link().get_text(), text[:4])
+
+
+    def test_offset_many(self):
+        text = "abcdefghij" * 10
+        paragraph = odf_create_paragraph(text)
+        for offset in range(0, len(text), 5):
+            paragraph.set_span("highlight", offset=offset, length=3)
+        spans = paragraph.get_spans()
+        self.assertEqual(len(spans), 20)
+        self.assertEqual([span.get_text() for span in spans[:2]],
+                         ['abc', 'fgh'])
+        self.assertEqual(paragraph.get_text(recursive=True), text)
+        # Index kept in step with the text edited by other means
+        paragraph.set_text("XY")
+        paragraph.set_span("other", offset=1, length=1)
+        self.assertEqual(paragraph.get_spans(style="other")[0].get_text(),
+                "Y")
+
+
+    def test_offset_after_edit(self):
+        paragraph = odf_create_element('<text:p>abc<text:span>def'
+                                       '</text:span>ghi</text:p>')
+        paragraph.set_bookmark('b1', position=1)
+        # An earlier node edited by other means shifts the offsets
+        paragraph.get_span().set_text('defXYZ')
+        paragraph.set_bookmark('b2', position=8)
+        self.assertEqual(paragraph.get_span().get_text(), 'defXY')
+        self.assertEqual(paragraph.get_bookmark(name='b2').get_tail(), 'Z')
+
+
 
 class TestPraragraphReferences(TestCase):
 
@@ -30,8 +30,15 @@
 # Import from the Standard Library
 from datetime import date, datetime, timedelta
 from decimal import Decimal as dec
+from array import array
 from io import StringIO
-from unittest import TestCase, main
+from unittest import TestCase, main, skipIf
+
+# Import from numpy (optional)
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Import from lpod
 from lpod.document import odf_get_document
@@ -718,6 +725,22 @@ class TestRowCell(TestCase):
         self.assertEqual(len(list(self.row.traverse(-5, -1))), 0)
 
 
+    def test_traverse_no_clone(self):
+        cells = list(self.row_repeats.traverse(clone=False))
+        self.assertEqual(len(cells), 7)
+        # The repeated cell is not copied
+        self.assertTrue(cells[0]._is_same(cells[2]))
+        self.assertEqual(cells[0].get_repeated(), 3)
+        # But each position keeps its own
+        self.assertEqual([cell.x for cell in cells], list(range(7)))
+
+
+    def test_traverse_no_clone_coord(self):
+        values = [(cell.x, cell.get_value())
+                  for cell in self.row_repeats.traverse(2, 4, clone=False)]
+        self.assertEqual(values, [(2, 1), (3, 2), (4, 3)])
+
+
     def test_get_cells(self):
         self.assertEqual(len(list(self.row.get_cells())), 7)
 
@@ -3008,6 +3031,141 @@ class TestTableGetValues(TestCase):
 
 
 
+class TestTableArrays(TestCase):
+
+    def setUp(self):
+        document = odf_get_document('samples/simple_table.ods')
+        body = document.get_body()
+        self.table = body.get_table(name="Example1").clone()
+        self.table.set_value('C2', None)
+        self.mixed = body.get_table(name="Example3").clone()
+
+
+    def test_columns_arrays(self):
+        columns, masks = self.table.get_columns_arrays()
+        self.assertEqual(len(columns), 7)
+        self.assertEqual(columns[2], array('d', [1.0, 0.0, 1.0, 3.0]))
+        self.assertEqual(masks[2], array('B', [0, 1, 0, 0]))
+        self.assertEqual(columns[6], array('d', [3.0, 3.0, 3.0, 7.0]))
+
+
+    def test_columns_arrays_coord(self):
+        columns, masks = self.table.get_columns_arrays('C2:D4')
+        self.assertEqual(columns, [array('d', [0.0, 1.0, 3.0]),
+                                   array('d', [2.0, 2.0, 4.0])])
+        self.assertEqual(masks[0], array('B', [1, 0, 0]))
+
+
+    def test_columns_arrays_mixed(self):
+        columns, masks = self.mixed.get_columns_arrays()
+        self.assertEqual(columns[0], ['A float', 'A date'])
+        self.assertEqual(columns[1], [3.14, datetime(1975, 5, 7)])
+
+
+    def _get_no_value_table(self):
+        table = odf_create_table('Table')
+        for value in (1, 2, 3):
+            table.append_row(odf_create_row())
+            table.set_value((0, value - 1), value)
+        # Numeric cells with no office:value
+        for coord, text in (('A2', '2.5'), ('A3', 'n/a')):
+            cell = table.get_cell(coord)
+            cell.del_attribute('office:value')
+            cell.get_paragraph().set_text(text)
+            table.set_cell(coord, cell)
+        return table
+
+
+    def test_columns_arrays_no_value(self):
+        columns, masks = self._get_no_value_table().get_columns_arrays()
+        self.assertEqual(columns, [array('d', [1.0, 2.5, 0.0])])
+        self.assertEqual(masks, [array('B', [0, 0, 1])])
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_to_numpy_no_value(self):
+        data = self._get_no_value_table().to_numpy()
+        self.assertEqual(data.tolist(), [[1.0], [2.5], [None]])
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_to_numpy(self):
+        data = self.table.to_numpy()
+        self.assertEqual(data.shape, (4, 7))
+        self.assertEqual(data[3].tolist(), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(data.mask.sum(), 1)
+        self.assertTrue(data.mask[1, 2])
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_to_numpy_dtype(self):
+        data = self.mixed.to_numpy()
+        self.assertEqual(data.tolist(), [[None, 3.14], [None, None]])
+        data = self.mixed.to_numpy('A1:B1', dtype=object)
+        self.assertEqual(data.tolist(), [['A float', dec('3.14')]])
+
+
+
+class TestTableSetArrays(TestCase):
+
+    def setUp(self):
+        self.table = odf_create_table('Table')
+
+
+    def test_set_columns(self):
+        table = self.table
+        table.set_values_from_arrays([[1, 1, 1, 2], array('d', [1.5] * 3),
+                                      ['a', None, 'a']])
+        self.assertEqual(table.get_size(), (3, 4))
+        self.assertEqual(table.get_values(), [[1, dec('1.5'), 'a'],
+                                              [1, dec('1.5'), None],
+                                              [1, dec('1.5'), 'a'],
+                                              [2, None, None]])
+
+
+    def test_repeated(self):
+        table = self.table
+        table.set_values_from_arrays([[1, 1, 1, 2], [1, 1, 1, 2]])
+        rows = table._get_rows()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0].get_repeated(), 3)
+        self.assertEqual(rows[1].get_repeated(), None)
+        cells = rows[0]._get_cells()
+        self.assertEqual(len(cells), 1)
+        self.assertEqual(cells[0].get_repeated(), 2)
+
+
+    def test_same_value_other_type(self):
+        self.table.set_values_from_arrays([[1], [1.0], [True]])
+        self.assertEqual(len(self.table._get_rows()[0]._get_cells()), 3)
+
+
+    def test_coord(self):
+        table = self.table
+        table.set_values_from_arrays([[1, 2]])
+        table.set_values_from_arrays([['x', 'y', 'z']], coord='B2')
+        self.assertEqual(table.get_values(), [[1, None],
+                                              [2, 'x'],
+                                              [None, 'y'],
+                                              [None, 'z']])
+
+
+    def test_coord_beyond_height(self):
+        table = self.table
+        table.set_values_from_arrays([[1]], coord='A5')
+        self.assertEqual(table.get_height(), 5)
+        self.assertEqual(table.get_value('A5'), 1)
+        self.assertEqual(table.get_value('A2'), None)
+
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy(self):
+        column = numpy.ma.masked_array([1, 2, 3], mask=[0, 1, 0])
+        self.table.set_values_from_arrays([column])
+        self.assertEqual(self.table.get_values(), [[1], [None], [3]])
+
+
+
 class TestTableCache(TestCase):
 
     def setUp(self):
@@ -3136,6 +3294,14 @@ class TestTableRow(TestCase):
         self.assertEqual(len(list(self.table.traverse())), 4)
 
 
+    def test_traverse_rows_no_clone(self):
+        table = odf_create_table('Table')
+        table.append_row(odf_create_row(width=2, repeated=3))
+        rows = list(table.traverse(clone=False))
+        self.assertEqual([(row.y, row.get_repeated()) for row in rows],
+                         [(0, 3), (1, 3), (2, 3)])
+
+
     def test_get_row_values(self):
         self.assertEqual(self.table.get_row_values(3), [1, 2, 3, 4, 5, 6, 7])
 
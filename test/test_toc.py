@@ -29,6 +29,8 @@ from unittest import TestCase, main
 
 # Import from lpod
 from lpod.document import odf_get_document
+from lpod.element import PREV_SIBLING
+from lpod.heading import odf_create_heading
 from lpod.toc import odf_create_toc
 
 
@@ -80,6 +82,29 @@ class TOCTest(TestCase):
 
 
 
+    def test_toc_update(self):
+        document = self.document.clone()
+        body = document.get_body()
+        toc = odf_create_toc("Table des matières")
+        body.append(toc)
+        toc.fill()
+        before = toc.get_paragraphs()
+        # Insert a level 2 title before "Level 2 title 2" of title 2
+        heading = body.get_headings(outline_level=2)[1]
+        heading.insert(odf_create_heading(2, "New title"), PREV_SIBLING)
+        toc.update()
+        toc_lines = get_toc_lines(toc)
+        self.assertEqual(toc_lines, self.expected[:5] + [
+            "2.2. New title", "2.3. Level 2 title 2"] + self.expected[6:])
+        # The entries before did not change
+        after = toc.get_paragraphs()
+        self.assertEqual(after[:5], before[:5])
+        self.assertEqual(after[7:], before[6:])
+        # Same as filled from scratch
+        toc.fill()
+        self.assertEqual(get_toc_lines(toc), toc_lines)
+
+
 if __name__ == '__main__':
     main()
 
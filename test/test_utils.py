@@ -32,7 +32,7 @@ from unittest import TestCase, main
 # Import from lpod
 from lpod.document import odf_get_document
 from lpod.table import odf_create_cell
-from lpod.utils import _make_xpath_query, isiterable
+from lpod.utils import _make_xpath_query, isiterable, _position_map
 from lpod.utils import get_value, set_value, convert_unicode, oooc_to_ooow
 from lpod.variable import odf_create_variable_set, odf_create_user_field_decl
 
@@ -78,6 +78,26 @@ class GenerateXPathTestCase(TestCase):
         self.assertEqual(query, expected)
 
 
+    def test_variables(self):
+        variables = {}
+        query = _make_xpath_query('descendant::text:h', text_style="Standard",
+                outline_level=1, position=1, variables=variables)
+        expected = ('(descendant::text:h[@text:outline-level=$text_outline_level]'
+                    '[@text:style-name=$text_style_name])[$position]')
+        self.assertEqual(query, expected)
+        self.assertEqual(variables, {'text_outline_level': '1',
+                                     'text_style_name': 'Standard',
+                                     'position': 2})
+
+
+    def test_variables_negative_position(self):
+        variables = {}
+        query = _make_xpath_query('descendant::text:h', position=-3,
+                                  variables=variables)
+        self.assertEqual(query, '(descendant::text:h)[last()-$position]')
+        self.assertEqual(variables, {'position': 2})
+
+
 
 class Get_ValueTestCase(TestCase):
 
@@ -161,6 +181,28 @@ class GetElementByPositionTestCase(TestCase):
         self.assertEqual(last_paragraph.get_text(recursive=True), expected)
 
 
+    def test_out_of_range(self):
+        count = len(self.body.get_paragraphs())
+        self.assertEqual(self.body.get_paragraph(position=count), None)
+        self.assertEqual(self.body.get_paragraph(position=-count - 1), None)
+
+
+    def test_same_as_list(self):
+        paragraphs = self.body.get_paragraphs()
+        for position in (0, 3, -3):
+            paragraph = self.body.get_paragraph(position=position)
+            self.assertEqual(paragraph.get_text(recursive=True),
+                             paragraphs[position].get_text(recursive=True))
+
+
+    def test_content_fallback(self):
+        paragraph = self.body.get_paragraph(position=1, content="paragraph")
+        expected = [p for p in self.body.get_paragraphs()
+                    if p.match("paragraph")][1]
+        self.assertEqual(paragraph.get_text(recursive=True),
+                         expected.get_text(recursive=True))
+
+
 
 class FormulaConvertTestCase(TestCase):
 
@@ -219,5 +261,56 @@ class IsIterableTestCase(TestCase):
 
 
 
+class PositionMapTestCase(TestCase):
+
+    def setUp(self):
+        self.map = _position_map([2, 1, 3])
+
+
+    def test_positions(self):
+        self.assertEqual(list(self.map), [1, 2, 5])
+        self.assertEqual(len(self.map), 3)
+        self.assertEqual(self.map[-1], 5)
+        self.assertEqual(list(self.map.iter_from(1)), [2, 5])
+
+
+    def test_find(self):
+        found = [self.map.find(position) for position in range(-1, 7)]
+        self.assertEqual(found, [0, 0, 0, 1, 2, 2, 2, None])
+
+
+    def test_insert_erase(self):
+        self.map.insert(1, 4)
+        self.assertEqual(list(self.map), [1, 5, 6, 9])
+        self.map.append(1)
+        self.assertEqual(list(self.map), [1, 5, 6, 9, 10])
+        self.map.erase(0)
+        self.assertEqual(list(self.map), [3, 4, 7, 8])
+        self.assertRaises(IndexError, self.map.erase, 4)
+
+
+    def test_set_repeated(self):
+        self.map.set_repeated(1, 5)
+        self.assertEqual(list(self.map), [1, 6, 9])
+        self.assertEqual(self.map.get_repeated(1), 5)
+
+
+    def test_copy(self):
+        clone = self.map.copy()
+        clone.erase(1)
+        self.assertEqual(list(clone), [1, 4])
+        self.assertEqual(list(self.map), [1, 2, 5])
+
+
+    def test_iter_while_updating(self):
+        result = []
+        for position in self.map:
+            result.append(position)
+            self.map.insert(0, 1)
+        self.assertEqual(result, [1, 2, 5])
+        self.assertEqual(list(self.map), [0, 1, 2, 4, 5, 8])
+
+
+
 if __name__ == '__main__':
     main()